@@ -1,25 +1,51 @@
 from controllers import *
+from simulation import GridSimulation
 
 class SmartGridManagementApp(tk.Tk):
+    REPORT_JOB_STATUSES = {"queued": "В очереди", "running": "Выполняется", "done": "Готов",
+                           "cancelled": "Отменен", "failed": "Ошибка"}
+    # Сколько ожидающих рекомендаций с наивысшим приоритетом показывать
+    RECOMMENDATIONS_SHOWN = 50
+    
     def __init__(self):
         super().__init__()
         self.title("Система интеллектуального управления энергосетями умного города")
         self.geometry("1400x800")
         
         # Инициализация компонентов
-        self.repository = InMemoryDataRepository()
+        # Путь к базе SQLite включает постоянное хранилище вместо памяти
+        db_path = os.environ.get("SMARTGRID_DB")
+        if db_path:
+            self.repository = SqliteDataRepository(db_path)
+        else:
+            self.repository = InMemoryDataRepository(retention=RetentionPolicy())
         self.alert_service = GuiAlertService(self)
         self.monitor_controller = NetworkMonitorController(self.repository)
         self.recommendation_controller = RecommendationController(self.repository)
         self.forecast_controller = ForecastController(self.repository)
         self.report_controller = ReportController(self.repository)
+        # Отчеты строятся в рабочих потоках, окно только опрашивает задания через after()
+        self.report_jobs = ReportJobController(self.report_controller)
+        self.report_jobs_tree = None
+        self._report_jobs_poll = None
+        self._announced_report_jobs = set()
+        self.simulation = GridSimulation(self.repository, self.monitor_controller)
         
         # Текущий пользователь
         self.current_user = None
         self.data_generation_active = False
         
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.show_login_screen()
     
+    def on_close(self):
+        """Закрытие приложения"""
+        self.data_generation_active = False
+        self.report_jobs.close()
+        if hasattr(self.repository, 'close'):
+            self.repository.close()
+        self.destroy()
+    
     def show_login_screen(self):
         """Экран входа в систему"""
         self.clear_window()
@@ -264,7 +290,11 @@ class SmartGridManagementApp(tk.Tk):
                         fg=severity_colors.get(anomaly.severity, "black")).pack(anchor="w")
                 tk.Label(frame, text=anomaly.description, 
                         font=("Arial", 9), wraplength=300).pack(anchor="w")
-                tk.Label(frame, text=f"Обнаружено: {anomaly.detection_time.strftime('%H:%M')}", 
+                seen_text = f"Обнаружено: {anomaly.detection_time.strftime('%H:%M')}"
+                if anomaly.occurrence_count > 1:
+                    seen_text += (f", повторов: {anomaly.occurrence_count}, "
+                                  f"последнее: {anomaly.last_seen.strftime('%H:%M')}")
+                tk.Label(frame, text=seen_text, 
                         font=("Arial", 8), fg="gray").pack(anchor="w")
         
         # Кнопка просмотра всех аномалий
@@ -301,7 +331,7 @@ class SmartGridManagementApp(tk.Tk):
         main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
         
         # Создаем Treeview для отображения таблицы
-        columns = ("ID", "Время", "Тип", "Критичность", "Статус", "Объект", "Описание")
+        columns = ("ID", "Время", "Тип", "Критичность", "Статус", "Объект", "Повторов", "Описание")
         tree = ttk.Treeview(main_frame, columns=columns, show="headings", height=15)
         
         for col in columns:
@@ -309,7 +339,7 @@ class SmartGridManagementApp(tk.Tk):
             tree.column(col, width=120 if col != "Описание" else 300)
         
         # Заполняем данными
-        anomalies = self.repository.anomalies
+        anomalies = self.repository.get_all_anomalies()
         for anomaly in sorted(anomalies, key=lambda x: x.detection_time, reverse=True):
             tree.insert("", tk.END, values=(
                 anomaly.anomaly_id[:8],
@@ -318,6 +348,7 @@ class SmartGridManagementApp(tk.Tk):
                 anomaly.severity.value,
                 anomaly.status,
                 anomaly.affected_object_id,
+                anomaly.occurrence_count,
                 anomaly.description[:50] + "..." if len(anomaly.description) > 50 else anomaly.description
             ))
         
@@ -357,13 +388,12 @@ class SmartGridManagementApp(tk.Tk):
             anomaly_id = item['values'][0]
             
             # Находим полный ID аномалии
-            for anomaly in self.repository.anomalies:
-                if anomaly.anomaly_id.startswith(anomaly_id):
-                    recommendation = self.recommendation_controller.generate_recommendation(anomaly)
-                    messagebox.showinfo("Рекомендация создана", 
-                                      f"Создана рекомендация: {recommendation.content}")
-                    self.show_recommendations_view()
-                    break
+            anomaly = self.repository.find_anomaly_by_prefix(str(anomaly_id))
+            if anomaly:
+                recommendation = self.recommendation_controller.generate_recommendation(anomaly)
+                messagebox.showinfo("Рекомендация создана", 
+                                  f"Создана рекомендация: {recommendation.content}")
+                self.show_recommendations_view()
     
     def resolve_anomaly(self, tree):
         """Пометить аномалию как решенную"""
@@ -372,13 +402,12 @@ class SmartGridManagementApp(tk.Tk):
             item = tree.item(selection[0])
             anomaly_id = item['values'][0]
             
-            for anomaly in self.repository.anomalies:
-                if anomaly.anomaly_id.startswith(anomaly_id):
-                    anomaly.status = "resolved"
-                    messagebox.showinfo("Аномалия решена", 
-                                      f"Аномалия отмечена как решенная")
-                    self.show_anomalies_view()
-                    break
+            anomaly = self.repository.find_anomaly_by_prefix(str(anomaly_id))
+            if anomaly:
+                self.repository.update_anomaly_status(anomaly.anomaly_id, "resolved")
+                messagebox.showinfo("Аномалия решена", 
+                                  f"Аномалия отмечена как решенная")
+                self.show_anomalies_view()
     
     def show_recommendations_view(self):
         """Просмотр рекомендаций"""
@@ -391,7 +420,7 @@ class SmartGridManagementApp(tk.Tk):
         tk.Label(header, text="Рекомендации системы", 
                 font=("Arial", 18, "bold"), bg="#ECF0F1").pack(pady=20)
         
-        recommendations = self.repository.get_pending_recommendations()
+        recommendations = self.recommendation_controller.get_top_pending(self.RECOMMENDATIONS_SHOWN)
         
         if not recommendations:
             tk.Label(self.content_area, text="Нет ожидающих рекомендаций", 
@@ -480,7 +509,8 @@ class SmartGridManagementApp(tk.Tk):
     
     def reject_recommendation(self, recommendation: Recommendation):
         """Отклонить рекомендацию"""
-        recommendation.status = "rejected"
+        self.recommendation_controller.reject_recommendation(
+            recommendation.recommendation_id, self.current_user.user_id)
         messagebox.showinfo("Рекомендация отклонена", 
                           "Рекомендация была отклонена.")
         self.show_recommendations_view()
@@ -584,7 +614,7 @@ class SmartGridManagementApp(tk.Tk):
         """Аварийное снижение нагрузки"""
         for obj in self.repository.get_all_network_objects():
             if hasattr(obj, 'current_load') and obj.current_load > obj.capacity * 0.8:
-                obj.current_load *= 0.7  # Снижаем нагрузку на 30%
+                self.repository.update_object_load(obj.object_id, obj.current_load * 0.7)  # Снижаем нагрузку на 30%
         
         self.alert_service.send_alert(
             "Выполнено аварийное снижение нагрузки",
@@ -620,15 +650,10 @@ class SmartGridManagementApp(tk.Tk):
                           "Ремонтная бригада оповещена")
     
     def generate_load_report(self):
-        """Генерация отчета по нагрузкам"""
-        report = self.report_controller.generate_report(
-            "daily",
-            datetime.datetime.now() - datetime.timedelta(days=1),
-            datetime.datetime.now(),
-            self.current_user.username
-        )
-        messagebox.showinfo("Отчет создан", 
-                          f"Создан отчет: {report.title}")
+        """Генерация отчета по нагрузкам за прошедшие сутки в фоне"""
+        start_date, end_date = self.report_controller.period_bounds("daily")
+        self.report_jobs.submit("daily", start_date, end_date, self.current_user.username)
+        self.watch_report_jobs()
     
     def show_charts(self):
         """Графики и визуализация"""
@@ -766,18 +791,23 @@ class SmartGridManagementApp(tk.Tk):
         
         # График 1: Распределение типов аномалий
         ax1 = fig.add_subplot(221)
-        anomaly_types = [a.anomaly_type.value for a in self.repository.anomalies]
+        anomalies = self.repository.get_all_anomalies()
+        anomaly_types = [a.anomaly_type.value for a in anomalies]
         if anomaly_types:
             from collections import Counter
             counts = Counter(anomaly_types)
             ax1.pie(counts.values(), labels=counts.keys(), autopct='%1.1f%%')
             ax1.set_title('Распределение типов аномалий')
         
-        # График 2: Тенденция нагрузок
+        # График 2: Тенденция нагрузок по суточным агрегатам
         ax2 = fig.add_subplot(222)
-        days = list(range(7))
-        avg_loads = [random.uniform(600, 800) for _ in days]
-        ax2.plot(days, avg_loads, 'g-', linewidth=2)
+        today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today - datetime.timedelta(days=6)
+        daily_loads = {bucket.start: bucket.mean for bucket in
+                       self.report_controller.get_load_trend("daily", week_start, today)}
+        days = [week_start + datetime.timedelta(days=i) for i in range(7)]
+        avg_loads = [daily_loads.get(day, float("nan")) for day in days]
+        ax2.plot([day.strftime("%d.%m") for day in days], avg_loads, 'g-o', linewidth=2)
         ax2.set_xlabel('Дни')
         ax2.set_ylabel('Средняя нагрузка (кВт)')
         ax2.set_title('Тенденция нагрузок за неделю')
@@ -785,16 +815,19 @@ class SmartGridManagementApp(tk.Tk):
         
         # График 3: Эффективность решения аномалий
         ax3 = fig.add_subplot(223)
-        anomalies = self.repository.anomalies
         resolved = sum(1 for a in anomalies if a.status == "resolved")
         pending = sum(1 for a in anomalies if a.status in ["detected", "analyzing"])
         ax3.bar(['Решено', 'Ожидают'], [resolved, pending], color=['green', 'orange'])
         ax3.set_title('Эффективность решения аномалий')
         
-        # График 4: Нагрузка по времени суток
+        # График 4: Нагрузка по времени суток - часовые агрегаты за неделю
         ax4 = fig.add_subplot(224)
         hours = list(range(24))
-        typical_load = [300 + 400 * (0.5 + 0.5 * abs(12 - h) / 12) for h in hours]
+        hour_totals = [AggregateBucket(today) for _ in hours]
+        for bucket in self.report_controller.get_load_trend("hourly", week_start,
+                                                            datetime.datetime.now()):
+            hour_totals[bucket.start.hour].merge(bucket)
+        typical_load = [bucket.mean if bucket.count else float("nan") for bucket in hour_totals]
         ax4.plot(hours, typical_load, 'purple', linewidth=2)
         ax4.fill_between(hours, typical_load, alpha=0.3, color='purple')
         ax4.set_xlabel('Час дня')
@@ -827,13 +860,17 @@ class SmartGridManagementApp(tk.Tk):
         main_frame = tk.Frame(self.content_area)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
-        # Создаем прогнозы для всех объектов
+        # Прогнозы всех объектов и горизонтов одним проходом
+        by_object = {}
+        for forecast in self.forecast_controller.create_grid_forecasts():
+            by_object.setdefault(forecast.object_id, {})[forecast.forecast_period] = forecast
         forecasts = []
         for obj in self.repository.get_all_network_objects():
-            forecast = self.forecast_controller.create_load_forecast(obj.object_id)
-            forecasts.append((obj, forecast))
+            horizons = by_object.get(obj.object_id, {})
+            if "hourly" in horizons:
+                forecasts.append((obj, horizons["hourly"], horizons))
         
-        for obj, forecast in forecasts:
+        for obj, forecast, horizons in forecasts:
             frame = tk.Frame(main_frame, relief=tk.GROOVE, borderwidth=2, 
                            padx=15, pady=15)
             frame.pack(fill=tk.X, pady=10)
@@ -855,6 +892,18 @@ class SmartGridManagementApp(tk.Tk):
             tk.Label(info_frame, text=f"Доверие: {forecast.confidence:.0%}",
                     font=("Arial", 10), fg=confidence_color).pack(side=tk.LEFT, padx=10)
             
+            if "daily" in horizons and "weekly" in horizons:
+                tk.Label(info_frame, text=f"Сутки: {horizons['daily'].predicted_load:.1f} кВт, "
+                                          f"неделя: {horizons['weekly'].predicted_load:.1f} кВт",
+                        font=("Arial", 10), fg="gray").pack(side=tk.LEFT, padx=10)
+            
+            # Фактическая точность часовых прогнозов по объекту
+            accuracy = self.forecast_controller.get_forecast_accuracy(obj.object_id, "hourly")
+            if accuracy and accuracy.count:
+                tk.Label(frame, text=f"Точность за {accuracy.count} ч: MAE {accuracy.mae:.1f} кВт, "
+                                     f"MAPE {accuracy.mape:.1f}%, смещение {accuracy.bias:+.1f} кВт",
+                        font=("Arial", 9), fg="gray").pack(anchor="w")
+            
             # Индикатор сравнения
             diff = forecast.predicted_load - obj.current_load
             diff_percent = (diff / obj.current_load * 100) if obj.current_load > 0 else 0
@@ -903,11 +952,32 @@ class SmartGridManagementApp(tk.Tk):
                  command=lambda: self.create_report(report_type_var.get()),
                  font=("Arial", 11), bg="#3498DB", fg="white").pack(side=tk.RIGHT, padx=10)
         
+        # Задания на построение отчетов
+        self.report_jobs_tree = None
+        if self.report_jobs.get_jobs():
+            jobs_frame = tk.LabelFrame(self.content_area, text="Задания",
+                                       padx=10, pady=10, font=("Arial", 12, "bold"))
+            jobs_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+            
+            job_columns = ("ID", "Тип", "Период", "Статус", "Готово")
+            self.report_jobs_tree = ttk.Treeview(jobs_frame, columns=job_columns,
+                                                 show="headings", height=4)
+            for col in job_columns:
+                self.report_jobs_tree.heading(col, text=col)
+                self.report_jobs_tree.column(col, width=200 if col == "Период" else 110)
+            self.report_jobs_tree.pack(side=tk.LEFT, fill=tk.X, expand=True)
+            
+            tk.Button(jobs_frame, text="Отменить задание",
+                     command=self.cancel_selected_report_job,
+                     font=("Arial", 10), bg="#E74C3C", fg="white").pack(side=tk.RIGHT, padx=10)
+            self.update_report_jobs_display()
+        
         # Существующие отчеты
         main_frame = tk.Frame(self.content_area)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
         
-        if not self.repository.reports:
+        reports = self.repository.get_reports()
+        if not reports:
             tk.Label(main_frame, text="Отчеты еще не созданы", 
                     font=("Arial", 14), pady=50).pack()
             return
@@ -920,7 +990,7 @@ class SmartGridManagementApp(tk.Tk):
             tree.heading(col, text=col)
             tree.column(col, width=120 if col != "Название" else 200)
         
-        for report in sorted(self.repository.reports, 
+        for report in sorted(reports, 
                            key=lambda x: x.creation_date, reverse=True):
             tree.insert("", tk.END, values=(
                 report.report_id[:8],
@@ -942,26 +1012,66 @@ class SmartGridManagementApp(tk.Tk):
                  font=("Arial", 11), bg="#2ECC71", fg="white").pack(pady=10)
     
     def create_report(self, report_type: str):
-        """Создание нового отчета"""
-        if report_type == "daily":
-            start_date = datetime.datetime.now() - datetime.timedelta(days=1)
-        elif report_type == "weekly":
-            start_date = datetime.datetime.now() - datetime.timedelta(days=7)
-        elif report_type == "monthly":
-            start_date = datetime.datetime.now() - datetime.timedelta(days=30)
-        else:  # incident
-            start_date = datetime.datetime.now() - datetime.timedelta(days=1)
-        
-        report = self.report_controller.generate_report(
-            report_type,
-            start_date,
-            datetime.datetime.now(),
-            self.current_user.username
-        )
-        
-        messagebox.showinfo("Отчет создан", 
-                          f"Создан отчет: {report.title}\n\n{report.content}")
+        """Постановка нового отчета в очередь"""
+        # Закрытые периоды из полных суток повторно отдаются из кэша отчетов
+        start_date, end_date = self.report_controller.period_bounds(report_type)
+        self.report_jobs.submit(report_type, start_date, end_date, self.current_user.username)
         self.show_reports_view()
+        self.watch_report_jobs()
+    
+    def update_report_jobs_display(self):
+        """Обновление таблицы заданий без перестроения представления"""
+        tree = self.report_jobs_tree
+        if tree is None or not tree.winfo_exists():
+            return
+        selection = tree.selection()
+        tree.delete(*tree.get_children())
+        for job in reversed(self.report_jobs.get_jobs()):
+            tree.insert("", tk.END, iid=job.job_id, values=(
+                job.job_id[:8],
+                job.report_type,
+                f"{job.start_date:%Y-%m-%d %H:%M} - {job.end_date:%Y-%m-%d %H:%M}",
+                self.REPORT_JOB_STATUSES[job.status],
+                f"{job.progress:.0%}"
+            ))
+        tree.selection_set([iid for iid in selection if tree.exists(iid)])
+    
+    def cancel_selected_report_job(self):
+        """Отмена выбранного задания"""
+        tree = self.report_jobs_tree
+        if tree is None or not tree.selection():
+            return
+        if not self.report_jobs.cancel(tree.selection()[0]):
+            messagebox.showinfo("Отчеты", "Задание уже завершено")
+        self.update_report_jobs_display()
+    
+    def watch_report_jobs(self):
+        """Опрос заданий через after(), пока есть незавершенные"""
+        if self._report_jobs_poll is None:
+            self._report_jobs_poll = self.after(300, self.poll_report_jobs)
+    
+    def poll_report_jobs(self):
+        self._report_jobs_poll = None
+        if self.report_jobs.get_active_jobs():
+            self.watch_report_jobs()
+        
+        finished = [job for job in self.report_jobs.get_jobs()
+                    if job.finished and job.job_id not in self._announced_report_jobs]
+        self._announced_report_jobs.update(job.job_id for job in finished)
+        
+        if self.report_jobs_tree is not None and self.report_jobs_tree.winfo_exists():
+            # Готовый отчет появляется в списке отчетов - представление перестраивается
+            if any(job.status == "done" for job in finished):
+                self.show_reports_view()
+            else:
+                self.update_report_jobs_display()
+        
+        for job in finished:
+            if job.status == "done":
+                messagebox.showinfo("Отчет создан",
+                                  f"Создан отчет: {job.report.title}\n\n{job.report.content}")
+            elif job.status == "failed":
+                messagebox.showerror("Ошибка построения отчета", job.error)
     
     def view_selected_report(self, tree):
         """Просмотр выбранного отчета"""
@@ -970,8 +1080,8 @@ class SmartGridManagementApp(tk.Tk):
             item = tree.item(selection[0])
             report_id = item['values'][0]
             
-            for report in self.repository.reports:
-                if report.report_id.startswith(report_id):
+            for report in self.repository.get_reports():
+                if report.report_id.startswith(str(report_id)):
                     # Создаем отдельное окно для просмотра отчета
                     report_window = tk.Toplevel(self)
                     report_window.title(f"Отчет: {report.title}")
@@ -1404,67 +1514,24 @@ class SmartGridManagementApp(tk.Tk):
     
     def generate_sensor_data(self):
         """Генерация тестовых данных с датчиков"""
-        for obj in self.repository.get_all_network_objects():
-            # Генерируем различные типы данных в зависимости от объекта
-            sensor_types = [
-                ("power", SensorType.POWER, 100, 1000),
-                ("voltage", SensorType.VOLTAGE, 210, 240),
-                ("current", SensorType.CURRENT, 10, 100)
-            ]
-            
-            for sensor_suffix, sensor_type, min_val, max_val in sensor_types:
-                sensor_id = f"{obj.object_id}_{sensor_suffix}"
-                
-                # Добавляем случайные колебания
-                base_value = obj.current_load if sensor_suffix == "power" else (min_val + max_val) / 2
-                fluctuation = random.uniform(-0.1, 0.1) * base_value
-                value = max(min_val, min(max_val, base_value + fluctuation))
-                
-                data = SensorData(
-                    data_id=str(uuid.uuid4()),
-                    sensor_id=sensor_id,
-                    timestamp=datetime.datetime.now(),
-                    value=value,
-                    unit="кВт" if sensor_suffix == "power" else "В" if sensor_suffix == "voltage" else "А"
-                )
-                
-                self.repository.store_sensor_data(data)
-                
-                # Обновляем текущую нагрузку объекта
-                if sensor_suffix == "power" and hasattr(obj, 'current_load'):
-                    obj.current_load = value
-                
-                # Проверяем на аномалии
-                anomaly = self.monitor_controller.detect_anomalies(data, obj)
-                if anomaly:
-                    self.alert_service.send_alert(
-                        f"Обнаружена аномалия: {anomaly.description}",
-                        anomaly.severity,
-                        self.current_user.user_id
-                    )
+        batch = self.simulation.generate_readings(datetime.datetime.now())
+        
+        # Сохраняем и проверяем на аномалии весь цикл опроса сразу
+        anomalies = self.monitor_controller.process_sensor_batch(batch)
+        self.forecast_controller.observe_readings(batch)
+        for anomaly in anomalies:
+            self.alert_service.send_alert(
+                f"Обнаружена аномалия: {anomaly.description}",
+                anomaly.severity,
+                self.current_user.user_id
+            )
     
     def generate_test_anomaly(self):
         """Генерация тестовой аномалии"""
-        objects = self.repository.get_all_network_objects()
-        if not objects:
+        anomaly = self.simulation.generate_random_anomaly(datetime.datetime.now())
+        if not anomaly:
             return
         
-        obj = random.choice(objects)
-        anomaly_types = list(AnomalyType)
-        severity_levels = list(SeverityLevel)
-        
-        anomaly = Anomaly(
-            anomaly_id=str(uuid.uuid4()),
-            detection_time=datetime.datetime.now(),
-            anomaly_type=random.choice(anomaly_types),
-            severity=random.choice(severity_levels[1:]),  # Исключаем LOW
-            description=f"Тестовая аномалия на объекте {obj.name}",
-            status="detected",
-            affected_object_id=obj.object_id,
-            confidence_score=random.uniform(0.7, 0.95),
-            recommended_action="Требуется анализ и принятие мер"
-        )
-        
         self.repository.store_anomaly(anomaly)
         
         # Отправляем оповещение
@@ -0,0 +1,304 @@
+from controllers import *
+from simulation import GridSimulation
+import gc
+import tracemalloc
+
+# Замеры производительности хранилища и анализа данных.
+# Запуск: python benchmarks.py
+
+def generate_readings(sensor_count: int, readings_per_sensor: int,
+                      start: Optional[datetime.datetime] = None):
+    """Показания в том же виде, в каком их создает генератор данных приложения"""
+    start = start or datetime.datetime.now() - datetime.timedelta(seconds=5 * readings_per_sensor)
+    for step in range(readings_per_sensor):
+        timestamp = start + datetime.timedelta(seconds=5 * step)
+        for sensor in range(sensor_count):
+            yield SensorData(
+                data_id=str(uuid.uuid4()),
+                sensor_id=f"obj_{sensor // 3:04d}_{('power', 'voltage', 'current')[sensor % 3]}",
+                timestamp=timestamp,
+                value=random.uniform(100, 1000),
+                unit="кВт"
+            )
+
+def measure_bytes_per_reading(compact: bool, sensor_count: int = 30,
+                              readings_per_sensor: int = 10000) -> float:
+    gc.collect()
+    tracemalloc.start()
+    repository = InMemoryDataRepository(compact=compact)
+    baseline = tracemalloc.get_traced_memory()[0]
+    
+    for data in generate_readings(sensor_count, readings_per_sensor):
+        repository.store_sensor_data(data)
+    
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used / (sensor_count * readings_per_sensor)
+
+def run_memory_benchmark():
+    print("Память на одно показание датчика:")
+    regular = measure_bytes_per_reading(compact=False)
+    compact = measure_bytes_per_reading(compact=True)
+    print(f"  объекты SensorData:  {regular:8.1f} байт")
+    print(f"  компактные массивы:  {compact:8.1f} байт")
+    print(f"  экономия:            {regular / compact:8.1f}x")
+
+def run_repository_stress_test(writer_count: int = 4, reader_count: int = 4,
+                               batches_per_writer: int = 200, batch_size: int = 50):
+    """Одновременная запись и чтение репозитория из нескольких потоков"""
+    repository = InMemoryDataRepository(retention=RetentionPolicy(compaction_interval=0.01))
+    start = datetime.datetime.now() - datetime.timedelta(hours=1)
+    errors = []
+    writers_done = threading.Event()
+    
+    def writer(index: int):
+        try:
+            for batch_number in range(batches_per_writer):
+                batch = [SensorData(
+                    data_id=str(uuid.uuid4()),
+                    sensor_id=f"stress_{index}_{i % 5}",
+                    timestamp=start + datetime.timedelta(seconds=batch_number * batch_size + i),
+                    value=float(i)
+                ) for i in range(batch_size)]
+                repository.store_sensor_data_batch(batch)
+                repository.store_anomaly(Anomaly(
+                    anomaly_id=str(uuid.uuid4()), detection_time=batch[-1].timestamp,
+                    anomaly_type=AnomalyType.OVERLOAD, severity=SeverityLevel.HIGH,
+                    description="stress", status="detected", affected_object_id="sub_001",
+                    confidence_score=0.9
+                ))
+                repository.update_object_load("sub_001", float(batch_number))
+        except Exception as error:
+            errors.append(error)
+    
+    def reader():
+        try:
+            while not writers_done.is_set():
+                history = repository.get_historical_data(start, start + datetime.timedelta(hours=2))
+                timestamps = [d.timestamp for d in history]
+                if timestamps != sorted(timestamps):
+                    errors.append(AssertionError("История возвращена не по порядку"))
+                for anomaly in repository.get_active_anomalies():
+                    repository.update_anomaly_status(anomaly.anomaly_id, "analyzing")
+                repository.get_all_network_objects()
+        except Exception as error:
+            errors.append(error)
+    
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(writer_count)]
+    readers = [threading.Thread(target=reader) for _ in range(reader_count)]
+    started = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    repository.close()
+    elapsed = time.perf_counter() - started
+    
+    expected = writer_count * batches_per_writer * batch_size
+    stored = sum(len(series) for series in repository.series.values())
+    if stored != expected:
+        errors.append(AssertionError(f"Сохранено {stored} показаний из {expected}"))
+    if len(repository.get_all_anomalies()) != writer_count * batches_per_writer:
+        errors.append(AssertionError("Потеряны аномалии"))
+    
+    print(f"Нагрузочный тест репозитория: {expected} показаний, "
+          f"{writer_count} писателей, {reader_count} читателей, {elapsed:.2f} с")
+    if errors:
+        raise errors[0]
+    print("  гонок не обнаружено")
+
+def run_detection_benchmark(reading_count: int = 200000):
+    """Построчная проверка AnomalyDetectionStrategy против векторной по тем же показаниям"""
+    rng = random.Random(42)
+    objects = [Feeder(object_id=f"feeder_{i:05d}", name=f"Фидер {i}", object_type=NetworkObjectType.FEEDER,
+                      status="operational", location="", capacity=500.0) for i in range(1000)]
+    timestamp = datetime.datetime.now()
+    suffixes = [("power", SensorType.POWER, 100, 520), ("voltage", SensorType.VOLTAGE, 200, 240),
+                ("current", SensorType.CURRENT, 10, 100)]
+    readings, reading_objects, kinds = [], [], []
+    for i in range(reading_count):
+        obj = objects[i % len(objects)]
+        suffix, sensor_type, low, high = suffixes[i % len(suffixes)]
+        readings.append(SensorData(str(i), f"{obj.object_id}_{suffix}", timestamp, rng.uniform(low, high)))
+        reading_objects.append(obj)
+        kinds.append(sensor_type)
+    
+    strategy = AnomalyDetectionStrategy()
+    started = time.perf_counter()
+    per_reading = 0
+    for data, obj in zip(readings, reading_objects):
+        context = {"object_id": obj.object_id, "object_type": obj.object_type.value, "max_load": obj.capacity}
+        if strategy.execute_analysis([data], context):
+            per_reading += 1
+    per_reading_time = time.perf_counter() - started
+    
+    rule_engine = RuleEngineAnomalyStrategy()
+    started = time.perf_counter()
+    by_rules = sum(1 for data, obj, kind in zip(readings, reading_objects, kinds)
+                   if rule_engine.evaluate(data, kind, obj))
+    rules_time = time.perf_counter() - started
+    
+    vectorized = VectorizedAnomalyDetectionStrategy()
+    started = time.perf_counter()
+    batch = vectorized.execute_analysis(readings, {"objects": reading_objects, "kinds": kinds})
+    batch_time = time.perf_counter() - started
+    
+    # Как в мониторе: столбцы и срабатывания, Anomaly строится только для новых инцидентов
+    kind_of = dict(zip((data.sensor_id for data in readings), kinds)).get
+    started = time.perf_counter()
+    hits = vectorized.match(vectorized.columns(readings, reading_objects, kind_of))
+    hits_time = time.perf_counter() - started
+    
+    values = np.array([d.value for d in readings])
+    capacities = np.array([obj.capacity for obj in reading_objects])
+    codes = np.array([SENSOR_TYPE_CODES[kind] for kind in kinds], dtype=np.int8)
+    started = time.perf_counter()
+    overload, critical, voltage = vectorized.detect_arrays(values, capacities, codes)
+    arrays_time = time.perf_counter() - started
+    
+    if not per_reading == by_rules == len(batch) == len(hits) == len(overload) + len(voltage):
+        raise AssertionError("Результаты построчной и векторной проверки различаются")
+    
+    print(f"Обнаружение аномалий, {reading_count} показаний, {per_reading} срабатываний:")
+    print(f"  построчно:                   {per_reading_time * 1000:8.1f} мс")
+    print(f"  построчно (таблица правил):  {rules_time * 1000:8.1f} мс")
+    print(f"  векторно (из SensorData):    {batch_time * 1000:8.1f} мс")
+    print(f"  векторно (без Anomaly):      {hits_time * 1000:8.1f} мс")
+    print(f"  векторно (готовые массивы):  {arrays_time * 1000:8.1f} мс")
+
+def run_monitor_benchmark(substation_count: int = 200, ticks: int = 30):
+    """Полный цикл process_sensor_batch с пороговыми и потоковыми детекторами: построчно и векторно"""
+    print(f"Цикл опроса монитора, {substation_count} подстанций, {ticks} циклов:")
+    results = []
+    for vectorized in (False, True):
+        repository = InMemoryDataRepository(thread_safe=False)
+        monitor = NetworkMonitorController(repository, vectorized=vectorized)
+        monitor.monitoring_active = True
+        simulation = GridSimulation(repository, monitor, seed=7, start_time=datetime.datetime(2024, 1, 1))
+        simulation.build_grid(substation_count)
+        batches = [simulation.generate_readings(simulation.current_time + datetime.timedelta(seconds=5 * tick))
+                   for tick in range(ticks)]
+        
+        started = time.perf_counter()
+        anomalies = [anomaly for batch in batches for anomaly in monitor.process_sensor_batch(batch)]
+        elapsed = time.perf_counter() - started
+        results.append([(a.affected_object_id, a.anomaly_type, a.severity, a.detection_time, a.description)
+                        for a in anomalies])
+        readings = sum(len(batch) for batch in batches)
+        print(f"  {'векторно' if vectorized else 'построчно'}: {elapsed * 1000:8.1f} мс, "
+              f"{readings / elapsed:10,.0f} показаний/с, инцидентов {len(anomalies)}")
+    
+    if results[0] != results[1]:
+        raise AssertionError("Результаты построчной и векторной проверки различаются")
+
+def run_false_alarm_check(substation_count: int = 2, hours: float = 48.0, max_alerts: int = 2):
+    """Потоковые детекторы с настройками по умолчанию на обычной работе сети GridSimulation.
+    
+    Случайных аномалий симуляция не вносит, поэтому срабатываний должно быть почти ноль.
+    """
+    repository = InMemoryDataRepository(thread_safe=False)
+    monitor = NetworkMonitorController(repository, vectorized=True)
+    simulation = GridSimulation(repository, seed=11, start_time=datetime.datetime(2024, 1, 1))
+    simulation.build_grid(substation_count)
+    ticks = int(hours * 3600 / simulation.tick_interval)
+    
+    alerts = {type(detector).__name__: 0 for detector in monitor.streaming_detectors}
+    readings = 0
+    for tick in range(ticks):
+        batch = simulation.generate_readings(
+            simulation.current_time + datetime.timedelta(seconds=simulation.tick_interval * tick))
+        columns = monitor.batch_detector.columns([data for data, obj in batch], [obj for data, obj in batch],
+                                                 monitor.get_sensor_type)
+        for detector in monitor.streaming_detectors:
+            alerts[type(detector).__name__] += len(detector.detect_columns(columns))
+        readings += len(batch)
+    
+    print(f"Ложные срабатывания потоковых детекторов, {hours:.0f} ч, {readings} показаний:")
+    for name, count in alerts.items():
+        print(f"  {name}: {count}")
+    if sum(alerts.values()) > max_alerts:
+        raise AssertionError("Потоковые детекторы срабатывают на обычной работе сети")
+
+def run_sharded_detection_benchmark(substation_count: int = 200, ticks: int = 50,
+                                    worker_counts: Tuple[int, ...] = (0, 2, 4)):
+    """Пропускная способность проверки аномалий в основном потоке и в пуле процессов"""
+    print(f"Проверка аномалий в процессах (ядер: {os.cpu_count()}):")
+    results = []
+    for workers in worker_counts:
+        repository = InMemoryDataRepository(thread_safe=False)
+        monitor = NetworkMonitorController(repository, workers=workers)
+        monitor.monitoring_active = True
+        simulation = GridSimulation(repository, monitor, seed=7,
+                                    start_time=datetime.datetime(2024, 1, 1))
+        simulation.build_grid(substation_count)
+        try:
+            stats = simulation.run(ticks)
+        finally:
+            monitor.close()
+        results.append(sorted((a.affected_object_id, a.anomaly_type.name, a.detection_time)
+                              for a in repository.get_all_anomalies()))
+        print(f"  процессов {workers}: {stats.readings_per_second:10,.0f} показаний/с, "
+              f"инцидентов {stats.anomalies}")
+    
+    if any(result != results[0] for result in results):
+        raise AssertionError("Результаты проверки в процессах различаются")
+
+def run_report_benchmark(sensor_count: int = 300, readings_per_sensor: int = 2000):
+    """Показатели отчета: списки с отдельным проходом на показатель, итоги по датчикам
+    без объектов SensorData и часовые агрегаты с итогами только по краям периода"""
+    repository = InMemoryDataRepository(compact=True)
+    repository.store_sensor_data_batch(list(generate_readings(sensor_count, readings_per_sensor)))
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(days=1)
+    
+    def measure(build):
+        gc.collect()
+        started = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - started
+        # Память - отдельным прогоном, tracemalloc сильно замедляет выполнение
+        gc.collect()
+        tracemalloc.start()
+        build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, elapsed, peak
+    
+    def with_lists():
+        sensor_data = repository.get_historical_data(start, end)
+        power_data = [d for d in sensor_data if "power" in d.sensor_id.lower()]
+        return (len(sensor_data), sum(d.value for d in sensor_data) / len(sensor_data),
+                max(d.value for d in sensor_data), sum(d.value for d in power_data) / len(power_data))
+    
+    def sensor_totals():
+        stats = ReportStatistics().add_sensor_totals(repository.get_sensor_totals(start, end))
+        return stats.reading_count, stats.mean_value, stats.peak_value, stats.average_load
+    
+    def from_rollups():
+        stats = ReportController(repository).collect_statistics(start, end)
+        return stats.reading_count, stats.mean_value, stats.peak_value, stats.average_load
+    
+    lists_result, lists_time, lists_peak = measure(with_lists)
+    totals_result, totals_time, totals_peak = measure(sensor_totals)
+    rollup_result, rollup_time, rollup_peak = measure(from_rollups)
+    for result in (totals_result, rollup_result):
+        if lists_result[0] != result[0] or abs(lists_result[3] - result[3]) > 1e-6:
+            raise AssertionError("Показатели отчета различаются")
+    
+    print(f"Показатели отчета, {lists_result[0]} показаний:")
+    print(f"  списки:          {lists_time * 1000:8.1f} мс, пик памяти {lists_peak / 2**20:7.1f} МБ")
+    print(f"  по датчикам:     {totals_time * 1000:8.1f} мс, пик памяти {totals_peak / 2**20:7.1f} МБ")
+    print(f"  агрегаты:        {rollup_time * 1000:8.1f} мс, пик памяти {rollup_peak / 2**20:7.1f} МБ")
+
+if __name__ == "__main__":
+    run_memory_benchmark()
+    run_repository_stress_test()
+    run_detection_benchmark()
+    run_monitor_benchmark()
+    run_false_alarm_check()
+    run_sharded_detection_benchmark()
+    run_report_benchmark()
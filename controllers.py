@@ -1,10 +1,28 @@
 from implementations import *
 
 class NetworkMonitorController:
-    def __init__(self, repository: InMemoryDataRepository):
+    def __init__(self, repository: IDataRepository, vectorized: bool = False,
+                 rules_path: Optional[str] = None,
+                 quiet_period: datetime.timedelta = datetime.timedelta(minutes=5),
+                 workers: int = 0):
         self.repository = repository
+        # Повторные срабатывания по объекту и типу аномалии объединяются в инцидент
+        self.incidents = IncidentTracker(repository, quiet_period)
         self.monitoring_active = False
-        self.anomaly_detector = AnomalyDetectionStrategy()
+        # Пороговые правила из anomaly_rules.json, перечитываются при изменении файла
+        self.anomaly_detector = RuleEngineAnomalyStrategy(rules_path)
+        # Пакетная проверка целого цикла опроса средствами NumPy
+        self.batch_detector = VectorizedAnomalyDetectionStrategy(self.anomaly_detector) if vectorized else None
+        # Потоковые детекторы с O(1) состоянием на датчик дополняют пороговые правила.
+        # Это и есть скользящее состояние датчика: EWMA-среднее и дисперсия, суммы CUSUM.
+        # История показаний при проверке не читается, стоимость показания не растет с ее объемом
+        self.streaming_detectors: List[IAnalysisStrategy] = [
+            EwmaAnomalyStrategy(),
+            CusumAnomalyStrategy()
+        ]
+        # Проверка пакетов в workers процессах; потоковые детекторы живут в процессах
+        self.detection_pool = ShardedDetectionPool(workers, rules_path) if workers else None
+        self._sensor_types: Dict[str, Optional[SensorType]] = {}
     
     def start_monitoring(self):
         self.monitoring_active = True
@@ -30,35 +48,113 @@ class NetworkMonitorController:
     def get_active_anomalies(self) -> List[Anomaly]:
         return self.repository.get_active_anomalies()
     
+    def get_sensor_type(self, sensor_id: str) -> Optional[SensorType]:
+        if sensor_id not in self._sensor_types:
+            sensor = self.repository.get_sensor(sensor_id)
+            self._sensor_types[sensor_id] = sensor.sensor_type if sensor else \
+                SENSOR_SUFFIX_TYPES.get(sensor_id.rsplit("_", 1)[-1])
+        return self._sensor_types[sensor_id]
+    
     def detect_anomalies(self, sensor_data: SensorData, network_object: NetworkObject):
         if not self.monitoring_active:
             return
         
+        # Инциденты без срабатываний дольше периода затишья закрываются на любом пути проверки
+        self.incidents.close_quiet(sensor_data.timestamp)
+        sensor_type = self.get_sensor_type(sensor_data.sensor_id)
+        anomaly = self.anomaly_detector.evaluate(sensor_data, sensor_type, network_object)
+        
         context = {
             "object_id": network_object.object_id,
             "object_type": network_object.object_type.value,
-            "max_load": network_object.capacity
+            "sensor_type": sensor_type,
+            "network_object": network_object
         }
         
-        historical_data = self.repository.get_sensor_data(
-            sensor_data.sensor_id,
-            sensor_data.timestamp - datetime.timedelta(hours=24),
-            sensor_data.timestamp
-        )
-        
-        anomaly = self.anomaly_detector.execute_analysis(
-            historical_data + [sensor_data],
-            context
-        )
+        # Потоковые детекторы обновляют состояние на каждом показании
+        for detector in self.streaming_detectors:
+            detected = detector.execute_analysis([sensor_data], context)
+            anomaly = anomaly or detected
         
         if anomaly:
-            self.repository.store_anomaly(anomaly)
-            return anomaly
+            # Наружу возвращаются только новые инциденты
+            return self.incidents.register(anomaly)
         
         return None
 
+    def process_sensor_batch(self, readings: List[Tuple[SensorData, NetworkObject]]) -> List[Anomaly]:
+        """Сохранение пакета показаний одной операцией и анализ всего пакета"""
+        self.repository.store_sensor_data_batch([data for data, obj in readings])
+        
+        if self.detection_pool:
+            anomalies = self._detect_batch_sharded(readings)
+        elif self.batch_detector:
+            anomalies = self._detect_batch_vectorized(readings)
+        else:
+            # detect_anomalies сам закрывает затихшие инциденты на каждом показании
+            anomalies = []
+            for sensor_data, network_object in readings:
+                anomaly = self.detect_anomalies(sensor_data, network_object)
+                if anomaly:
+                    anomalies.append(anomaly)
+            return anomalies
+        
+        if readings:
+            self.incidents.close_quiet(max(data.timestamp for data, obj in readings))
+        return anomalies
+
+    def _detect_batch_sharded(self, readings: List[Tuple[SensorData, NetworkObject]]) -> List[Anomaly]:
+        anomalies = self.detection_pool.detect(
+            [(data, obj, self.get_sensor_type(data.sensor_id)) for data, obj in readings],
+            self.monitoring_active
+        )
+        return [anomaly for anomaly in anomalies if self.incidents.register(anomaly)]
+    
+    def close(self):
+        if self.detection_pool:
+            self.detection_pool.close()
+            self.detection_pool = None
+
+    def _detect_batch_vectorized(self, readings: List[Tuple[SensorData, NetworkObject]]) -> List[Anomaly]:
+        if not self.monitoring_active:
+            return []
+        
+        # Пакет собирается в столбцы один раз; Anomaly строится только для новых инцидентов
+        data, objects = map(list, zip(*readings)) if readings else ([], [])
+        columns = self.batch_detector.columns(data, objects, self.get_sensor_type)
+        found = dict(self.batch_detector.match(columns))
+        
+        # Пороговое срабатывание по показанию важнее потокового, первый детектор важнее следующих,
+        # как и в построчном режиме
+        for detector in self.streaming_detectors:
+            if hasattr(detector, "detect_columns"):
+                hits = detector.detect_columns(columns)
+            else:
+                hits = []
+                for index, (sensor_data, network_object) in enumerate(readings):
+                    context = {"object_id": network_object.object_id,
+                               "object_type": network_object.object_type.value,
+                               "sensor_type": self.get_sensor_type(sensor_data.sensor_id),
+                               "network_object": network_object}
+                    detected = detector.execute_analysis([sensor_data], context)
+                    if detected:
+                        hits.append((index, (detected.anomaly_type, detected.severity,
+                                             lambda anomaly=detected: anomaly)))
+            for index, hit in hits:
+                found.setdefault(index, hit)
+        
+        anomalies = []
+        for index in sorted(found):
+            anomaly_type, severity, build = found[index]
+            sensor_data = data[index]
+            anomaly = self.incidents.register_hit(objects[index].object_id, anomaly_type, sensor_data.unit,
+                                                  sensor_data.timestamp, sensor_data.value, severity, build)
+            if anomaly:
+                anomalies.append(anomaly)
+        return anomalies
+
 class RecommendationController:
-    def __init__(self, repository: InMemoryDataRepository):
+    def __init__(self, repository: IDataRepository):
         self.repository = repository
     
     def generate_recommendation(self, anomaly: Anomaly) -> Recommendation:
@@ -94,102 +190,461 @@ class RecommendationController:
         return recommendation
     
     def approve_recommendation(self, recommendation_id: str, user_id: str):
-        for rec in self.repository.recommendations:
-            if rec.recommendation_id == recommendation_id:
-                rec.status = "approved"
-                rec.executor_id = user_id
-                return True
-        return False
+        return self.repository.update_recommendation_status(
+            recommendation_id, "approved", executor_id=user_id
+        )
+    
+    def get_top_pending(self, limit: int = 10) -> List[Recommendation]:
+        return self.repository.get_pending_recommendations(limit)
+    
+    def reject_recommendation(self, recommendation_id: str, user_id: str):
+        return self.repository.update_recommendation_status(
+            recommendation_id, "rejected", executor_id=user_id
+        )
 
 class ForecastController:
-    def __init__(self, repository: InMemoryDataRepository):
+    # Длительность периода прогноза; кэш действует до конца текущего периода
+    PERIOD_LENGTHS = {
+        "hourly": datetime.timedelta(hours=1),
+        "daily": datetime.timedelta(days=1),
+        "weekly": datetime.timedelta(weeks=1)
+    }
+    HISTORY_DEPTH = datetime.timedelta(days=7)
+    # Две недели - чтобы оценить недельную сезонность
+    SEASONAL_HISTORY_DEPTH = datetime.timedelta(days=14)
+    
+    def __init__(self, repository: IDataRepository,
+                 clock: Callable[[], datetime.datetime] = datetime.datetime.now):
         self.repository = repository
         self.forecast_strategy = LoadForecastStrategy()
+        # Сезонный прогноз всех объектов сети за один проход
+        self.seasonal_strategy = HoltWintersForecastStrategy()
+        # Источник текущего времени; при воспроизведении истории - модельные часы
+        self.clock = clock
+        # (object_id, период) -> (прогноз, момент устаревания)
+        self.forecast_cache: Dict[Tuple[str, str], Tuple[LoadForecast, datetime.datetime]] = {}
+        # Фактическая точность прогнозов по поступающим показаниям мощности
+        self.accuracy = ForecastAccuracyTracker(self.PERIOD_LENGTHS)
+        self._power_sensors: Dict[str, bool] = {}
+    
+    def get_power_sensor_ids(self, object_id: str) -> List[str]:
+        sensor_ids = [sensor.sensor_id for sensor in self.repository.get_sensors_for_object(object_id)
+                      if sensor.sensor_type == SensorType.POWER]
+        return sensor_ids or [f"{object_id}_power"]
+    
+    def get_power_history(self, object_id: str, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> List[SensorData]:
+        """Показания мощности только этого объекта - по индексу датчиков объекта"""
+        sensor_ids = self.get_power_sensor_ids(object_id)
+        if len(sensor_ids) == 1:
+            return self.repository.get_sensor_data(sensor_ids[0], start_time, end_time)
+        return list(heapq.merge(
+            *(self.repository.get_sensor_data(sensor_id, start_time, end_time) for sensor_id in sensor_ids),
+            key=lambda d: d.timestamp
+        ))
     
-    def create_load_forecast(self, object_id: str, weather_data: Optional[WeatherData] = None) -> LoadForecast:
+    def create_load_forecast(self, object_id: str, weather_data: Optional[WeatherData] = None,
+                             use_cache: bool = True) -> LoadForecast:
+        now = self.clock()
+        weather_factor = weather_data.temperature / 20.0 if weather_data else 1.0
+        
+        cached = self._cached(object_id, "hourly", now, weather_factor) if use_cache else None
+        if cached:
+            return cached
+        
         context = {
             "object_id": object_id,
-            "weather_factor": weather_data.temperature / 20.0 if weather_data else 1.0
+            "weather_factor": weather_factor,
+            "now": now
         }
-        
-        # Получаем исторические данные
-        historical_data = self.repository.get_historical_data(
-            datetime.datetime.now() - datetime.timedelta(days=7),
-            datetime.datetime.now()
-        )
+        historical_data = self.get_power_history(object_id, now - self.HISTORY_DEPTH, now)
         
         forecast = self.forecast_strategy.execute_analysis(historical_data, context)
-        self.repository.forecasts.append(forecast)
+        self._store(forecast, now)
         return forecast
     
-    def get_latest_forecast(self, object_id: str) -> Optional[LoadForecast]:
-        forecasts = [f for f in self.repository.forecasts if f.object_id == object_id]
-        if forecasts:
-            return max(forecasts, key=lambda x: x.forecast_time)
+    def create_grid_forecasts(self, object_ids: Optional[List[str]] = None,
+                              weather_data: Optional[WeatherData] = None,
+                              use_cache: bool = True) -> List[LoadForecast]:
+        """Часовой, суточный и недельный прогнозы объектов одним проходом HoltWintersForecastStrategy"""
+        now = self.clock()
+        weather_factor = weather_data.temperature / 20.0 if weather_data else 1.0
+        if object_ids is None:
+            object_ids = [obj.object_id for obj in self.repository.get_all_network_objects()]
+        
+        # Действующие прогнозы из кэша остаются, пересчитываются только устаревшие горизонты
+        forecasts = []
+        stale: Dict[str, List[str]] = {}
+        for object_id in object_ids:
+            for period in HoltWintersForecastStrategy.HORIZONS:
+                cached = self._cached(object_id, period, now, weather_factor) if use_cache else None
+                if cached:
+                    forecasts.append(cached)
+                else:
+                    stale.setdefault(object_id, []).append(period)
+        if not stale:
+            return forecasts
+        
+        start = now - self.SEASONAL_HISTORY_DEPTH
+        data = []
+        object_of_sensor = {}
+        for object_id in stale:
+            for sensor_id in self.get_power_sensor_ids(object_id):
+                object_of_sensor[sensor_id] = object_id
+            data.extend(self.get_power_history(object_id, start, now))
+        
+        fresh = self.seasonal_strategy.execute_analysis(data, {
+            "object_ids": list(stale),
+            "periods": stale,
+            "object_of_sensor": object_of_sensor,
+            "start": start,
+            "now": now,
+            "weather_factor": weather_factor
+        })
+        for forecast in fresh:
+            self._store(forecast, now)
+        forecasts.extend(fresh)
+        
+        # Без истории мощности сезонность не оценить - простой прогноз на час
+        covered = {forecast.object_id for forecast in fresh}
+        for object_id, periods in stale.items():
+            if object_id not in covered and "hourly" in periods:
+                forecasts.append(self.create_load_forecast(object_id, weather_data, use_cache=False))
+        return forecasts
+    
+    def _cached(self, object_id: str, period: str, now: datetime.datetime,
+                weather_factor: float) -> Optional[LoadForecast]:
+        cached = self.forecast_cache.get((object_id, period))
+        if (cached and cached[0].forecast_time <= now < cached[1]
+                and cached[0].weather_factor == weather_factor):
+            return cached[0]
         return None
+    
+    def observe_readings(self, readings: List[Tuple[SensorData, NetworkObject]]):
+        """Учет показаний мощности в точности ранее сделанных прогнозов"""
+        for data, network_object in readings:
+            if self._is_power_sensor(data.sensor_id):
+                self.accuracy.observe(network_object.object_id, data.timestamp, data.value)
+    
+    def get_forecast_accuracy(self, object_id: Optional[str] = None,
+                              period: str = "hourly") -> Optional[AccuracyStats]:
+        return self.accuracy.get(object_id, period)
+    
+    def _is_power_sensor(self, sensor_id: str) -> bool:
+        if sensor_id not in self._power_sensors:
+            sensor = self.repository.get_sensor(sensor_id)
+            sensor_type = sensor.sensor_type if sensor else \
+                SENSOR_SUFFIX_TYPES.get(sensor_id.rsplit("_", 1)[-1])
+            self._power_sensors[sensor_id] = sensor_type == SensorType.POWER
+        return self._power_sensors[sensor_id]
+    
+    def _store(self, forecast: LoadForecast, now: datetime.datetime):
+        self.repository.store_forecast(forecast)
+        self.accuracy.track(forecast)
+        period = self.PERIOD_LENGTHS.get(forecast.forecast_period, self.PERIOD_LENGTHS["hourly"])
+        self.forecast_cache[(forecast.object_id, forecast.forecast_period)] = \
+            (forecast, floor_time(now, period) + period)
+    
+    def invalidate_cache(self, object_id: Optional[str] = None):
+        if object_id is None:
+            self.forecast_cache.clear()
+        else:
+            for period in self.PERIOD_LENGTHS:
+                self.forecast_cache.pop((object_id, period), None)
+    
+    def get_latest_forecast(self, object_id: str, period: str = "hourly") -> Optional[LoadForecast]:
+        return self.repository.get_latest_forecast(object_id, period)
+
+class ReportCancelled(Exception):
+    """Построение отчета остановлено по запросу пользователя"""
 
 class ReportController:
-    def __init__(self, repository: InMemoryDataRepository):
+    # Глубина отчета в полных сутках, которыми заканчивается период
+    PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+    
+    def __init__(self, repository: IDataRepository,
+                 clock: Callable[[], datetime.datetime] = datetime.datetime.now):
         self.repository = repository
+        self.clock = clock
+    
+    def period_bounds(self, report_type: str) -> Tuple[datetime.datetime, datetime.datetime]:
+        """Период отчета: полные сутки до начала текущих, по инциденту - последние 24 часа"""
+        now = self.clock()
+        if report_type not in self.PERIOD_DAYS:
+            return now - datetime.timedelta(days=1), now
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return (today - datetime.timedelta(days=self.PERIOD_DAYS[report_type]),
+                today - datetime.timedelta(microseconds=1))
     
     def generate_report(self, report_type: str, start_date: datetime.datetime,
-                       end_date: datetime.datetime, created_by: str) -> Report:
-        anomalies = [a for a in self.repository.anomalies 
-                    if start_date <= a.detection_time <= end_date]
-        sensor_data = self.repository.get_historical_data(start_date, end_date)
+                       end_date: datetime.datetime, created_by: str,
+                       progress: Optional[Callable[[float], None]] = None,
+                       cancel_event: Optional[threading.Event] = None,
+                       use_cache: bool = True) -> Report:
+        """progress получает долю выполненной работы; при установленном cancel_event
+        построение прерывается исключением ReportCancelled.
         
-        if report_type == "daily":
-            title = f"Ежедневный отчет за {start_date.date()}"
-            content = self._generate_daily_content(anomalies, sensor_data)
-        elif report_type == "weekly":
-            title = f"Еженедельный отчет за {start_date.date()} - {end_date.date()}"
-            content = self._generate_weekly_content(anomalies, sensor_data)
+        Содержание отчета за закрытый период (end_date уже прошел) берется из кэша репозитория.
+        """
+        closed = use_cache and end_date < self.clock()
+        cached = self.repository.get_cached_report(report_type, start_date, end_date) if closed else None
+        if cached:
+            title, content = cached
         else:
-            title = f"Отчет за период {start_date.date()} - {end_date.date()}"
-            content = self._generate_general_content(anomalies, sensor_data)
+            # Запись в период отчета во время построения не даст закэшировать устаревший результат
+            build = self.repository.begin_cached_report(report_type, start_date, end_date) if closed else None
+            try:
+                title, content = self._build_report(report_type, start_date, end_date,
+                                                    progress, cancel_event)
+            except BaseException:
+                if build is not None:
+                    self.repository.discard_cached_report(build)
+                raise
+            if build is not None:
+                self.repository.store_cached_report(build, title, content)
+        if progress:
+            progress(1.0)
         
         report = Report(
             report_id=str(uuid.uuid4()),
             title=title,
             report_type=report_type,
-            creation_date=datetime.datetime.now(),
+            creation_date=self.clock(),
             content=content,
             created_by=created_by
         )
         
-        self.repository.reports.append(report)
+        self.repository.store_report(report)
         return report
     
-    def _generate_daily_content(self, anomalies: List[Anomaly], sensor_data: List[SensorData]) -> str:
+    def _build_report(self, report_type: str, start_date: datetime.datetime,
+                      end_date: datetime.datetime, progress: Optional[Callable[[float], None]],
+                      cancel_event: Optional[threading.Event]) -> Tuple[str, str]:
+        stats = self.collect_statistics(start_date, end_date, progress, cancel_event)
+        
+        if report_type == "daily":
+            title = f"Ежедневный отчет за {start_date.date()}"
+            content = self._generate_daily_content(stats)
+        elif report_type == "weekly":
+            title = f"Еженедельный отчет за {start_date.date()} - {end_date.date()}"
+            content = self._generate_weekly_content(stats)
+        else:
+            title = f"Отчет за период {start_date.date()} - {end_date.date()}"
+            content = self._generate_general_content(stats)
+        return title, content
+    
+    def collect_statistics(self, start_date: datetime.datetime, end_date: datetime.datetime,
+                           progress: Optional[Callable[[float], None]] = None,
+                           cancel_event: Optional[threading.Event] = None) -> ReportStatistics:
+        """Все показатели отчета за один проход по аномалиям и агрегатам периода.
+        
+        Целые сутки и часы периода берутся из агрегатов репозитория, для неполных
+        часов по краям - итоги показаний по датчикам.
+        """
+        stats = ReportStatistics()
+        stats.add_anomalies(self.repository.iter_anomalies_between(start_date, end_date))
+        segments = self.split_period(start_date, end_date)
+        for number, (period, segment_start, segment_end) in enumerate(segments):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ReportCancelled()
+            if period is None:
+                stats.add_sensor_totals(self.repository.get_sensor_totals(segment_start, segment_end))
+            else:
+                for object_id, sensor_type, bucket in self.repository.get_rollups(
+                        period, segment_start, segment_end):
+                    stats.add_bucket(bucket, sensor_type == SensorType.POWER)
+            if progress:
+                progress((number + 1) / len(segments))
+        return stats
+    
+    def split_period(self, start_date: datetime.datetime, end_date: datetime.datetime
+                     ) -> List[Tuple[Optional[str], datetime.datetime, datetime.datetime]]:
+        """Разбиение [start_date, end_date] на (период агрегата, начало, конец).
+        
+        Для агрегатов начало и конец - границы начал интервалов; для неполных
+        часов (период None) - границы исходных показаний, включительно.
+        """
+        resolution = datetime.timedelta(microseconds=1)
+        levels = list(RollupCube.PERIODS.items())[::-1]  # от суток к часам
+        segments = []
+        
+        def split(level: int, lo: datetime.datetime, hi: datetime.datetime):
+            # Полуинтервал [lo, hi)
+            if lo >= hi:
+                return
+            if level == len(levels):
+                segments.append((None, lo, hi - resolution))
+                return
+            period, width = levels[level]
+            first = floor_time(lo, width)
+            if first < lo:
+                first += width
+            last = floor_time(hi, width)
+            if first >= last:
+                split(level + 1, lo, hi)
+                return
+            split(level + 1, lo, first)
+            segments.append((period, first, last - width))
+            split(level + 1, last, hi)
+        
+        split(0, start_date, end_date + resolution)
+        return segments
+    
+    def get_load_trend(self, period: str, start_date: datetime.datetime,
+                       end_date: datetime.datetime) -> List[AggregateBucket]:
+        """Мощность по всей сети на каждый интервал period, по возрастанию времени"""
+        totals: Dict[datetime.datetime, AggregateBucket] = {}
+        for object_id, sensor_type, bucket in self.repository.get_rollups(
+                period, start_date, end_date, sensor_type=SensorType.POWER):
+            total = totals.get(bucket.start)
+            if total is None:
+                total = totals[bucket.start] = AggregateBucket(bucket.start)
+            total.merge(bucket)
+        return [totals[start] for start in sorted(totals)]
+    
+    def _generate_daily_content(self, stats: ReportStatistics) -> str:
         return f"""Ежедневный отчет
 ========================
-Всего аномалий: {len(anomalies)}
-Критические: {sum(1 for a in anomalies if a.severity == SeverityLevel.CRITICAL)}
-Высокой важности: {sum(1 for a in anomalies if a.severity == SeverityLevel.HIGH)}
-Средней важности: {sum(1 for a in anomalies if a.severity == SeverityLevel.MEDIUM)}
+Всего аномалий: {stats.anomaly_count}
+Критические: {stats.severity_count(SeverityLevel.CRITICAL)}
+Высокой важности: {stats.severity_count(SeverityLevel.HIGH)}
+Средней важности: {stats.severity_count(SeverityLevel.MEDIUM)}
 
-Записей данных: {len(sensor_data)}
-Среднее значение: {sum(d.value for d in sensor_data)/len(sensor_data) if sensor_data else 0:.2f}
+Записей данных: {stats.reading_count}
+Среднее значение: {stats.mean_value:.2f}
 """
     
-    def _generate_weekly_content(self, anomalies: List[Anomaly], sensor_data: List[SensorData]) -> str:
+    def _generate_weekly_content(self, stats: ReportStatistics) -> str:
         return f"""Еженедельный отчет
 ===========================
 Статистика за неделю:
-- Всего аномалий: {len(anomalies)}
-- Решено аномалий: {sum(1 for a in anomalies if a.status == 'resolved')}
-- Ожидают решения: {sum(1 for a in anomalies if a.status in ['detected', 'analyzing'])}
-- Объем данных: {len(sensor_data)} записей
+- Всего аномалий: {stats.anomaly_count}
+- Решено аномалий: {stats.status_count('resolved')}
+- Ожидают решения: {stats.status_count('detected', 'analyzing')}
+- Объем данных: {stats.reading_count} записей
 
 Тенденции:
-- Средняя нагрузка сети: {self._calculate_average_load(sensor_data):.2f}
-- Пиковая нагрузка: {max(d.value for d in sensor_data) if sensor_data else 0:.2f}
+- Средняя нагрузка сети: {stats.average_load:.2f}
+- Пиковая нагрузка: {stats.peak_value:.2f}
+"""
+    
+    def _generate_general_content(self, stats: ReportStatistics) -> str:
+        return f"""Отчет за период
+========================
+Аномалии:
+- Всего: {stats.anomaly_count}
+- Критические: {stats.severity_count(SeverityLevel.CRITICAL)}
+- Высокой важности: {stats.severity_count(SeverityLevel.HIGH)}
+- Решено: {stats.status_count('resolved')}
+- Ожидают решения: {stats.status_count('detected', 'analyzing')}
+
+Данные:
+- Записей данных: {stats.reading_count}
+- Среднее значение: {stats.mean_value:.2f}
+- Средняя нагрузка сети: {stats.average_load:.2f}
+- Пиковая нагрузка: {stats.peak_value:.2f}
 """
 
-    def _calculate_average_load(self, sensor_data: List[SensorData]) -> float:
-        if not sensor_data:
-            return 0.0
-        power_data = [d for d in sensor_data if "power" in d.sensor_id.lower()]
-        if power_data:
-            return sum(d.value for d in power_data) / len(power_data)
-        return sum(d.value for d in sensor_data) / len(sensor_data)
+class ReportJobController:
+    """Очередь заданий на построение отчетов, выполняемых пулом рабочих потоков.
+    
+    Поток Tk только ставит и отменяет задания и читает их состояние. on_update
+    вызывается из рабочего потока - виджеты из него не трогать.
+    """
+    
+    def __init__(self, report_controller: ReportController, workers: int = 2,
+                 on_update: Optional[Callable[[ReportJob], None]] = None):
+        self.report_controller = report_controller
+        self.on_update = on_update
+        self.jobs: Dict[str, ReportJob] = {}  # в порядке постановки
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                               thread_name_prefix="report")
+    
+    def submit(self, report_type: str, start_date: datetime.datetime,
+               end_date: datetime.datetime, created_by: str) -> ReportJob:
+        job = ReportJob(
+            job_id=str(uuid.uuid4()),
+            report_type=report_type,
+            start_date=start_date,
+            end_date=end_date,
+            created_by=created_by,
+            submitted_time=datetime.datetime.now()
+        )
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._cancel_events[job.job_id] = threading.Event()
+        self._executor.submit(self._run, job)
+        return job
+    
+    def cancel(self, job_id: str) -> bool:
+        """Задание в очереди снимается сразу, выполняемое - на ближайшей проверке"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            self._cancel_events[job_id].set()
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+        self._notify(job)
+        return True
+    
+    def get_job(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+    
+    def get_jobs(self) -> List[ReportJob]:
+        with self._lock:
+            return list(self.jobs.values())
+    
+    def get_active_jobs(self) -> List[ReportJob]:
+        return [job for job in self.get_jobs() if not job.finished]
+    
+    def close(self):
+        """Отменить задания и дождаться выполняющихся - после этого репозиторий можно закрывать"""
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _run(self, job: ReportJob):
+        with self._lock:
+            if job.finished:
+                return
+            job.status = "running"
+            cancel_event = self._cancel_events[job.job_id]
+        self._notify(job)
+        
+        try:
+            report = self.report_controller.generate_report(
+                job.report_type, job.start_date, job.end_date, job.created_by,
+                progress=lambda fraction: self._set_progress(job, fraction),
+                cancel_event=cancel_event
+            )
+        except ReportCancelled:
+            status, report, error = "cancelled", None, None
+        except Exception as e:
+            status, report, error = "failed", None, str(e)
+        else:
+            status, error = "done", None
+        
+        with self._lock:
+            job.report = report
+            job.error = error
+            self._finish(job, status)
+        self._notify(job)
+    
+    def _finish(self, job: ReportJob, status: str):
+        job.status = status
+        job.finished_time = datetime.datetime.now()
+        if status == "done":
+            job.progress = 1.0
+        self._cancel_events.pop(job.job_id, None)
+    
+    def _set_progress(self, job: ReportJob, fraction: float):
+        job.progress = fraction
+        self._notify(job)
+    
+    def _notify(self, job: ReportJob):
+        if self.on_update:
+            self.on_update(job)
@@ -60,6 +60,15 @@ class SensorData:
     timestamp: datetime.datetime
     value: float
     unit: str = ""
+    # Исходное показание - одна выборка; агрегаты уровней хранения - AggregatedSensorData
+    sample_count: ClassVar[int] = 1
+
+@dataclass
+class AggregatedSensorData(SensorData):
+    """Агрегат уровня хранения вместо исходных показаний интервала: value - среднее"""
+    sample_count: int = 1
+    min_value: float = 0.0
+    max_value: float = 0.0
 
 @dataclass
 class WeatherData:
@@ -81,6 +90,16 @@ class Anomaly:
     affected_object_id: str
     confidence_score: float
     recommended_action: str = ""
+    # Повторные срабатывания того же инцидента
+    last_seen: Optional[datetime.datetime] = None
+    peak_value: Optional[float] = None
+    occurrence_count: int = 1
+    closed_time: Optional[datetime.datetime] = None  # инцидент закрыт после периода затишья
+    peak_unit: str = ""  # единица peak_value - единица показания, вызвавшего срабатывание
+    
+    def __post_init__(self):
+        if self.last_seen is None:
+            self.last_seen = self.detection_time
     
     def __str__(self):
         return f"{self.anomaly_type.value}: {self.description}"
@@ -125,6 +144,24 @@ class Report:
     content: str
     created_by: str
 
+@dataclass
+class ReportJob:
+    job_id: str
+    report_type: str
+    start_date: datetime.datetime
+    end_date: datetime.datetime
+    created_by: str
+    status: str = "queued"  # "queued", "running", "done", "cancelled", "failed"
+    progress: float = 0.0   # доля выполненной работы, от 0 до 1
+    submitted_time: Optional[datetime.datetime] = None
+    finished_time: Optional[datetime.datetime] = None
+    report: Optional[Report] = None
+    error: Optional[str] = None
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
 @dataclass
 class MaintenanceTask:
     task_id: str
@@ -4,13 +4,33 @@ import random
 import tkinter as tk
 from tkinter import messagebox, ttk
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Tuple, Iterable, Iterator, ClassVar
 import abc
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 import threading
 import time
+import math
+import bisect
+import heapq
+import itertools
+import operator
+from collections import deque
+import sqlite3
+import multiprocessing
+import concurrent.futures
+import zlib
+import warnings
+import json
+import os
+import sys
+import urllib.request
+import dataclasses
+from array import array
+from contextlib import contextmanager, nullcontext
+from functools import partial
 from enum import Enum
 
 class UserRole(Enum):
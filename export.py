@@ -0,0 +1,124 @@
+from controllers import *
+from replay import CSV_FIELDS
+import argparse
+import csv
+import gzip
+
+# Потоковая выгрузка истории показаний, аномалий и отчетов в CSV или NDJSON (JSON по строке
+# на запись). Записи читаются из репозитория страницами и пишутся порциями по chunk_size,
+# поэтому память не зависит от длины выгружаемого периода.
+# Показания:  python export.py history smartgrid.db history.csv.gz --start 2024-01-01 --end 2024-02-01
+# Аномалии:   python export.py anomalies smartgrid.db anomalies.ndjson
+# Отчеты:     python export.py reports smartgrid.db reports.ndjson.gz
+# Столбцы выгрузки показаний в CSV те же, что у записи истории в replay.py.
+
+EXPORT_FORMATS = ("csv", "ndjson")
+ANOMALY_FIELDS = [field.name for field in dataclasses.fields(Anomaly)]
+REPORT_FIELDS = [field.name for field in dataclasses.fields(Report)]
+
+def export_format(path: str) -> str:
+    """Формат по расширению файла: .ndjson/.jsonl - NDJSON, иначе CSV"""
+    name = path[:-3] if path.endswith(".gz") else path
+    return "ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv"
+
+def open_export(path: str, compress: Optional[bool] = None):
+    """Текстовый файл для записи; compress=None - сжатие gzip по расширению .gz"""
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+    return open(path, "w", encoding="utf-8", newline="")
+
+def export_value(value: Any) -> Any:
+    # Перечисления - по имени, как в базе; время - в формате, который читает replay.py
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+def sensor_data_row(data: SensorData) -> list:
+    return [data.data_id, data.timestamp.isoformat(sep=" "), data.sensor_id, data.value, data.unit]
+
+def dataclass_row(fields: List[str]) -> Callable[[Any], list]:
+    return lambda record: [export_value(getattr(record, name)) for name in fields]
+
+def export_records(records: Iterable[Any], fields: List[str], to_row: Callable[[Any], list],
+                   path: str, fmt: Optional[str] = None, compress: Optional[bool] = None,
+                   chunk_size: int = 10000) -> int:
+    """Записать записи в path порциями по chunk_size; возвращает число записей"""
+    fmt = fmt or export_format(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    
+    count = 0
+    records = iter(records)
+    with open_export(path, compress) as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        while True:
+            rows = [to_row(record) for record in itertools.islice(records, chunk_size)]
+            if not rows:
+                break
+            if writer:
+                writer.writerows(rows)
+            else:
+                f.write("".join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n"
+                                for row in rows))
+            count += len(rows)
+    return count
+
+def export_history(repository: IDataRepository, start_time: datetime.datetime,
+                   end_time: datetime.datetime, path: str, fmt: Optional[str] = None,
+                   compress: Optional[bool] = None, chunk_size: int = 10000) -> int:
+    return export_records(repository.iter_historical_data(start_time, end_time), CSV_FIELDS,
+                          sensor_data_row, path, fmt, compress, chunk_size)
+
+def export_anomalies(repository: IDataRepository, start_time: datetime.datetime,
+                     end_time: datetime.datetime, path: str, fmt: Optional[str] = None,
+                     compress: Optional[bool] = None, chunk_size: int = 10000) -> int:
+    return export_records(repository.iter_anomalies_between(start_time, end_time), ANOMALY_FIELDS,
+                          dataclass_row(ANOMALY_FIELDS), path, fmt, compress, chunk_size)
+
+def export_reports(repository: IDataRepository, path: str, fmt: Optional[str] = None,
+                   compress: Optional[bool] = None, chunk_size: int = 10000) -> int:
+    return export_records(repository.iter_reports(), REPORT_FIELDS, dataclass_row(REPORT_FIELDS),
+                          path, fmt, compress, chunk_size)
+
+def parse_time(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка показаний, аномалий и отчетов из базы")
+    parser.add_argument("kind", choices=["history", "anomalies", "reports"])
+    parser.add_argument("database", help="база SqliteDataRepository")
+    parser.add_argument("output", help="файл выгрузки (.csv, .ndjson, с .gz - сжатый)")
+    parser.add_argument("--start", type=parse_time, default=datetime.datetime.min)
+    parser.add_argument("--end", type=parse_time, default=datetime.datetime.max)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None,
+                        help="формат (по умолчанию - по расширению файла)")
+    parser.add_argument("--gzip", action="store_true", default=None, help="сжать gzip")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="записей в порции")
+    args = parser.parse_args()
+    if not os.path.exists(args.database):
+        parser.error(f"База не найдена: {args.database}")
+    
+    # Выгрузка не должна менять базу: соединение только для чтения
+    repository = SqliteDataRepository(args.database, read_only=True)
+    started = time.perf_counter()
+    try:
+        if args.kind == "history":
+            count = export_history(repository, args.start, args.end, args.output,
+                                   args.format, args.gzip, args.chunk_size)
+        elif args.kind == "anomalies":
+            count = export_anomalies(repository, args.start, args.end, args.output,
+                                     args.format, args.gzip, args.chunk_size)
+        else:
+            count = export_reports(repository, args.output, args.format, args.gzip, args.chunk_size)
+    finally:
+        repository.close()
+    print(f"Выгружено записей: {count} в {args.output} за {time.perf_counter() - started:.2f} с")
+
+if __name__ == "__main__":
+    main()
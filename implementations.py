@@ -1,79 +1,1783 @@
 from interfaces import *
 
-class InMemoryDataRepository(IDataRepository):
+class SensorSeries:
+    """Показания одного датчика, упорядоченные по времени"""
     def __init__(self):
-        self.sensor_data: List[SensorData] = []
-        self.anomalies: List[Anomaly] = []
+        self.timestamps: List[datetime.datetime] = []
+        self.readings: List[SensorData] = []
+    
+    def __len__(self):
+        return len(self.readings)
+    
+    def append(self, data: SensorData):
+        # Показания почти всегда приходят по порядку - добавляем в конец
+        if not self.timestamps or data.timestamp >= self.timestamps[-1]:
+            self.timestamps.append(data.timestamp)
+            self.readings.append(data)
+        else:
+            index = bisect.bisect_right(self.timestamps, data.timestamp)
+            self.timestamps.insert(index, data.timestamp)
+            self.readings.insert(index, data)
+    
+    def range(self, start_time: datetime.datetime, 
+              end_time: datetime.datetime) -> List[SensorData]:
+        lo = bisect.bisect_left(self.timestamps, start_time)
+        hi = bisect.bisect_right(self.timestamps, end_time)
+        return self.readings[lo:hi]
+    
+    def totals(self, start_time: datetime.datetime, end_time: datetime.datetime) -> "AggregateBucket":
+        bucket = AggregateBucket(start_time)
+        for data in self.range(start_time, end_time):
+            bucket.add(data.value)
+        return bucket
+    
+    def span(self) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        return (self.timestamps[0], self.timestamps[-1]) if self.timestamps else None
+    
+    def truncate_before(self, cutoff: datetime.datetime):
+        index = bisect.bisect_left(self.timestamps, cutoff)
+        if index:
+            del self.timestamps[:index]
+            del self.readings[:index]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def to_epoch_ns(timestamp: datetime.datetime) -> int:
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+def from_epoch_ns(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=value // 1000)
+
+class CompactSensorSeries:
+    """Показания одного датчика в типизированных массивах (8 + 8 байт на показание)"""
+    def __init__(self, sensor_id: str, unit: str = ""):
+        # Идентификатор и единица измерения хранятся один раз на весь ряд
+        self.sensor_id = sensor_id
+        self.unit = unit
+        self.timestamps = array("q")
+        self.values = array("d")
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def append(self, data: SensorData):
+        timestamp = to_epoch_ns(data.timestamp)
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.values.append(data.value)
+        else:
+            index = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(index, timestamp)
+            self.values.insert(index, data.value)
+        self.unit = data.unit
+    
+    def _bounds(self, start_time: datetime.datetime, end_time: datetime.datetime) -> tuple:
+        return (bisect.bisect_left(self.timestamps, to_epoch_ns(start_time)),
+                bisect.bisect_right(self.timestamps, to_epoch_ns(end_time)))
+    
+    def range_arrays(self, start_time: datetime.datetime, 
+                     end_time: datetime.datetime) -> tuple:
+        """Срез (метки времени в нс, значения) без создания объектов SensorData"""
+        lo, hi = self._bounds(start_time, end_time)
+        return self.timestamps[lo:hi], self.values[lo:hi]
+    
+    def range(self, start_time: datetime.datetime, 
+              end_time: datetime.datetime) -> List[SensorData]:
+        lo, hi = self._bounds(start_time, end_time)
+        # SensorData создаются только для запрошенного среза; data_id выводится из метки времени
+        return [SensorData(data_id=f"{self.sensor_id}:{self.timestamps[i]}",
+                           sensor_id=self.sensor_id, timestamp=from_epoch_ns(self.timestamps[i]),
+                           value=self.values[i], unit=self.unit)
+                for i in range(lo, hi)]
+    
+    def totals(self, start_time: datetime.datetime, end_time: datetime.datetime) -> "AggregateBucket":
+        """Количество, сумма, минимум и максимум среза без создания объектов SensorData"""
+        lo, hi = self._bounds(start_time, end_time)
+        bucket = AggregateBucket(start_time)
+        if hi > lo:
+            values = self.values[lo:hi]
+            bucket.count, bucket.sum, bucket.min, bucket.max = len(values), sum(values), min(values), max(values)
+        return bucket
+    
+    def span(self) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        if not self.timestamps:
+            return None
+        return from_epoch_ns(self.timestamps[0]), from_epoch_ns(self.timestamps[-1])
+    
+    def truncate_before(self, cutoff: datetime.datetime):
+        index = bisect.bisect_left(self.timestamps, to_epoch_ns(cutoff))
+        if index:
+            del self.timestamps[:index]
+            del self.values[:index]
+
+class AggregateBucket:
+    """Агрегат показаний за интервал: количество, сумма, минимум и максимум"""
+    __slots__ = ("start", "count", "sum", "min", "max")
+    
+    def __init__(self, start: datetime.datetime):
+        self.start = start
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+    
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+    
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    def merge(self, other: "AggregateBucket") -> "AggregateBucket":
+        self.count += other.count
+        self.sum += other.sum
+        if other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+def floor_time(timestamp: datetime.datetime, width: datetime.timedelta) -> datetime.datetime:
+    return datetime.datetime.min + ((timestamp - datetime.datetime.min) // width) * width
+
+class RollupSeries:
+    """Агрегаты показаний одного датчика с фиксированным шагом по времени"""
+    def __init__(self, sensor_id: str, width: datetime.timedelta, unit: str = ""):
+        self.sensor_id = sensor_id
+        self.width = width
+        self.unit = unit
+        self.starts: List[datetime.datetime] = []
+        self.buckets: List[AggregateBucket] = []
+        self._last_end: Optional[datetime.datetime] = None  # конец последнего интервала
+    
+    def __len__(self):
+        return len(self.buckets)
+    
+    def add(self, data: SensorData):
+        # Обычно показание попадает в последний интервал - без округления времени
+        if self._last_end is not None and self.starts[-1] <= data.timestamp < self._last_end:
+            self.buckets[-1].add(data.value)
+            self.unit = data.unit
+            return
+        
+        start = floor_time(data.timestamp, self.width)
+        if self.starts and self.starts[-1] == start:
+            bucket = self.buckets[-1]
+        elif not self.starts or start > self.starts[-1]:
+            bucket = AggregateBucket(start)
+            self.starts.append(start)
+            self.buckets.append(bucket)
+            self._last_end = start + self.width
+        else:
+            index = bisect.bisect_left(self.starts, start)
+            if self.starts[index] == start:
+                bucket = self.buckets[index]
+            else:
+                bucket = AggregateBucket(start)
+                self.starts.insert(index, start)
+                self.buckets.insert(index, bucket)
+        bucket.add(data.value)
+        self.unit = data.unit
+    
+    def range_buckets(self, start_time: datetime.datetime, 
+                      end_time: datetime.datetime) -> List[AggregateBucket]:
+        lo = bisect.bisect_left(self.starts, floor_time(start_time, self.width))
+        hi = bisect.bisect_right(self.starts, end_time)
+        return self.buckets[lo:hi]
+    
+    def range(self, start_time: datetime.datetime, 
+              end_time: datetime.datetime) -> List[SensorData]:
+        # Агрегат отдается со средним значением за интервал; sample_count > 1 отличает его от показания
+        return [AggregatedSensorData(data_id=f"{self.sensor_id}@{bucket.start.isoformat()}",
+                                     sensor_id=self.sensor_id, timestamp=bucket.start,
+                                     value=bucket.mean, unit=self.unit, sample_count=bucket.count,
+                                     min_value=bucket.min, max_value=bucket.max)
+                for bucket in self.range_buckets(start_time, end_time)]
+    
+    def totals(self, start_time: datetime.datetime, end_time: datetime.datetime) -> AggregateBucket:
+        total = AggregateBucket(start_time)
+        for bucket in self.range_buckets(start_time, end_time):
+            total.merge(bucket)
+        return total
+    
+    def span(self) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        return (self.starts[0], self.starts[-1]) if self.starts else None
+    
+    def truncate_before(self, cutoff: datetime.datetime):
+        # Интервал удаляется только целиком, когда он полностью старше границы
+        index = bisect.bisect_left(self.starts, cutoff - self.width)
+        if index:
+            del self.starts[:index]
+            del self.buckets[:index]
+            if not self.starts:
+                self._last_end = None
+
+def guess_sensor_owner(sensor_id: str) -> Tuple[str, Optional[SensorType]]:
+    """Объект и тип датчика, не внесенного в реестр, по идентификатору вида <объект>_<тип>"""
+    object_id, _, suffix = sensor_id.rpartition("_")
+    return object_id or sensor_id, SENSOR_SUFFIX_TYPES.get(suffix)
+
+class RollupCube:
+    """Часовые и суточные агрегаты показаний по объекту и типу датчика.
+    
+    Ведется при записи показаний, поэтому отчеты и графики читают несколько сотен
+    ячеек вместо исходной истории.
+    """
+    PERIODS = {"hourly": datetime.timedelta(hours=1), "daily": datetime.timedelta(days=1)}
+    
+    def __init__(self):
+        self.cells: Dict[str, Dict[Tuple[str, Optional[SensorType]], RollupSeries]] = {
+            period: {} for period in self.PERIODS
+        }
+    
+    def series_for(self, object_id: str, sensor_type: Optional[SensorType]) -> Tuple[RollupSeries, ...]:
+        """Ряды всех периодов для ячейки; при записи показаний их кэшируют по датчику"""
+        key = (object_id, sensor_type)
+        result = []
+        for period, width in self.PERIODS.items():
+            cells = self.cells[period]
+            rollup = cells.get(key)
+            if rollup is None:
+                rollup = cells[key] = RollupSeries(object_id, width)
+            result.append(rollup)
+        return tuple(result)
+    
+    def query(self, period: str, start_time: datetime.datetime, end_time: datetime.datetime,
+              object_id: Optional[str] = None, sensor_type: Optional[SensorType] = None
+              ) -> List[Tuple[str, Optional[SensorType], AggregateBucket]]:
+        """Копии ячеек, интервал которых начинается в [start_time, end_time]"""
+        result = []
+        for (cell_object, cell_type), rollup in self.cells[period].items():
+            if (object_id is not None and cell_object != object_id or
+                    sensor_type is not None and cell_type != sensor_type):
+                continue
+            lo = bisect.bisect_left(rollup.starts, start_time)
+            hi = bisect.bisect_right(rollup.starts, end_time)
+            result.extend((cell_object, cell_type, AggregateBucket(bucket.start).merge(bucket))
+                          for bucket in rollup.buckets[lo:hi])
+        return result
+    
+    def truncate_before(self, period: str, cutoff: datetime.datetime):
+        for rollup in self.cells[period].values():
+            rollup.truncate_before(cutoff)
+
+def create_test_network_objects() -> List[NetworkObject]:
+    # Создание тестовых объектов сети
+    substation = Substation(
+        object_id="sub_001",
+        name="Центральная подстанция",
+        object_type=NetworkObjectType.SUBSTATION,
+        status="operational",
+        location="55.7558, 37.6173",
+        capacity=10000.0,
+        current_load=6500.0
+    )
+    
+    feeder1 = Feeder(
+        object_id="feeder_001",
+        name="Фидер Северный",
+        object_type=NetworkObjectType.FEEDER,
+        status="operational",
+        location="55.7600, 37.6200",
+        capacity=500.0,
+        current_load=320.0,
+        parent_substation_id="sub_001",
+        max_capacity=500.0,
+        connected_consumers=150
+    )
+    
+    solar_farm = RenewableSource(
+        object_id="solar_001",
+        name="Солнечная ферма",
+        object_type=NetworkObjectType.RENEWABLE,
+        status="operational",
+        location="55.7500, 37.6300",
+        capacity=2000.0,
+        current_load=0.0,
+        source_type="solar",
+        current_generation=450.0,
+        weather_dependency=True
+    )
+    
+    return [substation, feeder1, solar_farm]
+
+class ReadWriteLock:
+    """Блокировка читатели/писатель: чтения идут параллельно, запись - монопольно"""
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer_active = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read_lock(self):
+        with self._condition:
+            # Ожидающий писатель получает приоритет, чтобы поток чтений его не вытеснил
+            while self._writer_active or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def write_lock(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer_active or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer_active = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer_active = False
+                self._condition.notify_all()
+
+class NullLock:
+    """Заглушка ReadWriteLock для однопоточного использования репозитория"""
+    def read_lock(self):
+        return nullcontext()
+    
+    def write_lock(self):
+        return nullcontext()
+
+class AnomalyIndex:
+    """Аномалии с индексами по ID, статусу, объекту и времени обнаружения"""
+    ACTIVE_STATUSES = ("detected", "analyzing", "action_required")
+    
+    def __init__(self):
+        self.by_id: Dict[str, Anomaly] = {}
+        self.by_status: Dict[str, Dict[str, Anomaly]] = {}
+        self.by_object: Dict[str, List[Anomaly]] = {}
+        self.detection_times: List[datetime.datetime] = []
+        self.by_time: List[Anomaly] = []
+        self.sorted_ids: List[str] = []
+    
+    def __len__(self):
+        return len(self.by_id)
+    
+    def add(self, anomaly: Anomaly):
+        if anomaly.anomaly_id in self.by_id:
+            self.remove(anomaly.anomaly_id)
+        self.by_id[anomaly.anomaly_id] = anomaly
+        self.by_status.setdefault(anomaly.status, {})[anomaly.anomaly_id] = anomaly
+        self.by_object.setdefault(anomaly.affected_object_id, []).append(anomaly)
+        
+        if not self.detection_times or anomaly.detection_time >= self.detection_times[-1]:
+            self.detection_times.append(anomaly.detection_time)
+            self.by_time.append(anomaly)
+        else:
+            index = bisect.bisect_right(self.detection_times, anomaly.detection_time)
+            self.detection_times.insert(index, anomaly.detection_time)
+            self.by_time.insert(index, anomaly)
+        bisect.insort(self.sorted_ids, anomaly.anomaly_id)
+    
+    def remove(self, anomaly_id: str):
+        anomaly = self.by_id.pop(anomaly_id)
+        del self.by_status[anomaly.status][anomaly_id]
+        self.by_object[anomaly.affected_object_id].remove(anomaly)
+        lo = bisect.bisect_left(self.detection_times, anomaly.detection_time)
+        hi = bisect.bisect_right(self.detection_times, anomaly.detection_time)
+        index = lo + [a.anomaly_id for a in self.by_time[lo:hi]].index(anomaly_id)
+        del self.detection_times[index]
+        del self.by_time[index]
+        del self.sorted_ids[bisect.bisect_left(self.sorted_ids, anomaly_id)]
+    
+    def get(self, anomaly_id: str) -> Optional[Anomaly]:
+        return self.by_id.get(anomaly_id)
+    
+    def set_status(self, anomaly_id: str, status: str) -> bool:
+        anomaly = self.by_id.get(anomaly_id)
+        if anomaly is None:
+            return False
+        # Статус меняется только здесь, чтобы индекс по статусу оставался верным
+        del self.by_status[anomaly.status][anomaly_id]
+        anomaly.status = status
+        self.by_status.setdefault(status, {})[anomaly_id] = anomaly
+        return True
+    
+    def with_statuses(self, statuses: Iterable[str]) -> List[Anomaly]:
+        found = []
+        for status in statuses:
+            found.extend(self.by_status.get(status, {}).values())
+        found.sort(key=lambda a: a.detection_time)
+        return found
+    
+    def between(self, start_time: datetime.datetime, 
+                end_time: datetime.datetime) -> List[Anomaly]:
+        lo = bisect.bisect_left(self.detection_times, start_time)
+        hi = bisect.bisect_right(self.detection_times, end_time)
+        return self.by_time[lo:hi]
+    
+    def for_object(self, object_id: str) -> List[Anomaly]:
+        return list(self.by_object.get(object_id, []))
+    
+    def find_by_prefix(self, prefix: str) -> Optional[Anomaly]:
+        index = bisect.bisect_left(self.sorted_ids, prefix)
+        if index < len(self.sorted_ids) and self.sorted_ids[index].startswith(prefix):
+            return self.by_id[self.sorted_ids[index]]
+        return None
+    
+    def all(self) -> List[Anomaly]:
+        return list(self.by_id.values())
+
+class RecommendationIndex:
+    """Рекомендации с индексами по ID и аномалии и очередью ожидающих по приоритету"""
+    def __init__(self):
+        self.by_id: Dict[str, Recommendation] = {}
+        self.by_anomaly: Dict[str, List[Recommendation]] = {}
+        # Куча (-priority, creation_time, номер записи, id); устаревшие записи удаляются лениво
+        self._pending_heap: List[tuple] = []
+        self._pending_entries: Dict[str, int] = {}
+        self._counter = itertools.count()
+    
+    def __len__(self):
+        return len(self.by_id)
+    
+    def add(self, recommendation: Recommendation):
+        self.by_id[recommendation.recommendation_id] = recommendation
+        self.by_anomaly.setdefault(recommendation.anomaly_id, []).append(recommendation)
+        if recommendation.status == "pending":
+            self._push_pending(recommendation)
+    
+    def _push_pending(self, recommendation: Recommendation):
+        entry_number = next(self._counter)
+        # Повторное добавление той же рекомендации делает ее прежнюю запись устаревшей
+        replaced = recommendation.recommendation_id in self._pending_entries
+        self._pending_entries[recommendation.recommendation_id] = entry_number
+        heapq.heappush(self._pending_heap, (-recommendation.priority, recommendation.creation_time,
+                                            entry_number, recommendation.recommendation_id))
+        if replaced:
+            self._compact()
+    
+    def _compact(self):
+        # Куча перестраивается, когда устаревших записей в ней больше, чем действующих;
+        # перестройка O(n) приходится на n устаревших записей - амортизированно O(1)
+        if len(self._pending_heap) > 2 * len(self._pending_entries) + 16:
+            self._pending_heap = [e for e in self._pending_heap if self._is_current(e)]
+            heapq.heapify(self._pending_heap)
+    
+    def _is_current(self, entry: tuple) -> bool:
+        return self._pending_entries.get(entry[3]) == entry[2]
+    
+    def get(self, recommendation_id: str) -> Optional[Recommendation]:
+        return self.by_id.get(recommendation_id)
+    
+    def for_anomaly(self, anomaly_id: str) -> List[Recommendation]:
+        return list(self.by_anomaly.get(anomaly_id, []))
+    
+    def set_status(self, recommendation_id: str, status: str,
+                   executor_id: Optional[str] = None) -> bool:
+        recommendation = self.by_id.get(recommendation_id)
+        if recommendation is None:
+            return False
+        was_pending = recommendation.status == "pending"
+        recommendation.status = status
+        if executor_id is not None:
+            recommendation.executor_id = executor_id
+        
+        if status == "pending" and not was_pending:
+            self._push_pending(recommendation)
+        elif status != "pending" and was_pending:
+            self._pending_entries.pop(recommendation_id, None)
+            self._compact()
+        return True
+    
+    def pending(self, limit: Optional[int] = None) -> List[Recommendation]:
+        """Ожидающие рекомендации: сначала высокий приоритет, затем более ранние.
+        
+        С limit - O(limit log n) по куче. Без limit - полная сортировка за O(n log n), где n -
+        число ожидающих (устаревших записей в куче не больше, чем действующих); этот путь
+        для выгрузки всего списка, интерфейс берет верхние записи через limit.
+        """
+        if limit is None:
+            entries = sorted(e for e in self._pending_heap if self._is_current(e))
+            return [self.by_id[e[3]] for e in entries]
+        
+        taken = []
+        while self._pending_heap and len(taken) < limit:
+            entry = heapq.heappop(self._pending_heap)
+            if self._is_current(entry):
+                taken.append(entry)
+        for entry in taken:
+            heapq.heappush(self._pending_heap, entry)
+        return [self.by_id[e[3]] for e in taken]
+    
+    def all(self) -> List[Recommendation]:
+        return list(self.by_id.values())
+
+class ForecastStore:
+    """Прогнозы с ограниченной историей по (объект, период); последний прогноз - конец истории"""
+    def __init__(self, history_depth: int = 48):
+        self.history_depth = history_depth
+        self.history: Dict[Tuple[str, str], deque] = {}
+    
+    def __len__(self):
+        return sum(len(history) for history in self.history.values())
+    
+    def add(self, forecast: LoadForecast):
+        key = (forecast.object_id, forecast.forecast_period)
+        history = self.history.get(key)
+        if history is None:
+            history = self.history[key] = deque(maxlen=self.history_depth)
+        
+        if not history or forecast.forecast_time >= history[-1].forecast_time:
+            history.append(forecast)
+        else:
+            # Прогноз задним числом - редкий случай, переупорядочиваем историю
+            ordered = sorted([*history, forecast], key=lambda f: f.forecast_time)
+            history.clear()
+            history.extend(ordered)
+    
+    def latest(self, object_id: str, period: str = "hourly") -> Optional[LoadForecast]:
+        history = self.history.get((object_id, period))
+        return history[-1] if history else None
+    
+    def for_object(self, object_id: str, period: str) -> List[LoadForecast]:
+        return list(self.history.get((object_id, period), ()))
+    
+    def all(self) -> List[LoadForecast]:
+        return [forecast for history in self.history.values() for forecast in history]
+
+class AccuracyStats:
+    """Накопленные ошибки прогнозов; MAE, MAPE и смещение без хранения отдельных ошибок"""
+    __slots__ = ("count", "error_sum", "absolute_error_sum", "percentage_error_sum", "percentage_count")
+    
+    def __init__(self):
+        self.count = 0
+        self.error_sum = 0.0
+        self.absolute_error_sum = 0.0
+        self.percentage_error_sum = 0.0
+        self.percentage_count = 0
+    
+    def add(self, predicted: float, actual: float):
+        error = predicted - actual
+        self.count += 1
+        self.error_sum += error
+        self.absolute_error_sum += abs(error)
+        if actual:
+            self.percentage_error_sum += abs(error) / abs(actual)
+            self.percentage_count += 1
+    
+    @property
+    def mae(self) -> float:
+        return self.absolute_error_sum / self.count if self.count else 0.0
+    
+    @property
+    def mape(self) -> float:
+        """В процентах"""
+        return self.percentage_error_sum / self.percentage_count * 100 if self.percentage_count else 0.0
+    
+    @property
+    def bias(self) -> float:
+        return self.error_sum / self.count if self.count else 0.0
+
+class ObjectLoadTotals:
+    """Нарастающие итоги мощности объекта и прогнозы, ожидающие конца своего интервала"""
+    __slots__ = ("sum", "count", "targets")
+    
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+        # Куча (конец интервала, номер, прогноз, итоги на начало интервала)
+        self.targets: List[tuple] = []
+
+class ForecastAccuracyTracker:
+    """Сравнение прогнозов с фактической мощностью по мере поступления показаний.
+    
+    Прогноз периода сравнивается со средней мощностью объекта на интервале
+    [forecast_time, forecast_time + длительность периода). Средняя берется как разность
+    нарастающих итогов на конец и начало интервала, поэтому показание обрабатывается
+    за O(1) независимо от числа ожидающих прогнозов.
+    """
+    MAX_OPEN_TARGETS = 512  # на объект; при переполнении вытесняется самый старый прогноз
+    
+    def __init__(self, period_lengths: Dict[str, datetime.timedelta]):
+        self.period_lengths = period_lengths
+        self.objects: Dict[str, ObjectLoadTotals] = {}
+        self.stats: Dict[Tuple[str, str], AccuracyStats] = {}
+        self.period_stats: Dict[str, AccuracyStats] = {}
+        self._counter = itertools.count()
+        self.evicted_targets = 0  # прогнозы, вытесненные до конца своего интервала
+        # Прогнозы добавляет поток Tk, показания - поток генерации данных
+        self._lock = threading.Lock()
+    
+    def track(self, forecast: LoadForecast):
+        length = self.period_lengths.get(forecast.forecast_period)
+        if length is None:
+            return
+        with self._lock:
+            totals = self.objects.get(forecast.object_id)
+            if totals is None:
+                totals = self.objects[forecast.object_id] = ObjectLoadTotals()
+            if len(totals.targets) >= self.MAX_OPEN_TARGETS:
+                # Самый старый - с наименьшим номером; куча упорядочена по концу интервала,
+                # поэтому поиск линейный, но только при переполнении
+                oldest = min(range(len(totals.targets)), key=lambda i: totals.targets[i][1])
+                totals.targets[oldest] = totals.targets[-1]
+                totals.targets.pop()
+                heapq.heapify(totals.targets)
+                self.evicted_targets += 1
+            heapq.heappush(totals.targets, (forecast.forecast_time + length, next(self._counter),
+                                            forecast, totals.sum, totals.count))
+    
+    def observe(self, object_id: str, timestamp: datetime.datetime, value: float):
+        totals = self.objects.get(object_id)
+        if totals is None:
+            return
+        with self._lock:
+            # Первое показание после конца интервала закрывает прогноз
+            while totals.targets and totals.targets[0][0] <= timestamp:
+                end, number, forecast, start_sum, start_count = heapq.heappop(totals.targets)
+                if totals.count > start_count:
+                    self._score(forecast, (totals.sum - start_sum) / (totals.count - start_count))
+            totals.sum += value
+            totals.count += 1
+    
+    def _score(self, forecast: LoadForecast, actual: float):
+        key = (forecast.object_id, forecast.forecast_period)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = AccuracyStats()
+        stats.add(forecast.predicted_load, actual)
+        period_stats = self.period_stats.get(forecast.forecast_period)
+        if period_stats is None:
+            period_stats = self.period_stats[forecast.forecast_period] = AccuracyStats()
+        period_stats.add(forecast.predicted_load, actual)
+    
+    def get(self, object_id: Optional[str] = None, period: str = "hourly") -> Optional[AccuracyStats]:
+        """Точность по объекту и периоду; без object_id - по всем объектам"""
+        if object_id is None:
+            return self.period_stats.get(period)
+        return self.stats.get((object_id, period))
+
+class ReportStatistics:
+    """Показатели отчета, накопленные за один проход по аномалиям и итогам показаний.
+    
+    Аномалии читаются итератором, показания - готовыми итогами (AggregateBucket) по датчикам
+    или по интервалам агрегатов, объекты SensorData не создаются.
+    """
+    
+    def __init__(self):
+        self.anomaly_count = 0
+        self.by_severity: Dict[SeverityLevel, int] = {}
+        self.by_status: Dict[str, int] = {}
+        self.reading_count = 0
+        self.value_sum = 0.0
+        self.max_value: Optional[float] = None
+        self.power_count = 0
+        self.power_sum = 0.0
+        self._power_sensors: Dict[str, bool] = {}
+    
+    def add_anomalies(self, anomalies: Iterable[Anomaly]) -> "ReportStatistics":
+        by_severity, by_status = self.by_severity, self.by_status
+        count = 0
+        for anomaly in anomalies:
+            count += 1
+            by_severity[anomaly.severity] = by_severity.get(anomaly.severity, 0) + 1
+            by_status[anomaly.status] = by_status.get(anomaly.status, 0) + 1
+        self.anomaly_count += count
+        return self
+    
+    def add_sensor_totals(self, totals: Iterable[Tuple[str, "AggregateBucket"]]) -> "ReportStatistics":
+        """Итоги показаний по датчикам (IDataRepository.get_sensor_totals)"""
+        power_sensors = self._power_sensors
+        for sensor_id, bucket in totals:
+            # Признак датчика мощности определяется один раз на датчик
+            is_power = power_sensors.get(sensor_id)
+            if is_power is None:
+                is_power = power_sensors[sensor_id] = "power" in sensor_id.lower()
+            self.add_bucket(bucket, is_power)
+        return self
+    
+    def add_bucket(self, bucket: AggregateBucket, is_power: bool) -> "ReportStatistics":
+        """Готовый агрегат вместо отдельных показаний интервала"""
+        if bucket.count:
+            self.reading_count += bucket.count
+            self.value_sum += bucket.sum
+            if self.max_value is None or bucket.max > self.max_value:
+                self.max_value = bucket.max
+            if is_power:
+                self.power_count += bucket.count
+                self.power_sum += bucket.sum
+        return self
+    
+    def severity_count(self, severity: SeverityLevel) -> int:
+        return self.by_severity.get(severity, 0)
+    
+    def status_count(self, *statuses: str) -> int:
+        return sum(self.by_status.get(status, 0) for status in statuses)
+    
+    @property
+    def mean_value(self) -> float:
+        return self.value_sum / self.reading_count if self.reading_count else 0.0
+    
+    @property
+    def average_load(self) -> float:
+        """Средняя мощность; без датчиков мощности - среднее по всем показаниям"""
+        if self.power_count:
+            return self.power_sum / self.power_count
+        return self.mean_value
+    
+    @property
+    def peak_value(self) -> float:
+        return self.max_value if self.max_value is not None else 0.0
+
+class ReportCache:
+    """Содержание отчетов за закрытые периоды по ключу (тип, начало, конец).
+    
+    Запись сбрасывается, когда в ее период попадают опоздавшие показания или аномалии;
+    для данных новее всех закэшированных и строящихся периодов проверка - одно сравнение.
+    Построение отчета регистрируется через begin(): запись в его период во время построения
+    помечает результат устаревшим, и put() его не сохраняет.
+    """
+    MAX_ENTRIES = 256
+    
+    def __init__(self):
+        self.entries: Dict[Tuple[str, datetime.datetime, datetime.datetime], Tuple[str, str]] = {}
+        # Номер построения -> [ключ, устарел ли результат]
+        self.pending: Dict[int, list] = {}
+        self.latest_end: Optional[datetime.datetime] = None
+        self._last_build = 0
+    
+    def get(self, key: Tuple[str, datetime.datetime, datetime.datetime]) -> Optional[Tuple[str, str]]:
+        return self.entries.get(key)
+    
+    def begin(self, key: Tuple[str, datetime.datetime, datetime.datetime]) -> int:
+        """Зарегистрировать построение отчета за период key; возвращает номер построения"""
+        self._last_build += 1
+        self.pending[self._last_build] = [key, False]
+        self._update_latest_end()
+        return self._last_build
+    
+    def discard(self, build: int):
+        self.pending.pop(build, None)
+        self._update_latest_end()
+    
+    def put(self, build: int, title: str, content: str) -> Tuple[bool, List[tuple]]:
+        """Сохранить результат построения build; возвращает (сохранен ли, вытесненные ключи)"""
+        key, stale = self.pending.pop(build, (None, True))
+        if stale:
+            self._update_latest_end()
+            return False, []
+        self.entries.pop(key, None)
+        self.entries[key] = (title, content)
+        evicted = []
+        while len(self.entries) > self.MAX_ENTRIES:
+            evicted.append(next(iter(self.entries)))
+            del self.entries[evicted[-1]]
+        self._update_latest_end()
+        return True, evicted
+    
+    def touches(self, timestamp: datetime.datetime) -> bool:
+        return self.latest_end is not None and timestamp <= self.latest_end
+    
+    def invalidate(self, timestamp: datetime.datetime) -> List[tuple]:
+        """Сбросить записи, в период которых попадает timestamp; возвращает их ключи"""
+        stale = [key for key in self.entries if key[1] <= timestamp <= key[2]]
+        for key in stale:
+            del self.entries[key]
+        for build in self.pending.values():
+            if build[0][1] <= timestamp <= build[0][2]:
+                build[1] = True
+        if stale:
+            self._update_latest_end()
+        return stale
+    
+    def _update_latest_end(self):
+        self.latest_end = max(itertools.chain((key[2] for key in self.entries),
+                                              (build[0][2] for build in self.pending.values())),
+                              default=None)
+
+class IncidentTracker:
+    """Объединение повторных срабатываний по ключу (объект, тип аномалии, единица пика) в один инцидент.
+    
+    Пока инцидент открыт, новые срабатывания только обновляют last_seen, пик и счетчик
+    существующей аномалии. Инцидент закрывается, если срабатываний не было quiet_period
+    или его статус сменился на неактивный через update_anomaly_status репозитория.
+    
+    Трекер изменяет свою копию аномалии; в репозиторий поля переносит update_anomaly_incident
+    под его блокировкой.
+    """
+    # Типы, для которых худшее значение - минимальное
+    LOWER_IS_WORSE = (AnomalyType.VOLTAGE_DROP, AnomalyType.POWER_OUTAGE)
+    SEVERITY_ORDER = {severity: rank for rank, severity in enumerate(SeverityLevel)}
+    
+    def __init__(self, repository: IDataRepository,
+                 quiet_period: datetime.timedelta = datetime.timedelta(minutes=5)):
+        self.repository = repository
+        self.quiet_period = quiet_period
+        self.open_incidents: Dict[Tuple[str, AnomalyType, str], Anomaly] = {}
+        # Идентификаторы открытых инцидентов и тех из них, чей статус сменился на неактивный.
+        # Второе множество пополняется из потока, сменившего статус, поэтому только add/discard
+        self._open_ids = set()
+        self._deactivated = set()
+        # Нижняя граница времени, раньше которой ни один инцидент не истечет
+        self._next_expiry: Optional[datetime.datetime] = None
+        repository.add_status_listener(self._on_status_change)
+    
+    def register(self, anomaly: Anomaly) -> Optional[Anomaly]:
+        """Возвращает аномалию, если началась новая, и None, если срабатывание вошло в открытый инцидент"""
+        return self.register_hit(anomaly.affected_object_id, anomaly.anomaly_type, anomaly.peak_unit,
+                                 anomaly.detection_time, anomaly.peak_value, anomaly.severity,
+                                 lambda: anomaly)
+    
+    def register_hit(self, object_id: str, anomaly_type: AnomalyType, unit: str,
+                     detection_time: datetime.datetime, peak_value: Optional[float],
+                     severity: SeverityLevel, build: Callable[[], Anomaly]) -> Optional[Anomaly]:
+        """Как register, но аномалия строится вызовом build только при открытии нового инцидента"""
+        # Пики разных величин (кВт, А, В) одного объекта не сравниваются между собой
+        key = (object_id, anomaly_type, unit)
+        incident = self.open_incidents.get(key)
+        if incident is not None and (detection_time - incident.last_seen > self.quiet_period or
+                                     incident.anomaly_id in self._deactivated):
+            self._close(key, incident.last_seen)
+            incident = None
+        
+        if incident is None:
+            anomaly = build()
+            self.repository.store_anomaly(anomaly)
+            self.open_incidents[key] = dataclasses.replace(anomaly)
+            self._open_ids.add(anomaly.anomaly_id)
+            expiry = anomaly.last_seen + self.quiet_period
+            if self._next_expiry is None or expiry < self._next_expiry:
+                self._next_expiry = expiry
+            return anomaly
+        
+        incident.occurrence_count += 1
+        incident.last_seen = max(incident.last_seen, detection_time)
+        if peak_value is not None:
+            if incident.peak_value is None:
+                incident.peak_value = peak_value
+            elif anomaly_type in self.LOWER_IS_WORSE:
+                incident.peak_value = min(incident.peak_value, peak_value)
+            else:
+                incident.peak_value = max(incident.peak_value, peak_value)
+        if self.SEVERITY_ORDER[severity] > self.SEVERITY_ORDER[incident.severity]:
+            incident.severity = severity
+        self.repository.update_anomaly_incident(incident)
+        return None
+    
+    def close_quiet(self, now: datetime.datetime) -> List[Anomaly]:
+        """Закрыть инциденты без срабатываний дольше периода затишья.
+        
+        Вызывается на каждом показании; пока не наступило ближайшее истечение, проверка O(1).
+        """
+        if self._next_expiry is None or now <= self._next_expiry:
+            return []
+        expired = [key for key, incident in self.open_incidents.items()
+                   if now - incident.last_seen > self.quiet_period]
+        closed = [self._close(key, self.open_incidents[key].last_seen) for key in expired]
+        self._next_expiry = min((incident.last_seen for incident in self.open_incidents.values()),
+                                default=None)
+        if self._next_expiry is not None:
+            self._next_expiry += self.quiet_period
+        return closed
+    
+    def _on_status_change(self, anomaly_id: str, status: str):
+        if anomaly_id in self._open_ids and status not in AnomalyIndex.ACTIVE_STATUSES:
+            self._deactivated.add(anomaly_id)
+    
+    def _close(self, key: Tuple[str, AnomalyType, str], closed_time: datetime.datetime) -> Anomaly:
+        incident = self.open_incidents.pop(key)
+        self._open_ids.discard(incident.anomaly_id)
+        self._deactivated.discard(incident.anomaly_id)
+        incident.closed_time = closed_time
+        self.repository.update_anomaly_incident(incident)
+        return incident
+
+@dataclass
+class RetentionPolicy:
+    raw_hours: float = 6.0                # исходные показания
+    minute_days: float = 7.0              # минутные агрегаты min/max/avg
+    hourly_days: Optional[float] = None   # часовые агрегаты, None - без ограничения
+    compaction_interval: float = 60.0     # период фонового уплотнения, сек (0 - вручную)
+    min_points: int = 200                 # сколько точек на датчик должен давать запрос
+
+class InMemoryDataRepository(IDataRepository):
+    MINUTE = datetime.timedelta(minutes=1)
+    HOUR = datetime.timedelta(hours=1)
+    
+    def __init__(self, retention: Optional[RetentionPolicy] = None, compact: bool = False,
+                 thread_safe: bool = True, forecast_history: int = 48):
+        # Показания датчиков, разбитые по sensor_id; в компактном режиме - в массивах
+        self.compact_storage = compact
+        self.series: Dict[str, Any] = {}
+        # Агрегаты по уровням хранения ведутся только при заданной политике хранения
+        self.retention = retention
+        self.minute_rollups: Dict[str, RollupSeries] = {}
+        self.hourly_rollups: Dict[str, RollupSeries] = {}
+        self.latest_timestamp: Optional[datetime.datetime] = None
+        # Часовые и суточные агрегаты по объектам для отчетов ведутся всегда
+        self.rollup_cube = RollupCube()
+        self._sensor_rollups: Dict[str, Tuple[RollupSeries, ...]] = {}
+        # Поток генерации данных пишет, поток Tk и контроллеры читают
+        self._lock = ReadWriteLock() if thread_safe else NullLock()
+        self._compaction_stop = threading.Event()
+        self.anomalies = AnomalyIndex()
         self.network_objects: Dict[str, NetworkObject] = {}
+        self.sensors: Dict[str, Sensor] = {}
+        self.sensors_by_object: Dict[str, List[Sensor]] = {}
         self.weather_data: List[WeatherData] = []
-        self.recommendations: List[Recommendation] = []
-        self.forecasts: List[LoadForecast] = []
+        self.recommendations = RecommendationIndex()
+        # Хранится не больше forecast_history прогнозов на объект и период
+        self.forecasts = ForecastStore(forecast_history)
         self.reports: List[Report] = []
+        self.report_cache = ReportCache()
+        self.status_listeners: List[Callable[[str, str], None]] = []
         
         # Инициализация тестовыми данными
         self._initialize_test_data()
+        
+        if retention and retention.compaction_interval > 0:
+            self.start_compaction()
     
     def _initialize_test_data(self):
-        # Создание тестовых объектов сети
-        substation = Substation(
-            object_id="sub_001",
-            name="Центральная подстанция",
-            object_type=NetworkObjectType.SUBSTATION,
-            status="operational",
-            location="55.7558, 37.6173",
-            capacity=10000.0,
-            current_load=6500.0
-        )
-        
-        feeder1 = Feeder(
-            object_id="feeder_001",
-            name="Фидер Северный",
-            object_type=NetworkObjectType.FEEDER,
-            status="operational",
-            location="55.7600, 37.6200",
-            capacity=500.0,
-            current_load=320.0,
-            parent_substation_id="sub_001",
-            max_capacity=500.0,
-            connected_consumers=150
-        )
-        
-        solar_farm = RenewableSource(
-            object_id="solar_001",
-            name="Солнечная ферма",
-            object_type=NetworkObjectType.RENEWABLE,
-            status="operational",
-            location="55.7500, 37.6300",
-            capacity=2000.0,
-            current_load=0.0,
-            source_type="solar",
-            current_generation=450.0,
-            weather_dependency=True
-        )
-        
-        self.network_objects = {
-            substation.object_id: substation,
-            feeder1.object_id: feeder1,
-            solar_farm.object_id: solar_farm
-        }
+        self.network_objects = {obj.object_id: obj for obj in create_test_network_objects()}
     
     def store_sensor_data(self, data: SensorData):
-        self.sensor_data.append(data)
+        with self._lock.write_lock():
+            self._store_sensor_data(data)
+    
+    def store_sensor_data_batch(self, data: List[SensorData]):
+        with self._lock.write_lock():
+            for item in data:
+                self._store_sensor_data(item)
+    
+    def _store_sensor_data(self, data: SensorData):
+        series = self.series.get(data.sensor_id)
+        if series is None:
+            sensor_id = sys.intern(data.sensor_id)
+            series = self.series[sensor_id] = (CompactSensorSeries(sensor_id, data.unit)
+                                               if self.compact_storage else SensorSeries())
+        series.append(data)
+        
+        if self.retention:
+            for rollups, width in ((self.minute_rollups, self.MINUTE),
+                                   (self.hourly_rollups, self.HOUR)):
+                rollup = rollups.get(data.sensor_id)
+                if rollup is None:
+                    rollup = rollups[data.sensor_id] = RollupSeries(data.sensor_id, width)
+                rollup.add(data)
+        
+        rollups = self._sensor_rollups.get(data.sensor_id)
+        if rollups is None:
+            sensor = self.sensors.get(data.sensor_id)
+            key = ((sensor.network_object_id, sensor.sensor_type) if sensor
+                   else guess_sensor_owner(data.sensor_id))
+            rollups = self._sensor_rollups[data.sensor_id] = self.rollup_cube.series_for(*key)
+        for rollup in rollups:
+            rollup.add(data)
+        
+        if self.latest_timestamp is None or data.timestamp > self.latest_timestamp:
+            self.latest_timestamp = data.timestamp
+        # Опоздавшее показание в закэшированный или строящийся период отчета
+        cached_end = self.report_cache.latest_end
+        if cached_end is not None and data.timestamp <= cached_end:
+            self.report_cache.invalidate(data.timestamp)
     
     def get_sensor_data(self, sensor_id: str, start_time: datetime.datetime, 
                        end_time: datetime.datetime) -> List[SensorData]:
-        return [d for d in self.sensor_data 
-                if d.sensor_id == sensor_id and start_time <= d.timestamp <= end_time]
+        with self._lock.read_lock():
+            series = self._select_tier(start_time, end_time).get(sensor_id)
+            if series is None:
+                return []
+            return series.range(start_time, end_time)
+    
+    def _tiers(self) -> List[tuple]:
+        # (шаг, срок хранения, хранилище) - от исходных показаний к часовым агрегатам
+        policy = self.retention
+        return [
+            (datetime.timedelta(0), datetime.timedelta(hours=policy.raw_hours), self.series),
+            (self.MINUTE, datetime.timedelta(days=policy.minute_days), self.minute_rollups),
+            (self.HOUR, datetime.timedelta(days=policy.hourly_days)
+             if policy.hourly_days is not None else None, self.hourly_rollups)
+        ]
+    
+    def _select_tier(self, start_time: datetime.datetime, 
+                     end_time: datetime.datetime) -> Dict[str, Any]:
+        if self.retention is None or self.latest_timestamp is None:
+            return self.series
+        
+        tiers = self._tiers()
+        # Самый грубый уровень, который еще дает min_points точек на датчик...
+        index = 0
+        for i, (width, retention, store) in enumerate(tiers):
+            if width * self.retention.min_points <= end_time - start_time:
+                index = i
+        # ...и при этом еще хранит начало запрошенного диапазона
+        while (index < len(tiers) - 1 and tiers[index][1] is not None and
+               start_time < self.latest_timestamp - tiers[index][1]):
+            index += 1
+        return tiers[index][2]
+    
+    def compact(self, now: Optional[datetime.datetime] = None):
+        """Удаление данных, вышедших за срок хранения своего уровня"""
+        if self.retention is None:
+            return
+        with self._lock.write_lock():
+            now = now or self.latest_timestamp
+            if now is None:
+                return
+            for width, retention, store in self._tiers():
+                if retention is not None:
+                    for series in store.values():
+                        series.truncate_before(now - retention)
+            if self.retention.hourly_days is not None:
+                self.rollup_cube.truncate_before(
+                    "hourly", now - datetime.timedelta(days=self.retention.hourly_days))
+    
+    def start_compaction(self):
+        self._compaction_stop.clear()
+        thread = threading.Thread(target=self._compaction_loop, daemon=True)
+        thread.start()
+    
+    def stop_compaction(self):
+        self._compaction_stop.set()
+    
+    def _compaction_loop(self):
+        while not self._compaction_stop.wait(self.retention.compaction_interval):
+            self.compact()
+    
+    def close(self):
+        self.stop_compaction()
     
     def store_anomaly(self, anomaly: Anomaly):
-        self.anomalies.append(anomaly)
+        with self._lock.write_lock():
+            self.anomalies.add(anomaly)
+            self._invalidate_reports(anomaly.detection_time)
     
     def get_active_anomalies(self) -> List[Anomaly]:
-        return [a for a in self.anomalies if a.status in ["detected", "analyzing", "action_required"]]
+        with self._lock.read_lock():
+            return self.anomalies.with_statuses(AnomalyIndex.ACTIVE_STATUSES)
     
     def get_historical_data(self, start_time: datetime.datetime, 
                           end_time: datetime.datetime) -> List[SensorData]:
-        return [d for d in self.sensor_data if start_time <= d.timestamp <= end_time]
+        with self._lock.read_lock():
+            # Слияние уже отсортированных срезов каждого датчика
+            store = self._select_tier(start_time, end_time)
+            ranges = [series.range(start_time, end_time) for series in store.values()]
+        return list(heapq.merge(*ranges, key=lambda d: d.timestamp))
+    
+    def iter_historical_data(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                             chunk_size: int = 10000) -> Iterator[SensorData]:
+        """Показания диапазона в порядке времени, порциями примерно по chunk_size показаний.
+        
+        Блокировка берется только на время среза одной порции, в памяти - только ее показания.
+        """
+        resolution = datetime.timedelta(microseconds=1)
+        with self._lock.read_lock():
+            store = self._select_tier(start_time, end_time)
+            spans = [span for span in (series.span() for series in store.values()) if span]
+            total = sum(len(series) for series in store.values())
+        if not spans:
+            return
+        # Порции идут только по времени, где есть данные; ширина порции - по средней плотности
+        end_time = min(end_time, max(last for first, last in spans))
+        start_time = window_start = max(start_time, min(first for first, last in spans))
+        data_span = max(last for first, last in spans) - min(first for first, last in spans)
+        width = max(data_span * min(1.0, chunk_size / total), datetime.timedelta(seconds=1))
+        while window_start <= end_time:
+            window_end = min(window_start + width - resolution, end_time)
+            with self._lock.read_lock():
+                ranges = [series.range(window_start, window_end) for series in store.values()]
+            for data in heapq.merge(*ranges, key=lambda d: d.timestamp):
+                # Агрегат, начатый до порции, уже отдан с предыдущей порцией
+                if data.timestamp >= window_start or window_start == start_time:
+                    yield data
+            window_start = window_end + resolution
+    
+    def get_sensor_totals(self, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> List[Tuple[str, AggregateBucket]]:
+        # Блокировка берется на каждый датчик отдельно, как и порции iter_historical_data
+        with self._lock.read_lock():
+            store = list(self._select_tier(start_time, end_time).items())
+        totals = []
+        for sensor_id, series in store:
+            with self._lock.read_lock():
+                bucket = series.totals(start_time, end_time)
+            if bucket.count:
+                totals.append((sensor_id, bucket))
+        return totals
+    
+    def get_rollups(self, period: str, start_time: datetime.datetime, end_time: datetime.datetime,
+                    object_id: Optional[str] = None, sensor_type: Optional[SensorType] = None
+                    ) -> List[Tuple[str, Optional[SensorType], AggregateBucket]]:
+        """Агрегаты period ("hourly"/"daily") с началом интервала в [start_time, end_time]"""
+        with self._lock.read_lock():
+            return self.rollup_cube.query(period, start_time, end_time, object_id, sensor_type)
+    
+    def get_network_object(self, object_id: str) -> Optional[NetworkObject]:
+        with self._lock.read_lock():
+            return self.network_objects.get(object_id)
+    
+    def get_all_network_objects(self) -> List[NetworkObject]:
+        with self._lock.read_lock():
+            return list(self.network_objects.values())
+    
+    def save_network_object(self, network_object: NetworkObject):
+        with self._lock.write_lock():
+            self.network_objects[network_object.object_id] = network_object
+    
+    def register_sensor(self, sensor: Sensor):
+        with self._lock.write_lock():
+            if sensor.sensor_id not in self.sensors:
+                self.sensors_by_object.setdefault(sensor.network_object_id, []).append(sensor)
+            self.sensors[sensor.sensor_id] = sensor
+            self._sensor_rollups.pop(sensor.sensor_id, None)
+    
+    def get_sensor(self, sensor_id: str) -> Optional[Sensor]:
+        with self._lock.read_lock():
+            return self.sensors.get(sensor_id)
+    
+    def get_sensors_for_object(self, object_id: str) -> List[Sensor]:
+        with self._lock.read_lock():
+            return list(self.sensors_by_object.get(object_id, []))
+    
+    def update_object_load(self, object_id: str, load: float) -> bool:
+        with self._lock.write_lock():
+            network_object = self.network_objects.get(object_id)
+            if network_object is None:
+                return False
+            network_object.current_load = load
+            return True
+    
+    def get_all_anomalies(self) -> List[Anomaly]:
+        with self._lock.read_lock():
+            return self.anomalies.all()
+    
+    def get_anomaly(self, anomaly_id: str) -> Optional[Anomaly]:
+        with self._lock.read_lock():
+            return self.anomalies.get(anomaly_id)
+    
+    def get_anomalies_between(self, start_time: datetime.datetime,
+                              end_time: datetime.datetime) -> List[Anomaly]:
+        with self._lock.read_lock():
+            return self.anomalies.between(start_time, end_time)
+    
+    def iter_anomalies_between(self, start_time: datetime.datetime,
+                               end_time: datetime.datetime) -> Iterator[Anomaly]:
+        # Аномалии и так в памяти - копируется только список ссылок
+        return iter(self.get_anomalies_between(start_time, end_time))
+    
+    def get_anomalies_for_object(self, object_id: str) -> List[Anomaly]:
+        with self._lock.read_lock():
+            return self.anomalies.for_object(object_id)
+    
+    def find_anomaly_by_prefix(self, prefix: str) -> Optional[Anomaly]:
+        with self._lock.read_lock():
+            return self.anomalies.find_by_prefix(prefix)
+    
+    def update_anomaly_status(self, anomaly_id: str, status: str) -> bool:
+        with self._lock.write_lock():
+            anomaly = self.anomalies.get(anomaly_id)
+            if anomaly is not None:
+                self._invalidate_reports(anomaly.detection_time)
+            updated = self.anomalies.set_status(anomaly_id, status)
+        # Подписчики вызываются без блокировки: они могут обращаться к репозиторию
+        if updated:
+            self._notify_status(anomaly_id, status)
+        return updated
+    
+    def update_anomaly_incident(self, anomaly: Anomaly) -> bool:
+        """Сохранение счетчиков повторов, пика, критичности и времени закрытия инцидента"""
+        with self._lock.write_lock():
+            stored = self.anomalies.get(anomaly.anomaly_id)
+            if stored is None:
+                return False
+            self._invalidate_reports(stored.detection_time)
+            if stored is not anomaly:
+                stored.last_seen = anomaly.last_seen
+                stored.peak_value = anomaly.peak_value
+                stored.occurrence_count = anomaly.occurrence_count
+                stored.severity = anomaly.severity
+                stored.closed_time = anomaly.closed_time
+            return True
+    
+    def store_recommendation(self, recommendation: Recommendation):
+        with self._lock.write_lock():
+            self.recommendations.add(recommendation)
+    
+    def get_recommendation(self, recommendation_id: str) -> Optional[Recommendation]:
+        with self._lock.read_lock():
+            return self.recommendations.get(recommendation_id)
+    
+    def get_recommendations_for_anomaly(self, anomaly_id: str) -> List[Recommendation]:
+        with self._lock.read_lock():
+            return self.recommendations.for_anomaly(anomaly_id)
+    
+    def get_pending_recommendations(self, limit: Optional[int] = None) -> List[Recommendation]:
+        if limit is None:
+            with self._lock.read_lock():
+                return self.recommendations.pending()
+        # Очередь перестраивается при чтении верхних элементов - нужна монопольная блокировка
+        with self._lock.write_lock():
+            return self.recommendations.pending(limit)
+    
+    def update_recommendation_status(self, recommendation_id: str, status: str,
+                                     executor_id: Optional[str] = None) -> bool:
+        with self._lock.write_lock():
+            return self.recommendations.set_status(recommendation_id, status, executor_id)
+    
+    def store_forecast(self, forecast: LoadForecast):
+        with self._lock.write_lock():
+            self.forecasts.add(forecast)
+    
+    def get_latest_forecast(self, object_id: str, period: str = "hourly") -> Optional[LoadForecast]:
+        with self._lock.read_lock():
+            return self.forecasts.latest(object_id, period)
+    
+    def get_forecast_history(self, object_id: str, period: str = "hourly") -> List[LoadForecast]:
+        with self._lock.read_lock():
+            return self.forecasts.for_object(object_id, period)
+    
+    def store_report(self, report: Report):
+        with self._lock.write_lock():
+            self.reports.append(report)
+    
+    def get_reports(self) -> List[Report]:
+        with self._lock.read_lock():
+            return list(self.reports)
+    
+    def get_cached_report(self, report_type: str, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> Optional[Tuple[str, str]]:
+        """(заголовок, содержание) отчета за закрытый период"""
+        with self._lock.read_lock():
+            return self.report_cache.get((report_type, start_time, end_time))
+    
+    def begin_cached_report(self, report_type: str, start_time: datetime.datetime,
+                            end_time: datetime.datetime) -> int:
+        """Номер построения отчета для store_cached_report/discard_cached_report"""
+        with self._lock.write_lock():
+            return self.report_cache.begin((report_type, start_time, end_time))
+    
+    def store_cached_report(self, build: int, title: str, content: str):
+        """Сохраняется, только если в период отчета ничего не записали во время построения"""
+        with self._lock.write_lock():
+            self.report_cache.put(build, title, content)
+    
+    def discard_cached_report(self, build: int):
+        with self._lock.write_lock():
+            self.report_cache.discard(build)
+    
+    def _invalidate_reports(self, timestamp: datetime.datetime):
+        # Вызывается под блокировкой записи
+        if self.report_cache.touches(timestamp):
+            self.report_cache.invalidate(timestamp)
+
+def _to_db_time(value: Optional[datetime.datetime]) -> Optional[str]:
+    # Строка фиксированной ширины - лексикографический порядок совпадает с временным
+    return value.isoformat(sep=" ", timespec="microseconds") if value else None
+
+def _from_db_time(value: Optional[str]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+NETWORK_OBJECT_CLASSES = {cls.__name__: cls for cls in 
+                          (NetworkObject, Substation, Feeder, RenewableSource, Consumer)}
+
+def network_object_to_json(network_object: NetworkObject) -> Tuple[str, str]:
+    """Класс объекта и его поля в JSON - для базы данных и файлов записи"""
+    payload = dataclasses.asdict(network_object)
+    payload["object_type"] = network_object.object_type.name
+    return type(network_object).__name__, json.dumps(payload, ensure_ascii=False)
+
+def network_object_from_json(kind: str, payload: str) -> NetworkObject:
+    fields = json.loads(payload)
+    fields["object_type"] = NetworkObjectType[fields["object_type"]]
+    return NETWORK_OBJECT_CLASSES.get(kind, NetworkObject)(**fields)
+
+class SqliteDataRepository(IDataRepository):
+    ANOMALY_INCIDENT_COLUMNS = [("last_seen", "TEXT"), ("peak_value", "REAL"),
+                                ("occurrence_count", "INTEGER NOT NULL DEFAULT 1"),
+                                ("closed_time", "TEXT"), ("peak_unit", "TEXT NOT NULL DEFAULT ''")]
+    
+    def __init__(self, db_path: str = "smartgrid.db", batch_size: int = 500,
+                 flush_interval: float = 1.0, forecast_history: int = 48,
+                 read_only: bool = False):
+        """read_only - только чтение существующей базы (выгрузка): без создания схемы,
+        тестовых объектов, построения агрегатов и сохранения объектов при закрытии"""
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.forecast_history = forecast_history
+        self.read_only = read_only
+        
+        # Соединение используется и потоком генерации данных, и потоком Tk
+        self._lock = threading.RLock()
+        self.status_listeners: List[Callable[[str, str], None]] = []
+        if read_only:
+            uri = f"file:{urllib.request.pathname2url(os.path.abspath(db_path))}?mode=ro"
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema()
+        
+        # Показания датчиков и изменившиеся объекты копятся в буфере и записываются одной
+        # транзакцией: при заполнении буфера и по таймеру раз в flush_interval секунд
+        self._pending_sensor_rows: List[tuple] = []
+        self._dirty_objects: Dict[str, NetworkObject] = {}
+        self._last_flush = time.monotonic()
+        self._flush_stop = threading.Event()
+        
+        self.network_objects: Dict[str, NetworkObject] = self._load_network_objects()
+        if not self.network_objects and not read_only:
+            for obj in create_test_network_objects():
+                self.save_network_object(obj)
+        
+        self.sensors: Dict[str, Sensor] = {}
+        self.sensors_by_object: Dict[str, List[Sensor]] = {}
+        self._rollup_keys: Dict[str, Tuple[str, Optional[SensorType]]] = {}
+        for row in self._connection.execute(
+                "SELECT sensor_id, sensor_type, network_object_id, status FROM sensors"):
+            self._cache_sensor(Sensor(sensor_id=row[0], sensor_type=SensorType[row[1]],
+                                      network_object_id=row[2], status=row[3]))
+        
+        self.report_cache = ReportCache()
+        for row in self._connection.execute(
+                "SELECT report_type, start_time, end_time, title, content FROM report_cache "
+                "ORDER BY rowid"):
+            build = self.report_cache.begin((row[0], _from_db_time(row[1]), _from_db_time(row[2])))
+            self.report_cache.put(build, row[3], row[4])
+        
+        # Базы, созданные до ведения агрегатов: агрегаты строятся один раз по всей истории
+        if read_only:
+            return
+        if (self._connection.execute("SELECT 1 FROM sensor_rollups LIMIT 1").fetchone() is None and
+                self._connection.execute("SELECT 1 FROM sensor_data LIMIT 1").fetchone() is not None):
+            with self._connection:
+                self._store_rollups(self._connection.execute(
+                    "SELECT data_id, sensor_id, timestamp, value FROM sensor_data"))
+        
+        if flush_interval > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+    
+    def _flush_loop(self):
+        # Буфер сбрасывается и тогда, когда новых показаний нет
+        while not self._flush_stop.wait(self.flush_interval):
+            with self._lock:
+                if self._flush_stop.is_set():
+                    return
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.flush()
+    
+    def _create_schema(self):
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS sensor_data (
+                    data_id TEXT NOT NULL,
+                    sensor_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    unit TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS idx_sensor_data_sensor_time 
+                    ON sensor_data (sensor_id, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_sensor_data_time 
+                    ON sensor_data (timestamp);
+                
+                CREATE TABLE IF NOT EXISTS anomalies (
+                    anomaly_id TEXT PRIMARY KEY,
+                    detection_time TEXT NOT NULL,
+                    anomaly_type TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    affected_object_id TEXT NOT NULL,
+                    confidence_score REAL NOT NULL,
+                    recommended_action TEXT NOT NULL DEFAULT '',
+                    last_seen TEXT,
+                    peak_value REAL,
+                    occurrence_count INTEGER NOT NULL DEFAULT 1,
+                    closed_time TEXT,
+                    peak_unit TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS idx_anomalies_status ON anomalies (status);
+                CREATE INDEX IF NOT EXISTS idx_anomalies_time ON anomalies (detection_time);
+                CREATE INDEX IF NOT EXISTS idx_anomalies_object 
+                    ON anomalies (affected_object_id, detection_time);
+                
+                CREATE TABLE IF NOT EXISTS recommendations (
+                    recommendation_id TEXT PRIMARY KEY,
+                    anomaly_id TEXT NOT NULL,
+                    creation_time TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    action_type TEXT NOT NULL,
+                    executor_id TEXT,
+                    execution_time TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_recommendations_pending 
+                    ON recommendations (status, priority DESC, creation_time);
+                CREATE INDEX IF NOT EXISTS idx_recommendations_anomaly 
+                    ON recommendations (anomaly_id);
+                
+                CREATE TABLE IF NOT EXISTS forecasts (
+                    forecast_id TEXT PRIMARY KEY,
+                    object_id TEXT NOT NULL,
+                    forecast_time TEXT NOT NULL,
+                    predicted_load REAL NOT NULL,
+                    confidence REAL NOT NULL,
+                    forecast_period TEXT NOT NULL,
+                    weather_factor REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_forecasts_object_time 
+                    ON forecasts (object_id, forecast_time);
+                CREATE INDEX IF NOT EXISTS idx_forecasts_object_period_time 
+                    ON forecasts (object_id, forecast_period, forecast_time);
+                
+                CREATE TABLE IF NOT EXISTS reports (
+                    report_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    report_type TEXT NOT NULL,
+                    creation_date TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_by TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_reports_time ON reports (creation_date, report_id);
+                
+                CREATE TABLE IF NOT EXISTS report_cache (
+                    report_type TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (report_type, start_time, end_time)
+                );
+                
+                CREATE TABLE IF NOT EXISTS network_objects (
+                    object_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                );
+                
+                CREATE TABLE IF NOT EXISTS sensors (
+                    sensor_id TEXT PRIMARY KEY,
+                    sensor_type TEXT NOT NULL,
+                    network_object_id TEXT NOT NULL,
+                    status TEXT NOT NULL
+                );
+                
+                CREATE TABLE IF NOT EXISTS sensor_rollups (
+                    period TEXT NOT NULL,
+                    object_id TEXT NOT NULL,
+                    sensor_type TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    sum REAL NOT NULL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    PRIMARY KEY (period, object_id, sensor_type, bucket_start)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sensor_rollups_period_start 
+                    ON sensor_rollups (period, bucket_start);
+            """)
+            
+            # Базы, созданные до учета повторов аномалий
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(anomalies)")}
+            for column, definition in self.ANOMALY_INCIDENT_COLUMNS:
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE anomalies ADD COLUMN {column} {definition}")
+    
+    # ---------- Показания датчиков ----------
+    
+    def store_sensor_data(self, data: SensorData):
+        with self._lock:
+            self._pending_sensor_rows.append(
+                (data.data_id, data.sensor_id, _to_db_time(data.timestamp), data.value, data.unit)
+            )
+            if (len(self._pending_sensor_rows) >= self.batch_size or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+    
+    def store_sensor_data_batch(self, data: List[SensorData]):
+        with self._lock:
+            self._pending_sensor_rows.extend(
+                (item.data_id, item.sensor_id, _to_db_time(item.timestamp), item.value, item.unit)
+                for item in data
+            )
+            self.flush()
+    
+    def flush(self):
+        with self._lock:
+            if self._dirty_objects:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO network_objects VALUES (?, ?, ?)",
+                        [(object_id, *network_object_to_json(obj))
+                         for object_id, obj in self._dirty_objects.items()]
+                    )
+                self._dirty_objects = {}
+            if self._pending_sensor_rows:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT INTO sensor_data VALUES (?, ?, ?, ?, ?)",
+                        self._pending_sensor_rows
+                    )
+                    # Агрегаты обновляются в той же транзакции, что и показания
+                    self._store_rollups(self._pending_sensor_rows)
+                    if self.report_cache.latest_end is not None:
+                        latest_end = _to_db_time(self.report_cache.latest_end)
+                        for late_time in {row[2] for row in self._pending_sensor_rows
+                                          if row[2] <= latest_end}:
+                            self._invalidate_reports(_from_db_time(late_time))
+                self._pending_sensor_rows = []
+            self._last_flush = time.monotonic()
+    
+    def _rollup_key(self, sensor_id: str) -> Tuple[str, Optional[SensorType]]:
+        key = self._rollup_keys.get(sensor_id)
+        if key is None:
+            sensor = self.sensors.get(sensor_id)
+            key = self._rollup_keys[sensor_id] = (
+                (sensor.network_object_id, sensor.sensor_type) if sensor
+                else guess_sensor_owner(sensor_id))
+        return key
+    
+    def _store_rollups(self, rows: Iterable[tuple]):
+        # Начало часа и суток берется прямо из строки времени: формат _to_db_time фиксированный
+        buckets: Dict[tuple, AggregateBucket] = {}
+        for row in rows:
+            object_id, sensor_type = self._rollup_key(row[1])
+            type_name = sensor_type.name if sensor_type else ""
+            timestamp, value = row[2], row[3]
+            for key in (("hourly", object_id, type_name, timestamp[:13] + ":00:00.000000"),
+                        ("daily", object_id, type_name, timestamp[:10] + " 00:00:00.000000")):
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = AggregateBucket(key[3])
+                bucket.add(value)
+        
+        self._connection.executemany(
+            "INSERT INTO sensor_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (period, object_id, sensor_type, bucket_start) DO UPDATE SET "
+            "count = count + excluded.count, sum = sum + excluded.sum, "
+            "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+            [key + (bucket.count, bucket.sum, bucket.min, bucket.max)
+             for key, bucket in buckets.items()]
+        )
+    
+    def get_sensor_totals(self, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> List[Tuple[str, AggregateBucket]]:
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT sensor_id, COUNT(*), SUM(value), MIN(value), MAX(value) FROM sensor_data "
+                "WHERE timestamp BETWEEN ? AND ? GROUP BY sensor_id",
+                (_to_db_time(start_time), _to_db_time(end_time))
+            ).fetchall()
+        
+        totals = []
+        for row in rows:
+            bucket = AggregateBucket(start_time)
+            bucket.count, bucket.sum, bucket.min, bucket.max = row[1:]
+            totals.append((row[0], bucket))
+        return totals
+    
+    def get_rollups(self, period: str, start_time: datetime.datetime, end_time: datetime.datetime,
+                    object_id: Optional[str] = None, sensor_type: Optional[SensorType] = None
+                    ) -> List[Tuple[str, Optional[SensorType], AggregateBucket]]:
+        """Агрегаты period ("hourly"/"daily") с началом интервала в [start_time, end_time]"""
+        where = "WHERE period = ? AND bucket_start BETWEEN ? AND ?"
+        params = [period, _to_db_time(start_time), _to_db_time(end_time)]
+        if object_id is not None:
+            where += " AND object_id = ?"
+            params.append(object_id)
+        if sensor_type is not None:
+            where += " AND sensor_type = ?"
+            params.append(sensor_type.name)
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT object_id, sensor_type, bucket_start, count, sum, min, max "
+                "FROM sensor_rollups " + where, params
+            ).fetchall()
+        
+        result = []
+        for row in rows:
+            bucket = AggregateBucket(_from_db_time(row[2]))
+            bucket.count, bucket.sum, bucket.min, bucket.max = row[3:]
+            result.append((row[0], SensorType[row[1]] if row[1] else None, bucket))
+        return result
+    
+    def get_sensor_data(self, sensor_id: str, start_time: datetime.datetime, 
+                       end_time: datetime.datetime) -> List[SensorData]:
+        return self._query_sensor_data(
+            "WHERE sensor_id = ? AND timestamp BETWEEN ? AND ?",
+            (sensor_id, _to_db_time(start_time), _to_db_time(end_time))
+        )
+    
+    def get_historical_data(self, start_time: datetime.datetime, 
+                          end_time: datetime.datetime) -> List[SensorData]:
+        return self._query_sensor_data(
+            "WHERE timestamp BETWEEN ? AND ?",
+            (_to_db_time(start_time), _to_db_time(end_time))
+        )
+    
+    def iter_historical_data(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                             chunk_size: int = 10000) -> Iterator[SensorData]:
+        """Показания диапазона в порядке времени, страницами по chunk_size строк.
+        
+        Страница продолжается с последней пары (timestamp, rowid), поэтому курсор не держит
+        соединение между страницами, а каждая страница - один проход по индексу времени.
+        """
+        last_time, last_rowid = _to_db_time(start_time), -1
+        end = _to_db_time(end_time)
+        while True:
+            with self._lock:
+                self.flush()
+                rows = self._connection.execute(
+                    "SELECT rowid, data_id, sensor_id, timestamp, value, unit FROM sensor_data "
+                    "WHERE timestamp >= ? AND timestamp <= ? AND (timestamp > ? OR rowid > ?) "
+                    "ORDER BY timestamp, rowid LIMIT ?",
+                    (last_time, end, last_time, last_rowid, chunk_size)
+                ).fetchall()
+            for row in rows:
+                yield SensorData(data_id=row[1], sensor_id=row[2], timestamp=_from_db_time(row[3]),
+                                 value=row[4], unit=row[5])
+            if len(rows) < chunk_size:
+                return
+            last_rowid, last_time = rows[-1][0], rows[-1][3]
+    
+    def _query_sensor_data(self, where: str, params: tuple) -> List[SensorData]:
+        with self._lock:
+            # Чтение должно видеть показания, которые еще лежат в буфере
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT data_id, sensor_id, timestamp, value, unit FROM sensor_data "
+                + where + " ORDER BY timestamp", params
+            ).fetchall()
+        return [SensorData(data_id=row[0], sensor_id=row[1], timestamp=_from_db_time(row[2]),
+                           value=row[3], unit=row[4]) for row in rows]
+    
+    # ---------- Аномалии ----------
+    
+    def store_anomaly(self, anomaly: Anomaly):
+        # Сброс кэша отчетов и запись - в одной транзакции под self._lock
+        with self._lock, self._connection:
+            self._invalidate_reports(anomaly.detection_time)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO anomalies (anomaly_id, detection_time, anomaly_type, severity, "
+                "description, status, affected_object_id, confidence_score, recommended_action, "
+                "last_seen, peak_value, occurrence_count, closed_time, peak_unit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (anomaly.anomaly_id, _to_db_time(anomaly.detection_time), anomaly.anomaly_type.name,
+                 anomaly.severity.name, anomaly.description, anomaly.status,
+                 anomaly.affected_object_id, anomaly.confidence_score, anomaly.recommended_action,
+                 _to_db_time(anomaly.last_seen) if anomaly.last_seen else None, anomaly.peak_value,
+                 anomaly.occurrence_count,
+                 _to_db_time(anomaly.closed_time) if anomaly.closed_time else None,
+                 anomaly.peak_unit)
+            )
+    
+    def get_active_anomalies(self) -> List[Anomaly]:
+        return self._query_anomalies(
+            "WHERE status IN ('detected', 'analyzing', 'action_required') "
+            "ORDER BY detection_time", ()
+        )
+    
+    def get_all_anomalies(self) -> List[Anomaly]:
+        return self._query_anomalies("", ())
+    
+    def get_anomaly(self, anomaly_id: str) -> Optional[Anomaly]:
+        anomalies = self._query_anomalies("WHERE anomaly_id = ?", (anomaly_id,))
+        return anomalies[0] if anomalies else None
+    
+    def get_anomalies_between(self, start_time: datetime.datetime,
+                              end_time: datetime.datetime) -> List[Anomaly]:
+        return self._query_anomalies(
+            "WHERE detection_time BETWEEN ? AND ? ORDER BY detection_time",
+            (_to_db_time(start_time), _to_db_time(end_time))
+        )
+    
+    def iter_anomalies_between(self, start_time: datetime.datetime, end_time: datetime.datetime,
+                               chunk_size: int = 10000) -> Iterator[Anomaly]:
+        """Аномалии диапазона в порядке времени, страницами по (detection_time, anomaly_id)"""
+        last_time, last_id = _to_db_time(start_time), ""
+        end = _to_db_time(end_time)
+        while True:
+            anomalies = self._query_anomalies(
+                "WHERE detection_time >= ? AND detection_time <= ? "
+                "AND (detection_time > ? OR anomaly_id > ?) "
+                "ORDER BY detection_time, anomaly_id LIMIT ?",
+                (last_time, end, last_time, last_id, chunk_size)
+            )
+            yield from anomalies
+            if len(anomalies) < chunk_size:
+                return
+            last_time, last_id = _to_db_time(anomalies[-1].detection_time), anomalies[-1].anomaly_id
+    
+    def get_anomalies_for_object(self, object_id: str) -> List[Anomaly]:
+        return self._query_anomalies(
+            "WHERE affected_object_id = ? ORDER BY detection_time", (object_id,)
+        )
+    
+    def find_anomaly_by_prefix(self, prefix: str) -> Optional[Anomaly]:
+        # Диапазон по первичному ключу вместо LIKE, чтобы использовался индекс
+        anomalies = self._query_anomalies(
+            "WHERE anomaly_id >= ? AND anomaly_id < ? LIMIT 1",
+            (prefix, prefix + "\uffff")
+        )
+        return anomalies[0] if anomalies else None
+    
+    def update_anomaly_status(self, anomaly_id: str, status: str) -> bool:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT detection_time FROM anomalies WHERE anomaly_id = ?", (anomaly_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._invalidate_reports(_from_db_time(row[0]))
+            cursor = self._connection.execute(
+                "UPDATE anomalies SET status = ? WHERE anomaly_id = ?", (status, anomaly_id)
+            )
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify_status(anomaly_id, status)
+        return updated
+    
+    def update_anomaly_incident(self, anomaly: Anomaly) -> bool:
+        with self._lock, self._connection:
+            self._invalidate_reports(anomaly.detection_time)
+            cursor = self._connection.execute(
+                "UPDATE anomalies SET last_seen = ?, peak_value = ?, occurrence_count = ?, severity = ?, "
+                "closed_time = ? WHERE anomaly_id = ?",
+                (_to_db_time(anomaly.last_seen) if anomaly.last_seen else None, anomaly.peak_value,
+                 anomaly.occurrence_count, anomaly.severity.name,
+                 _to_db_time(anomaly.closed_time) if anomaly.closed_time else None, anomaly.anomaly_id)
+            )
+            return cursor.rowcount > 0
+    
+    def _query_anomalies(self, where: str, params: tuple) -> List[Anomaly]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT anomaly_id, detection_time, anomaly_type, severity, description, status, "
+                "affected_object_id, confidence_score, recommended_action, last_seen, peak_value, "
+                "occurrence_count, closed_time, peak_unit FROM anomalies "
+                + where, params
+            ).fetchall()
+        return [Anomaly(anomaly_id=row[0], detection_time=_from_db_time(row[1]),
+                        anomaly_type=AnomalyType[row[2]], severity=SeverityLevel[row[3]],
+                        description=row[4], status=row[5], affected_object_id=row[6],
+                        confidence_score=row[7], recommended_action=row[8],
+                        last_seen=_from_db_time(row[9]) if row[9] else None, peak_value=row[10],
+                        occurrence_count=row[11],
+                        closed_time=_from_db_time(row[12]) if row[12] else None,
+                        peak_unit=row[13]) for row in rows]
+    
+    # ---------- Объекты сети ----------
     
     def get_network_object(self, object_id: str) -> Optional[NetworkObject]:
         return self.network_objects.get(object_id)
@@ -81,23 +1785,254 @@ class InMemoryDataRepository(IDataRepository):
     def get_all_network_objects(self) -> List[NetworkObject]:
         return list(self.network_objects.values())
     
+    def save_network_object(self, network_object: NetworkObject):
+        self.network_objects[network_object.object_id] = network_object
+        kind, payload = network_object_to_json(network_object)
+        self._execute(
+            "INSERT OR REPLACE INTO network_objects VALUES (?, ?, ?)",
+            (network_object.object_id, kind, payload)
+        )
+    
+    def update_object_load(self, object_id: str, load: float) -> bool:
+        # Нагрузка меняется каждые несколько секунд - в базу она попадает со сбросом буфера
+        with self._lock:
+            network_object = self.network_objects.get(object_id)
+            if network_object is None:
+                return False
+            network_object.current_load = load
+            self._dirty_objects[object_id] = network_object
+            return True
+    
+    def register_sensor(self, sensor: Sensor):
+        self._execute(
+            "INSERT OR REPLACE INTO sensors VALUES (?, ?, ?, ?)",
+            (sensor.sensor_id, sensor.sensor_type.name, sensor.network_object_id, sensor.status)
+        )
+        with self._lock:
+            self._cache_sensor(sensor)
+    
+    def _cache_sensor(self, sensor: Sensor):
+        if sensor.sensor_id not in self.sensors:
+            self.sensors_by_object.setdefault(sensor.network_object_id, []).append(sensor)
+        self.sensors[sensor.sensor_id] = sensor
+        self._rollup_keys.pop(sensor.sensor_id, None)
+    
+    def get_sensor(self, sensor_id: str) -> Optional[Sensor]:
+        return self.sensors.get(sensor_id)
+    
+    def get_sensors_for_object(self, object_id: str) -> List[Sensor]:
+        return list(self.sensors_by_object.get(object_id, []))
+    
+    def _load_network_objects(self) -> Dict[str, NetworkObject]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT kind, payload FROM network_objects ORDER BY rowid"
+            ).fetchall()
+        objects = {}
+        for kind, payload in rows:
+            obj = network_object_from_json(kind, payload)
+            objects[obj.object_id] = obj
+        return objects
+    
+    # ---------- Рекомендации ----------
+    
     def store_recommendation(self, recommendation: Recommendation):
-        self.recommendations.append(recommendation)
+        self._execute(
+            "INSERT OR REPLACE INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (recommendation.recommendation_id, recommendation.anomaly_id,
+             _to_db_time(recommendation.creation_time), recommendation.content,
+             recommendation.priority, recommendation.status, recommendation.action_type,
+             recommendation.executor_id, _to_db_time(recommendation.execution_time))
+        )
+    
+    def get_recommendation(self, recommendation_id: str) -> Optional[Recommendation]:
+        recommendations = self._query_recommendations(
+            "WHERE recommendation_id = ?", (recommendation_id,)
+        )
+        return recommendations[0] if recommendations else None
+    
+    def get_recommendations_for_anomaly(self, anomaly_id: str) -> List[Recommendation]:
+        return self._query_recommendations(
+            "WHERE anomaly_id = ? ORDER BY creation_time", (anomaly_id,)
+        )
+    
+    def get_pending_recommendations(self, limit: Optional[int] = None) -> List[Recommendation]:
+        return self._query_recommendations(
+            "WHERE status = 'pending' ORDER BY priority DESC, creation_time LIMIT ?",
+            (limit if limit is not None else -1,)
+        )
+    
+    def _query_recommendations(self, where: str, params: tuple) -> List[Recommendation]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT recommendation_id, anomaly_id, creation_time, content, priority, status, "
+                "action_type, executor_id, execution_time FROM recommendations " + where, params
+            ).fetchall()
+        return [Recommendation(recommendation_id=row[0], anomaly_id=row[1],
+                               creation_time=_from_db_time(row[2]), content=row[3],
+                               priority=row[4], status=row[5], action_type=row[6],
+                               executor_id=row[7], execution_time=_from_db_time(row[8]))
+                for row in rows]
+    
+    def update_recommendation_status(self, recommendation_id: str, status: str,
+                                     executor_id: Optional[str] = None) -> bool:
+        cursor = self._execute(
+            "UPDATE recommendations SET status = ?, executor_id = COALESCE(?, executor_id) "
+            "WHERE recommendation_id = ?", (status, executor_id, recommendation_id)
+        )
+        return cursor.rowcount > 0
+    
+    # ---------- Прогнозы и отчеты ----------
+    
+    def store_forecast(self, forecast: LoadForecast):
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (forecast.forecast_id, forecast.object_id, _to_db_time(forecast.forecast_time),
+                     forecast.predicted_load, forecast.confidence, forecast.forecast_period,
+                     forecast.weather_factor)
+                )
+                # Глубина истории по объекту и периоду ограничена forecast_history
+                self._connection.execute(
+                    "DELETE FROM forecasts WHERE object_id = ? AND forecast_period = ? "
+                    "AND forecast_time < (SELECT forecast_time FROM forecasts "
+                    "WHERE object_id = ? AND forecast_period = ? "
+                    "ORDER BY forecast_time DESC LIMIT 1 OFFSET ?)",
+                    (forecast.object_id, forecast.forecast_period, forecast.object_id,
+                     forecast.forecast_period, self.forecast_history - 1)
+                )
+    
+    def get_latest_forecast(self, object_id: str, period: str = "hourly") -> Optional[LoadForecast]:
+        forecasts = self._query_forecasts(
+            "WHERE object_id = ? AND forecast_period = ? ORDER BY forecast_time DESC LIMIT 1",
+            (object_id, period))
+        return forecasts[0] if forecasts else None
+    
+    def get_forecast_history(self, object_id: str, period: str = "hourly") -> List[LoadForecast]:
+        return self._query_forecasts(
+            "WHERE object_id = ? AND forecast_period = ? ORDER BY forecast_time", (object_id, period))
+    
+    def _query_forecasts(self, where: str, params: tuple) -> List[LoadForecast]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT forecast_id, object_id, forecast_time, predicted_load, confidence, "
+                "forecast_period, weather_factor FROM forecasts " + where, params
+            ).fetchall()
+        return [LoadForecast(forecast_id=row[0], object_id=row[1],
+                             forecast_time=_from_db_time(row[2]), predicted_load=row[3],
+                             confidence=row[4], forecast_period=row[5], weather_factor=row[6])
+                for row in rows]
+    
+    def store_report(self, report: Report):
+        self._execute(
+            "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)",
+            (report.report_id, report.title, report.report_type,
+             _to_db_time(report.creation_date), report.content, report.created_by)
+        )
+    
+    def get_reports(self) -> List[Report]:
+        return self._query_reports("ORDER BY creation_date", ())
+    
+    def iter_reports(self, chunk_size: int = 1000) -> Iterator[Report]:
+        """Отчеты в порядке создания, страницами по (creation_date, report_id)"""
+        last_time, last_id = "", ""
+        while True:
+            reports = self._query_reports(
+                "WHERE creation_date >= ? AND (creation_date > ? OR report_id > ?) "
+                "ORDER BY creation_date, report_id LIMIT ?",
+                (last_time, last_time, last_id, chunk_size)
+            )
+            yield from reports
+            if len(reports) < chunk_size:
+                return
+            last_time, last_id = _to_db_time(reports[-1].creation_date), reports[-1].report_id
+    
+    def _query_reports(self, where: str, params: tuple) -> List[Report]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT report_id, title, report_type, creation_date, content, created_by "
+                "FROM reports " + where, params
+            ).fetchall()
+        return [Report(report_id=row[0], title=row[1], report_type=row[2],
+                       creation_date=_from_db_time(row[3]), content=row[4], created_by=row[5])
+                for row in rows]
+    
+    def get_cached_report(self, report_type: str, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> Optional[Tuple[str, str]]:
+        """(заголовок, содержание) отчета за закрытый период"""
+        with self._lock:
+            # Показания из буфера могут сбросить запись
+            self.flush()
+            return self.report_cache.get((report_type, start_time, end_time))
+    
+    def begin_cached_report(self, report_type: str, start_time: datetime.datetime,
+                            end_time: datetime.datetime) -> int:
+        """Номер построения отчета для store_cached_report/discard_cached_report"""
+        with self._lock:
+            return self.report_cache.begin((report_type, start_time, end_time))
+    
+    def store_cached_report(self, build: int, title: str, content: str):
+        """Сохраняется, только если в период отчета ничего не записали во время построения"""
+        with self._lock:
+            # Показания из буфера могут попасть в период отчета
+            self.flush()
+            key = self.report_cache.pending.get(build, (None,))[0]
+            stored, evicted = self.report_cache.put(build, title, content)
+            if not stored:
+                return
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO report_cache VALUES (?, ?, ?, ?, ?)",
+                    (key[0], _to_db_time(key[1]), _to_db_time(key[2]), title, content)
+                )
+                self._delete_cached_reports(evicted)
     
-    def get_pending_recommendations(self) -> List[Recommendation]:
-        return [r for r in self.recommendations if r.status == "pending"]
+    def discard_cached_report(self, build: int):
+        with self._lock:
+            self.report_cache.discard(build)
+    
+    def _invalidate_reports(self, timestamp: datetime.datetime):
+        # Вызывается под self._lock внутри транзакции
+        if self.report_cache.touches(timestamp):
+            self._delete_cached_reports(self.report_cache.invalidate(timestamp))
+    
+    def _delete_cached_reports(self, keys: List[tuple]):
+        self._connection.executemany(
+            "DELETE FROM report_cache WHERE report_type = ? AND start_time = ? AND end_time = ?",
+            [(report_type, _to_db_time(start), _to_db_time(end)) for report_type, start, end in keys]
+        )
+    
+    def _execute(self, query: str, params: tuple) -> sqlite3.Cursor:
+        with self._lock:
+            with self._connection:
+                return self._connection.execute(query, params)
+    
+    def close(self):
+        with self._lock:
+            self._flush_stop.set()
+            if not self.read_only:
+                self.flush()
+                # Нагрузка и статус объектов меняются на месте - сохраняем их перед закрытием
+                for obj in list(self.network_objects.values()):
+                    self.save_network_object(obj)
+            self._connection.close()
 
 class LoadForecastStrategy(IAnalysisStrategy):
+    RECENT_SAMPLES = 24
+    
     def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> LoadForecast:
         # Простой алгоритм прогнозирования нагрузки
         if not data:
             avg_load = 100.0
         else:
-            avg_load = sum(d.value for d in data[-24:]) / min(len(data), 24)
+            avg_load = self.recent_mean(data)
         
         # Учет погодных условий
         weather_factor = context.get("weather_factor", 1.0)
-        time_factor = self._get_time_factor(datetime.datetime.now())
+        # Момент прогноза: при воспроизведении истории - модельное время
+        now = context.get("now") or datetime.datetime.now()
+        time_factor = self._get_time_factor(now)
         
         predicted_load = avg_load * weather_factor * time_factor
         confidence = 0.85 - abs(weather_factor - 1.0) * 0.1
@@ -105,13 +2040,26 @@ class LoadForecastStrategy(IAnalysisStrategy):
         return LoadForecast(
             forecast_id=str(uuid.uuid4()),
             object_id=context.get("object_id", "unknown"),
-            forecast_time=datetime.datetime.now(),
+            forecast_time=now,
             predicted_load=predicted_load,
             confidence=confidence,
             forecast_period="hourly",
             weather_factor=weather_factor
         )
     
+    def recent_mean(self, data: List[SensorData]) -> float:
+        """Среднее последних RECENT_SAMPLES показаний; агрегат уровня хранения считается
+        за sample_count показаний, поэтому смысл не меняется по мере старения данных"""
+        samples = 0
+        total = 0.0
+        for d in reversed(data):
+            weight = min(d.sample_count, self.RECENT_SAMPLES - samples)
+            total += d.value * weight
+            samples += weight
+            if samples >= self.RECENT_SAMPLES:
+                break
+        return total / samples
+    
     def _get_time_factor(self, dt: datetime.datetime) -> float:
         hour = dt.hour
         if 6 <= hour < 10:  # Утро
@@ -123,6 +2071,143 @@ class LoadForecastStrategy(IAnalysisStrategy):
         else:  # Ночь
             return 0.7
 
+class HoltWintersForecastStrategy(IAnalysisStrategy):
+    """Аддитивный метод Хольта-Уинтерса с суточной и недельной сезонностью для всех объектов сразу.
+    
+    Средние часовые мощности объектов собираются в матрицу (объекты x часы). Рекурсия идет
+    по часам, и на каждом шаге состояния всех объектов обновляются одной операцией NumPy.
+    Сезонные индексы привязаны к часу суток и часу недели календаря.
+    """
+    BUCKET = datetime.timedelta(hours=1)
+    DAY = 24
+    WEEK = 168
+    # Горизонт прогноза в часах: прогноз периода - средняя мощность на горизонте
+    HORIZONS = {"hourly": 1, "daily": 24, "weekly": 168}
+    
+    def __init__(self, alpha: float = 0.3, beta: float = 0.01,
+                 gamma_day: float = 0.2, gamma_week: float = 0.1):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma_day = gamma_day
+        self.gamma_week = gamma_week
+    
+    def build_matrix(self, data: List[SensorData], rows: Dict[str, int], object_count: int,
+                     start: datetime.datetime, bucket_count: int) -> np.ndarray:
+        """Средние по часам; rows - строка матрицы для каждого датчика, пустые часы - NaN"""
+        sums = np.zeros((object_count, bucket_count))
+        counts = np.zeros((object_count, bucket_count))
+        if data:
+            row_index = np.fromiter((rows[d.sensor_id] for d in data), dtype=np.int64, count=len(data))
+            column_index = np.fromiter(((d.timestamp - start) // self.BUCKET for d in data),
+                                       dtype=np.int64, count=len(data))
+            values = np.fromiter((d.value for d in data), dtype=np.float64, count=len(data))
+            # Агрегаты уровней хранения входят в среднее с весом числа показаний
+            weights = np.fromiter((d.sample_count for d in data), dtype=np.float64, count=len(data))
+            inside = (column_index >= 0) & (column_index < bucket_count)
+            np.add.at(sums, (row_index[inside], column_index[inside]), (values * weights)[inside])
+            np.add.at(counts, (row_index[inside], column_index[inside]), weights[inside])
+        with np.errstate(invalid="ignore"):
+            return sums / counts
+    
+    def fit(self, matrix: np.ndarray, start: datetime.datetime) -> Dict[str, np.ndarray]:
+        """Прогнозы всех горизонтов и доверие по ошибкам прогноза на шаг вперед внутри истории"""
+        object_count, bucket_count = matrix.shape
+        hour_of_day = (start.hour + np.arange(bucket_count)) % self.DAY
+        hour_of_week = (start.weekday() * self.DAY + start.hour + np.arange(bucket_count)) % self.WEEK
+        
+        with warnings.catch_warnings():
+            # Объекты без показаний дают пустые срезы - их состояние остается нулевым
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            level = np.nan_to_num(np.nanmean(matrix, axis=1))
+            season_day = np.column_stack([np.nanmean(matrix[:, hour_of_day == h], axis=1)
+                                          if np.any(hour_of_day == h) else np.full(object_count, np.nan)
+                                          for h in range(self.DAY)]) - level[:, None]
+        season_day = np.nan_to_num(season_day)
+        season_week = np.zeros((object_count, self.WEEK))
+        # Недельная сезонность оценивается, только если в истории есть хотя бы две недели
+        gamma_week = 0.0
+        if bucket_count >= 2 * self.WEEK:
+            gamma_week = self.gamma_week
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                for h in range(self.WEEK):
+                    season_week[:, h] = np.nanmean(matrix[:, hour_of_week == h], axis=1) - \
+                        level - season_day[:, h % self.DAY]
+            season_week = np.nan_to_num(season_week)
+        trend = np.zeros(object_count)
+        squared_error = np.zeros(object_count)
+        error_count = np.zeros(object_count)
+        
+        for t in range(bucket_count):
+            d, w = hour_of_day[t], hour_of_week[t]
+            predicted = level + trend + season_day[:, d] + season_week[:, w]
+            observed = ~np.isnan(matrix[:, t])
+            actual = np.where(observed, matrix[:, t], predicted)
+            if t >= self.DAY:
+                squared_error += (actual - predicted) ** 2
+                error_count += observed
+            
+            new_level = self.alpha * (actual - season_day[:, d] - season_week[:, w]) + \
+                (1 - self.alpha) * (level + trend)
+            trend = self.beta * (new_level - level) + (1 - self.beta) * trend
+            season_day[:, d] = self.gamma_day * (actual - new_level - season_week[:, w]) + \
+                (1 - self.gamma_day) * season_day[:, d]
+            season_week[:, w] = gamma_week * (actual - new_level - season_day[:, d]) + \
+                (1 - gamma_week) * season_week[:, w]
+            level = new_level
+        
+        steps = np.arange(1, self.WEEK + 1)
+        future_day = (start.hour + bucket_count - 1 + steps) % self.DAY
+        future_week = (start.weekday() * self.DAY + start.hour + bucket_count - 1 + steps) % self.WEEK
+        predicted = level[:, None] + trend[:, None] * steps + season_day[:, future_day] + \
+            season_week[:, future_week]
+        np.maximum(predicted, 0.0, out=predicted)
+        
+        result = {period: predicted[:, :hours].mean(axis=1) for period, hours in self.HORIZONS.items()}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative_error = np.sqrt(squared_error / error_count) / np.abs(level)
+        result["confidence"] = np.where(np.isfinite(relative_error),
+                                        np.clip(1.0 - relative_error, 0.1, 0.95), 0.5)
+        result["observed"] = ~np.all(np.isnan(matrix), axis=1)
+        return result
+    
+    def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> List[LoadForecast]:
+        """data - показания мощности; context: object_ids, object_of_sensor, start, now, weather_factor
+        и необязательный periods - какие горизонты нужны каждому объекту (по умолчанию все).
+        
+        Для объектов без показаний прогноз не строится.
+        """
+        object_ids = context["object_ids"]
+        rows = {object_id: row for row, object_id in enumerate(object_ids)}
+        sensor_rows = {sensor_id: rows[object_id]
+                       for sensor_id, object_id in context["object_of_sensor"].items()}
+        start = floor_time(context["start"], self.BUCKET)
+        now = context.get("now") or datetime.datetime.now()
+        bucket_count = (floor_time(now, self.BUCKET) - start) // self.BUCKET
+        if not object_ids or bucket_count <= 0:
+            return []
+        
+        matrix = self.build_matrix(data, sensor_rows, len(object_ids), start, bucket_count)
+        result = self.fit(matrix, start)
+        weather_factor = context.get("weather_factor", 1.0)
+        periods = context.get("periods", {})
+        
+        forecasts = []
+        for row, object_id in enumerate(object_ids):
+            if not result["observed"][row]:
+                continue
+            for period in periods.get(object_id, self.HORIZONS):
+                forecasts.append(LoadForecast(
+                    forecast_id=str(uuid.uuid4()),
+                    object_id=object_id,
+                    forecast_time=now,
+                    predicted_load=float(result[period][row]) * weather_factor,
+                    confidence=float(result["confidence"][row]),
+                    forecast_period=period,
+                    weather_factor=weather_factor
+                ))
+        return forecasts
+
 class AnomalyDetectionStrategy(IAnalysisStrategy):
     def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> Optional[Anomaly]:
         if not data:
@@ -135,37 +2220,792 @@ class AnomalyDetectionStrategy(IAnalysisStrategy):
         # Проверка на перегрузку
         max_load = context.get("max_load", 1000.0)
         if latest_data.value > max_load * 0.9:
-            severity = SeverityLevel.CRITICAL if latest_data.value > max_load else SeverityLevel.HIGH
-            return Anomaly(
-                anomaly_id=str(uuid.uuid4()),
-                detection_time=datetime.datetime.now(),
-                anomaly_type=AnomalyType.OVERLOAD,
-                severity=severity,
-                description=f"Перегрузка на объекте {object_id}: {latest_data.value:.1f} > {max_load * 0.9:.1f}",
-                status="detected",
-                affected_object_id=object_id,
-                confidence_score=0.9,
-                recommended_action="Перераспределить нагрузку или отключить второстепенных потребителей"
-            )
+            return self.overload_anomaly(object_id, latest_data, max_load)
         
         # Проверка на падение напряжения
         if latest_data.sensor_id.endswith("_voltage") and latest_data.value < 210:
-            return Anomaly(
-                anomaly_id=str(uuid.uuid4()),
-                detection_time=datetime.datetime.now(),
-                anomaly_type=AnomalyType.VOLTAGE_DROP,
-                severity=SeverityLevel.MEDIUM,
-                description=f"Падение напряжения на объекте {object_id}: {latest_data.value:.1f} В",
-                status="detected",
-                affected_object_id=object_id,
-                confidence_score=0.75,
-                recommended_action="Проверить оборудование и стабилизаторы"
-            )
+            return self.voltage_drop_anomaly(object_id, latest_data)
+        
+        return None
+    
+    @staticmethod
+    def overload_anomaly(object_id: str, data: SensorData, max_load: float) -> Anomaly:
+        severity = SeverityLevel.CRITICAL if data.value > max_load else SeverityLevel.HIGH
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=data.timestamp,
+            anomaly_type=AnomalyType.OVERLOAD,
+            severity=severity,
+            description=f"Перегрузка на объекте {object_id}: {data.value:.1f} > {max_load * 0.9:.1f}",
+            status="detected",
+            affected_object_id=object_id,
+            confidence_score=0.9,
+            recommended_action="Перераспределить нагрузку или отключить второстепенных потребителей",
+            peak_value=data.value,
+            peak_unit=data.unit
+        )
+    
+    @staticmethod
+    def voltage_drop_anomaly(object_id: str, data: SensorData) -> Anomaly:
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=data.timestamp,
+            anomaly_type=AnomalyType.VOLTAGE_DROP,
+            severity=SeverityLevel.MEDIUM,
+            description=f"Падение напряжения на объекте {object_id}: {data.value:.1f} В",
+            status="detected",
+            affected_object_id=object_id,
+            confidence_score=0.75,
+            recommended_action="Проверить оборудование и стабилизаторы",
+            peak_value=data.value,
+            peak_unit=data.unit
+        )
+
+# Числовые коды типов датчиков для векторных вычислений
+SENSOR_TYPE_CODES = {sensor_type: code for code, sensor_type in enumerate(SensorType)}
+
+# Тип датчика по суффиксу идентификатора для датчиков, не внесенных в реестр
+SENSOR_SUFFIX_TYPES = {"power": SensorType.POWER, "voltage": SensorType.VOLTAGE,
+                       "current": SensorType.CURRENT, "temperature": SensorType.TEMPERATURE,
+                       "consumption": SensorType.CONSUMPTION}
+OBJECT_TYPE_CODES = {object_type: code for code, object_type in enumerate(NetworkObjectType)}
+SENSOR_TYPES_BY_CODE = list(SensorType)
+OBJECT_TYPES_BY_CODE = list(NetworkObjectType)
+
+# Срабатывание пакетной проверки: (тип аномалии, критичность, построение Anomaly).
+# Anomaly строится, только если срабатывание открывает новый инцидент.
+BatchHit = Tuple[AnomalyType, SeverityLevel, Callable[[], Anomaly]]
+
+class SensorSlots:
+    """Постоянные номера датчиков для столбцовой обработки пакетов.
+    
+    Тип датчика и тип объекта определяются один раз, при первом показании датчика;
+    пакетные потоковые детекторы хранят состояние в массивах по этим номерам.
+    """
+    SENSOR_ID = operator.attrgetter("sensor_id")
+    
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self._kinds: List[int] = []
+        self._object_types: List[int] = []
+        self.kinds = np.zeros(0, dtype=np.int8)          # код типа датчика, -1 - неизвестен
+        self.object_types = np.zeros(0, dtype=np.int8)
+    
+    def __len__(self):
+        return len(self._kinds)
+    
+    def lookup(self, data: List[SensorData], objects: List[NetworkObject],
+               kind_of: Callable[[str], Optional[SensorType]]) -> np.ndarray:
+        """Номера датчиков показаний пакета; новые датчики получают номера по порядку"""
+        slots = np.fromiter(map(self.index.get, map(self.SENSOR_ID, data), itertools.repeat(-1)),
+                            dtype=np.int64, count=len(data))
+        missing = np.flatnonzero(slots < 0)
+        if len(missing):
+            for i in missing.tolist():
+                sensor_id = data[i].sensor_id
+                slot = self.index.get(sensor_id)
+                if slot is None:
+                    slot = self.index[sensor_id] = len(self._kinds)
+                    self._kinds.append(SENSOR_TYPE_CODES.get(kind_of(sensor_id), -1))
+                    self._object_types.append(OBJECT_TYPE_CODES[objects[i].object_type])
+                slots[i] = slot
+            self.kinds = np.array(self._kinds, dtype=np.int8)
+            self.object_types = np.array(self._object_types, dtype=np.int8)
+        return slots
+
+class ReadingColumns:
+    """Пакет показаний в столбцах NumPy, собранный одним проходом без генераторов Python"""
+    VALUE = operator.attrgetter("value")
+    CAPACITY = operator.attrgetter("capacity")
+    
+    def __init__(self, data: List[SensorData], objects: List[NetworkObject], slots: SensorSlots,
+                 kind_of: Callable[[str], Optional[SensorType]]):
+        self.data = data
+        self.objects = objects
+        self.values = np.fromiter(map(self.VALUE, data), dtype=np.float64, count=len(data))
+        self.capacities = np.fromiter(map(self.CAPACITY, objects), dtype=np.float64, count=len(data))
+        self.slots = slots.lookup(data, objects, kind_of)
+        self.kinds = slots.kinds[self.slots]
+        self.object_types = slots.object_types[self.slots]
+        self._rounds: Optional[List[np.ndarray]] = None
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def rounds(self) -> List[np.ndarray]:
+        """Индексы показаний частями, в каждой датчик встречается не больше раза.
+        
+        Потоковые детекторы обрабатывают части по очереди, поэтому показания одного
+        датчика учитываются в порядке пакета, как при построчной проверке.
+        """
+        if self._rounds is None:
+            count = len(self.slots)
+            order = np.argsort(self.slots, kind="stable")
+            ordered = self.slots[order]
+            first = np.ones(count, dtype=bool)
+            first[1:] = ordered[1:] != ordered[:-1]
+            if first.all():
+                self._rounds = [np.arange(count)]
+            else:
+                positions = np.arange(count)
+                group_start = np.maximum.accumulate(np.where(first, positions, 0))
+                rank = np.empty(count, dtype=np.int64)
+                rank[order] = positions - group_start
+                self._rounds = [np.flatnonzero(rank == r) for r in range(int(rank.max()) + 1)]
+        return self._rounds
+
+class VectorizedAnomalyDetectionStrategy(IAnalysisStrategy):
+    """Правила AnomalyDetectionStrategy для целого цикла опроса за один проход NumPy.
+    
+    Если передан rule_engine, пакет проверяется по его таблице правил.
+    """
+    OVERLOAD_RATIO = 0.9
+    MIN_VOLTAGE = 210.0
+    
+    def __init__(self, rule_engine: Optional["RuleEngineAnomalyStrategy"] = None):
+        self.rule_engine = rule_engine
+        self.slots = SensorSlots()
+    
+    def columns(self, data: List[SensorData], objects: List[NetworkObject],
+                kind_of: Callable[[str], Optional[SensorType]]) -> ReadingColumns:
+        """kind_of вызывается только для датчиков, которых еще не было в пакетах"""
+        return ReadingColumns(data, objects, self.slots, kind_of)
+    
+    def detect_arrays(self, values: np.ndarray, capacities: np.ndarray,
+                      kinds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Индексы перегрузок, признак критичности для каждой из них и индексы падений напряжения"""
+        overload = values > capacities * self.OVERLOAD_RATIO
+        overload_indices = np.flatnonzero(overload)
+        critical = values[overload_indices] > capacities[overload_indices]
+        # Как и в построчной проверке, перегрузка исключает падение напряжения
+        voltage_drop = ~overload & (kinds == SENSOR_TYPE_CODES[SensorType.VOLTAGE]) & \
+            (values < self.MIN_VOLTAGE)
+        return overload_indices, critical, np.flatnonzero(voltage_drop)
+    
+    def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> List[Anomaly]:
+        """data - показания пакета; context["objects"] и context["kinds"] - объект и тип датчика для каждого"""
+        return [anomaly for index, anomaly in self.detect_batch(data, context)]
+    
+    def detect_batch(self, data: List[SensorData], context: Dict[str, Any]) -> List[Tuple[int, Anomaly]]:
+        """Как execute_analysis, но с индексом показания в пакете для каждой аномалии"""
+        if not data:
+            return []
+        kinds = dict(zip(map(SensorSlots.SENSOR_ID, data), context["kinds"]))
+        columns = self.columns(data, context["objects"], kinds.get)
+        objects = columns.objects
+        if self.rule_engine:
+            return [(index, rule.create_anomaly(objects[index].object_id, data[index], objects[index].capacity))
+                    for index, rule in self.rule_engine.match_rules(columns)]
+        return [(index, self.threshold_anomaly(columns, index, critical))
+                for index, critical in self.threshold_matches(columns)]
+    
+    def match(self, columns: ReadingColumns) -> List[Tuple[int, BatchHit]]:
+        """Срабатывания пакета по возрастанию индекса показания, без построения Anomaly"""
+        if not len(columns):
+            return []
+        if self.rule_engine:
+            return self.rule_engine.match_columns(columns)
+        return [(index, (AnomalyType.VOLTAGE_DROP if critical is None else AnomalyType.OVERLOAD,
+                         SeverityLevel.MEDIUM if critical is None else
+                         SeverityLevel.CRITICAL if critical else SeverityLevel.HIGH,
+                         partial(self.threshold_anomaly, columns, index, critical)))
+                for index, critical in self.threshold_matches(columns)]
+    
+    def threshold_matches(self, columns: ReadingColumns) -> List[Tuple[int, Optional[bool]]]:
+        """(индекс, критичность перегрузки) по возрастанию индекса; для падения напряжения - None"""
+        overload_indices, critical, voltage_indices = self.detect_arrays(
+            columns.values, columns.capacities, columns.kinds)
+        matches = list(zip(overload_indices.tolist(), critical.tolist()))
+        matches.extend(zip(voltage_indices.tolist(), itertools.repeat(None)))
+        matches.sort(key=operator.itemgetter(0))
+        return matches
+    
+    @staticmethod
+    def threshold_anomaly(columns: ReadingColumns, index: int, critical: Optional[bool]) -> Anomaly:
+        network_object = columns.objects[index]
+        if critical is None:
+            return AnomalyDetectionStrategy.voltage_drop_anomaly(network_object.object_id, columns.data[index])
+        return AnomalyDetectionStrategy.overload_anomaly(network_object.object_id, columns.data[index],
+                                                         network_object.capacity)
+
+class CompiledAnomalyRule:
+    """Правило проверки показания, приведенное к сравнению с порогом"""
+    __slots__ = ("anomaly_type", "upper", "relative", "limit", "critical_limit",
+                 "severity", "critical_severity", "confidence", "action")
+    
+    # Поля конфигурации: (ключ порога, ключ критического порога, сравнение сверху, доля мощности объекта)
+    LIMIT_KEYS = [("above_capacity", "critical_above_capacity", True, True),
+                  ("above", "critical_above", True, False),
+                  ("below", "critical_below", False, False)]
+    
+    def __init__(self, config: Dict[str, Any]):
+        for limit_key, critical_key, upper, relative in self.LIMIT_KEYS:
+            if limit_key in config:
+                break
+        else:
+            raise ValueError(f"В правиле не задан порог: {config}")
+        
+        self.anomaly_type = AnomalyType[config["anomaly_type"]]
+        self.upper = upper
+        self.relative = relative
+        self.limit = float(config[limit_key])
+        self.critical_limit = float(config[critical_key]) if critical_key in config else None
+        self.severity = SeverityLevel[config.get("severity", "MEDIUM")]
+        self.critical_severity = SeverityLevel[config.get("critical_severity", "CRITICAL")]
+        self.confidence = float(config.get("confidence", 0.8))
+        self.action = config.get("action", "Требуется анализ и принятие мер")
+    
+    def thresholds(self, capacity: float) -> Tuple[float, Optional[float]]:
+        if not self.relative:
+            return self.limit, self.critical_limit
+        critical = capacity * self.critical_limit if self.critical_limit is not None else None
+        return capacity * self.limit, critical
+    
+    def severity_for(self, value: float, capacity: float) -> SeverityLevel:
+        limit, critical_limit = self.thresholds(capacity)
+        critical = critical_limit is not None and (
+            value > critical_limit if self.upper else value < critical_limit)
+        return self.critical_severity if critical else self.severity
+    
+    def create_anomaly(self, object_id: str, data: SensorData, capacity: float) -> Anomaly:
+        limit, critical_limit = self.thresholds(capacity)
+        sign = ">" if self.upper else "<"
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=data.timestamp,
+            anomaly_type=self.anomaly_type,
+            severity=self.severity_for(data.value, capacity),
+            description=f"{self.anomaly_type.value} на объекте {object_id}: "
+                        f"{data.value:.1f} {sign} {limit:.1f} {data.unit}".rstrip(),
+            status="detected",
+            affected_object_id=object_id,
+            confidence_score=self.confidence,
+            recommended_action=self.action,
+            peak_value=data.value,
+            peak_unit=data.unit
+        )
+
+class RuleEngineAnomalyStrategy(IAnalysisStrategy):
+    """Пороговые правила по типу датчика и типу объекта из файла конфигурации.
+    
+    Правила компилируются в таблицу (тип датчика, тип объекта) -> правила, поэтому
+    проверка показания - один поиск в словаре и несколько сравнений. Файл
+    перечитывается при изменении mtime, не чаще reload_interval секунд.
+    """
+    DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "anomaly_rules.json")
+    
+    def __init__(self, rules_path: Optional[str] = None, reload_interval: float = 5.0):
+        self.rules_path = rules_path or self.DEFAULT_RULES_PATH
+        self.reload_interval = reload_interval
+        self.table: Dict[Tuple[SensorType, NetworkObjectType], Tuple[CompiledAnomalyRule, ...]] = {}
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.reload()
+    
+    @staticmethod
+    def compile_rules(configs: List[Dict[str, Any]]
+                      ) -> Dict[Tuple[SensorType, NetworkObjectType], Tuple[CompiledAnomalyRule, ...]]:
+        """Правила для конкретного типа объекта проверяются раньше общих"""
+        specific, general = {}, {}
+        for config in configs:
+            rule = CompiledAnomalyRule(config)
+            sensor_type = SensorType[config["sensor_type"]]
+            if config.get("object_type"):
+                key = (sensor_type, NetworkObjectType[config["object_type"]])
+                specific.setdefault(key, []).append(rule)
+            else:
+                general.setdefault(sensor_type, []).append(rule)
+        
+        table = {}
+        for sensor_type in SensorType:
+            for object_type in NetworkObjectType:
+                rules = specific.get((sensor_type, object_type), []) + general.get(sensor_type, [])
+                if rules:
+                    table[(sensor_type, object_type)] = tuple(rules)
+        return table
+    
+    def reload(self) -> bool:
+        """Перечитать файл правил, если он изменился; при ошибке остаются прежние правила"""
+        try:
+            mtime = os.stat(self.rules_path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
         
+        try:
+            with open(self.rules_path, encoding="utf-8") as f:
+                self.table = self.compile_rules(json.load(f)["rules"])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ошибка в файле правил {self.rules_path}: {e}")
+            return False
+        finally:
+            self._mtime = mtime
+        return True
+    
+    def _check_reload(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+    
+    def evaluate(self, data: SensorData, sensor_type: Optional[SensorType],
+                 network_object: NetworkObject) -> Optional[Anomaly]:
+        self._check_reload()
+        rules = self.table.get((sensor_type, network_object.object_type))
+        if not rules:
+            return None
+        
+        value = data.value
+        capacity = network_object.capacity
+        for rule in rules:
+            limit = capacity * rule.limit if rule.relative else rule.limit
+            if (value > limit) if rule.upper else (value < limit):
+                return rule.create_anomaly(network_object.object_id, data, capacity)
         return None
+    
+    def match_columns(self, columns: "ReadingColumns") -> List[Tuple[int, BatchHit]]:
+        """(индекс показания в пакете, срабатывание) по возрастанию индекса, без построения Anomaly"""
+        objects, values, capacities = columns.objects, columns.values, columns.capacities
+        return [(index, (rule.anomaly_type, rule.severity_for(values[index], capacities[index]),
+                         partial(rule.create_anomaly, objects[index].object_id, columns.data[index],
+                                 objects[index].capacity)))
+                for index, rule in self.match_rules(columns)]
+    
+    def match_rules(self, columns: "ReadingColumns") -> List[Tuple[int, CompiledAnomalyRule]]:
+        """Те же правила для пакета: показания группируются по ключу таблицы и сравниваются массивами.
+        
+        Возвращает (индекс показания в пакете, сработавшее правило) по возрастанию индекса.
+        """
+        self._check_reload()
+        if not len(columns):
+            return []
+        
+        # Ключ таблицы кодируется одним числом, группы ищутся на массивах
+        groups = columns.kinds.astype(np.int64) * len(OBJECT_TYPE_CODES) + columns.object_types
+        groups[columns.kinds < 0] = -1
+        values, capacities = columns.values, columns.capacities
+        matches = []
+        for group in np.unique(groups).tolist():
+            if group < 0:
+                continue
+            rules = self.table.get((SENSOR_TYPES_BY_CODE[group // len(OBJECT_TYPE_CODES)],
+                                    OBJECT_TYPES_BY_CODE[group % len(OBJECT_TYPE_CODES)]))
+            if not rules:
+                continue
+            remaining = np.flatnonzero(groups == group)
+            for rule in rules:
+                limits = capacities[remaining] * rule.limit if rule.relative else rule.limit
+                hit = values[remaining] > limits if rule.upper else values[remaining] < limits
+                matches.extend((index, rule) for index in remaining[hit].tolist())
+                remaining = remaining[~hit]
+                if not len(remaining):
+                    break
+        
+        matches.sort(key=operator.itemgetter(0))
+        return matches
+    
+    def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> Optional[Anomaly]:
+        """context["network_object"] - объект показания, context["sensor_type"] - тип датчика"""
+        if not data:
+            return None
+        return self.evaluate(data[-1], context.get("sensor_type"), context["network_object"])
+
+class EwmaState:
+    """Экспоненциально сглаженные среднее и дисперсия одного датчика"""
+    __slots__ = ("count", "mean", "variance")
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+    
+    def update(self, value: float, alpha: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            self.mean += alpha * diff
+            self.variance = (1 - alpha) * (self.variance + alpha * diff * diff)
+        self.count += 1
+
+class EwmaColumns:
+    """Состояния EwmaState всех датчиков в массивах по номерам SensorSlots"""
+    
+    def __init__(self):
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.variance = np.zeros(0)
+    
+    def grow(self, size: int):
+        if size > len(self.count):
+            extra = size - len(self.count)
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.variance = np.concatenate([self.variance, np.zeros(extra)])
+    
+    def update(self, slots: np.ndarray, values: np.ndarray, alpha: float):
+        """EwmaState.update для датчиков slots (без повторов) в том же порядке операций"""
+        mean = self.mean[slots]
+        diff = values - mean
+        first = self.count[slots] == 0
+        self.mean[slots] = np.where(first, values, mean + alpha * diff)
+        self.variance[slots] = np.where(first, self.variance[slots],
+                                        (1 - alpha) * (self.variance[slots] + alpha * diff * diff))
+        self.count[slots] += 1
+
+class EwmaAnomalyStrategy(IAnalysisStrategy):
+    """Необычное потребление: отклонение показания от EWMA-среднего больше threshold сигм.
+    
+    Построчная проверка (execute_analysis) и пакетная (detect_columns) ведут отдельные состояния.
+    """
+    SENSOR_TYPES = (SensorType.POWER, SensorType.CONSUMPTION)
+    
+    # При пороге 4 сигмы и разгоне 30 показаний блуждающая нагрузка давала ложные срабатывания;
+    # 5 сигм после 120 показаний (10 минут при опросе раз в 5 с) на обычной работе сети молчат
+    def __init__(self, alpha: float = 0.05, threshold: float = 5.0, warmup: int = 120):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.states: Dict[str, EwmaState] = {}
+        self.batch_state = EwmaColumns()
+        self._codes = [SENSOR_TYPE_CODES[sensor_type] for sensor_type in self.SENSOR_TYPES]
+    
+    def severity(self, z_score: float) -> SeverityLevel:
+        return SeverityLevel.MEDIUM if abs(z_score) > 2 * self.threshold else SeverityLevel.LOW
+    
+    def create_anomaly(self, object_id: str, data: SensorData, mean: float, z_score: float) -> Anomaly:
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=data.timestamp,
+            anomaly_type=AnomalyType.UNUSUAL_CONSUMPTION,
+            severity=self.severity(z_score),
+            description=f"Необычное потребление на объекте {object_id}: {data.value:.1f} "
+                        f"при среднем {mean:.1f} (z = {z_score:.1f})",
+            status="detected",
+            affected_object_id=object_id,
+            confidence_score=min(0.95, 0.5 + abs(z_score) / (4 * self.threshold)),
+            recommended_action="Проверить режим работы потребителей объекта",
+            peak_value=data.value,
+            peak_unit=data.unit
+        )
+    
+    def detect_columns(self, columns: ReadingColumns) -> List[Tuple[int, BatchHit]]:
+        """Пакетная проверка: состояния датчиков обновляются массивами, по частям ReadingColumns.rounds"""
+        eligible = np.isin(columns.kinds, self._codes)
+        if not eligible.any():
+            return []
+        state = self.batch_state
+        state.grow(len(columns.slots) and int(columns.slots.max()) + 1)
+        hits = []
+        for indices in columns.rounds():
+            indices = indices[eligible[indices]]
+            if not len(indices):
+                continue
+            slots = columns.slots[indices]
+            values = columns.values[indices]
+            mean = state.mean[slots]
+            deviation = np.sqrt(state.variance[slots])
+            ready = (state.count[slots] >= self.warmup) & (deviation > 0)
+            z_scores = np.zeros(len(indices))
+            z_scores[ready] = (values[ready] - mean[ready]) / deviation[ready]
+            for position in np.flatnonzero(ready & (np.abs(z_scores) > self.threshold)).tolist():
+                index = int(indices[position])
+                z_score = float(z_scores[position])
+                hits.append((index, (AnomalyType.UNUSUAL_CONSUMPTION, self.severity(z_score),
+                                     partial(self.create_anomaly, columns.objects[index].object_id,
+                                             columns.data[index], float(mean[position]), z_score))))
+            state.update(slots, values, self.alpha)
+        hits.sort(key=operator.itemgetter(0))
+        return hits
+    
+    def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> Optional[Anomaly]:
+        if not data or context.get("sensor_type") not in self.SENSOR_TYPES:
+            return None
+        
+        latest_data = data[-1]
+        state = self.states.get(latest_data.sensor_id)
+        if state is None:
+            state = self.states[latest_data.sensor_id] = EwmaState()
+        
+        # Оценка по состоянию до учета нового показания
+        anomaly = None
+        deviation = math.sqrt(state.variance)
+        if state.count >= self.warmup and deviation > 0:
+            z_score = (latest_data.value - state.mean) / deviation
+            if abs(z_score) > self.threshold:
+                anomaly = self.create_anomaly(context.get("object_id", ""), latest_data, state.mean, z_score)
+        
+        state.update(latest_data.value, self.alpha)
+        return anomaly
+
+class CusumState:
+    """Накопленные суммы CUSUM вверх/вниз и медленная оценка нормального уровня"""
+    __slots__ = ("baseline", "positive", "negative")
+    
+    def __init__(self):
+        self.baseline = EwmaState()
+        self.positive = 0.0
+        self.negative = 0.0
+
+class CusumColumns(EwmaColumns):
+    """Состояния CusumState в массивах: базовый уровень и накопленные суммы"""
+    
+    def __init__(self):
+        super().__init__()
+        self.positive = np.zeros(0)
+        self.negative = np.zeros(0)
+    
+    def grow(self, size: int):
+        if size > len(self.positive):
+            extra = size - len(self.positive)
+            self.positive = np.concatenate([self.positive, np.zeros(extra)])
+            self.negative = np.concatenate([self.negative, np.zeros(extra)])
+        super().grow(size)
+
+class CusumAnomalyStrategy(IAnalysisStrategy):
+    """Устойчивый дрейф показаний (CUSUM относительно медленного EWMA-уровня).
+    
+    Построчная проверка (execute_analysis) и пакетная (detect_columns) ведут отдельные состояния.
+    """
+    # Тип аномалии при дрейфе вверх и вниз для каждого типа датчика. Мощность и потребление
+    # не проверяются: нагрузка меняется постоянно, и CUSUM принимал это за дрейф; резкие
+    # скачки нагрузки ловит EwmaAnomalyStrategy
+    DRIFT_TYPES = {
+        SensorType.VOLTAGE: (None, AnomalyType.VOLTAGE_DROP),
+        SensorType.CURRENT: (AnomalyType.UNUSUAL_CONSUMPTION, None),
+        SensorType.TEMPERATURE: (AnomalyType.EQUIPMENT_FAILURE, None)
+    }
+    
+    def __init__(self, alpha: float = 0.01, slack: float = 1.0, threshold: float = 12.0,
+                 warmup: int = 360):
+        self.alpha = alpha
+        self.slack = slack          # допуск k в сигмах
+        self.threshold = threshold  # порог h в сигмах
+        self.warmup = warmup
+        self.states: Dict[str, CusumState] = {}
+        self.batch_state = CusumColumns()
+        # Типы аномалий по коду типа датчика (индекс SENSOR_TYPE_CODES)
+        self._drift_by_code = [self.DRIFT_TYPES.get(sensor_type) for sensor_type in SENSOR_TYPES_BY_CODE]
+        self._codes = [SENSOR_TYPE_CODES[sensor_type] for sensor_type in self.DRIFT_TYPES]
+    
+    def create_anomaly(self, object_id: str, data: SensorData, anomaly_type: AnomalyType,
+                       direction: str, baseline_mean: float) -> Anomaly:
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=data.timestamp,
+            anomaly_type=anomaly_type,
+            severity=SeverityLevel.MEDIUM,
+            description=f"Устойчивый дрейф показаний {data.sensor_id} {direction}: "
+                        f"{data.value:.1f} при норме {baseline_mean:.1f}",
+            status="detected",
+            affected_object_id=object_id,
+            confidence_score=0.7,
+            recommended_action="Проверить оборудование и режим нагрузки объекта",
+            peak_value=data.value,
+            peak_unit=data.unit
+        )
+    
+    def detect_columns(self, columns: ReadingColumns) -> List[Tuple[int, BatchHit]]:
+        """Пакетная проверка: суммы и базовый уровень обновляются массивами, по частям ReadingColumns.rounds"""
+        eligible = np.isin(columns.kinds, self._codes)
+        if not eligible.any():
+            return []
+        state = self.batch_state
+        state.grow(len(columns.slots) and int(columns.slots.max()) + 1)
+        hits = []
+        for indices in columns.rounds():
+            indices = indices[eligible[indices]]
+            if not len(indices):
+                continue
+            slots = columns.slots[indices]
+            values = columns.values[indices]
+            mean = state.mean[slots]
+            deviation = np.sqrt(state.variance[slots])
+            ready = (state.count[slots] >= self.warmup) & (deviation > 0)
+            if ready.any():
+                ready_slots = slots[ready]
+                normalized = (values[ready] - mean[ready]) / deviation[ready]
+                positive = np.maximum(0.0, state.positive[ready_slots] + normalized - self.slack)
+                negative = np.maximum(0.0, state.negative[ready_slots] - normalized - self.slack)
+                up = positive > self.threshold
+                down = ~up & (negative > self.threshold)
+                fired = up | down
+                positive[fired] = negative[fired] = 0.0
+                state.positive[ready_slots] = positive
+                state.negative[ready_slots] = negative
+                
+                ready_positions = np.flatnonzero(ready)
+                for position, is_up in zip(ready_positions[fired].tolist(), up[fired].tolist()):
+                    index = int(indices[position])
+                    anomaly_type = self._drift_by_code[columns.kinds[index]][0 if is_up else 1]
+                    if anomaly_type:
+                        hits.append((index, (anomaly_type, SeverityLevel.MEDIUM, partial(
+                            self.create_anomaly, columns.objects[index].object_id, columns.data[index],
+                            anomaly_type, "вверх" if is_up else "вниз", float(mean[position])))))
+            state.update(slots, values, self.alpha)
+        hits.sort(key=operator.itemgetter(0))
+        return hits
+    
+    def execute_analysis(self, data: List[SensorData], context: Dict[str, Any]) -> Optional[Anomaly]:
+        drift_types = self.DRIFT_TYPES.get(context.get("sensor_type"))
+        if not data or drift_types is None:
+            return None
+        
+        latest_data = data[-1]
+        state = self.states.get(latest_data.sensor_id)
+        if state is None:
+            state = self.states[latest_data.sensor_id] = CusumState()
+        
+        baseline = state.baseline
+        deviation = math.sqrt(baseline.variance)
+        anomaly = None
+        if baseline.count >= self.warmup and deviation > 0:
+            normalized = (latest_data.value - baseline.mean) / deviation
+            state.positive = max(0.0, state.positive + normalized - self.slack)
+            state.negative = max(0.0, state.negative - normalized - self.slack)
+            
+            direction = None
+            if state.positive > self.threshold:
+                direction, anomaly_type = "вверх", drift_types[0]
+            elif state.negative > self.threshold:
+                direction, anomaly_type = "вниз", drift_types[1]
+            
+            if direction:
+                state.positive = state.negative = 0.0
+                if anomaly_type:
+                    anomaly = self.create_anomaly(context.get("object_id", ""), latest_data, anomaly_type,
+                                                  direction, baseline.mean)
+        
+        baseline.update(latest_data.value, self.alpha)
+        return anomaly
+
+class DetectionShard:
+    """Состояние обнаружения аномалий для части датчиков: таблица правил и потоковые детекторы"""
+    def __init__(self, rules_path: Optional[str] = None):
+        self.rule_engine = RuleEngineAnomalyStrategy(rules_path)
+        self.streaming_detectors: List[IAnalysisStrategy] = [
+            EwmaAnomalyStrategy(),
+            CusumAnomalyStrategy()
+        ]
+        self.objects: Dict[str, NetworkObject] = {}
+    
+    def _object(self, object_id: str, object_type: NetworkObjectType, capacity: float) -> NetworkObject:
+        network_object = self.objects.get(object_id)
+        if network_object is None:
+            network_object = self.objects[object_id] = NetworkObject(
+                object_id=object_id, name=object_id, object_type=object_type,
+                status="operational", location="", capacity=capacity)
+        else:
+            network_object.object_type = object_type
+            network_object.capacity = capacity
+        return network_object
+    
+    def detect(self, rows: List[tuple], active: bool = True) -> List[Tuple[int, Anomaly]]:
+        """rows - строки ShardedDetectionPool.to_row; возвращает (индекс в пакете, аномалия)"""
+        found = []
+        for (index, data_id, sensor_id, timestamp, value, unit,
+             object_id, object_type, capacity, sensor_type) in rows:
+            if not active:
+                continue
+            
+            data = SensorData(data_id, sensor_id, timestamp, value, unit)
+            network_object = self._object(object_id, object_type, capacity)
+            anomaly = self.rule_engine.evaluate(data, sensor_type, network_object)
+            context = {
+                "object_id": object_id,
+                "object_type": object_type.value,
+                "sensor_type": sensor_type,
+                "network_object": network_object
+            }
+            for detector in self.streaming_detectors:
+                detected = detector.execute_analysis([data], context)
+                anomaly = anomaly or detected
+            if anomaly:
+                found.append((index, anomaly))
+        return found
+
+def _detection_worker(connection, rules_path: Optional[str]):
+    shard = DetectionShard(rules_path)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        active, rows = message
+        connection.send(shard.detect(rows, active))
+    connection.close()
+
+class ShardedDetectionPool:
+    """Обнаружение аномалий в нескольких процессах.
+    
+    Датчики распределяются по network_object_id, поэтому все показания объекта
+    попадают в один процесс и его потоковые детекторы остаются согласованными.
+    Результаты возвращаются в порядке показаний пакета.
+    """
+    def __init__(self, worker_count: int, rules_path: Optional[str] = None):
+        self.worker_count = worker_count
+        self._shards: Dict[str, int] = {}
+        self._connections = []
+        self._processes = []
+        for _ in range(worker_count):
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_detection_worker, args=(child_end, rules_path),
+                                              daemon=True)
+            process.start()
+            child_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+    
+    def shard_for(self, object_id: str) -> int:
+        shard = self._shards.get(object_id)
+        if shard is None:
+            # crc32 вместо hash(): hash строк меняется между запусками
+            shard = self._shards[object_id] = zlib.crc32(object_id.encode()) % self.worker_count
+        return shard
+    
+    @staticmethod
+    def to_row(index: int, data: SensorData, network_object: NetworkObject,
+               sensor_type: Optional[SensorType]) -> tuple:
+        # Кортеж сериализуется заметно быстрее объектов dataclass
+        return (index, data.data_id, data.sensor_id, data.timestamp, data.value, data.unit,
+                network_object.object_id, network_object.object_type, network_object.capacity,
+                sensor_type)
+    
+    def detect(self, readings: List[Tuple[SensorData, NetworkObject, Optional[SensorType]]],
+               active: bool = True) -> List[Anomaly]:
+        shards = [[] for _ in range(self.worker_count)]
+        for index, (data, network_object, sensor_type) in enumerate(readings):
+            shards[self.shard_for(network_object.object_id)].append(
+                self.to_row(index, data, network_object, sensor_type))
+        
+        # Сначала раздаем все части, затем собираем - процессы работают параллельно
+        busy = []
+        for connection, rows in zip(self._connections, shards):
+            if rows:
+                connection.send((active, rows))
+                busy.append(connection)
+        found = []
+        for connection in busy:
+            found.extend(connection.recv())
+        
+        found.sort(key=lambda item: item[0])
+        return [anomaly for index, anomaly in found]
+    
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
 
 class SwitchFeederCommand(ICommand):
-    def __init__(self, repository: InMemoryDataRepository, feeder_id: str, 
+    def __init__(self, repository: IDataRepository, feeder_id: str, 
                  new_state: str, operator: str):
         self.repository = repository
         self.feeder_id = feeder_id
@@ -179,6 +3019,7 @@ class SwitchFeederCommand(ICommand):
         if self.feeder:
             self.old_state = self.feeder.status
             self.feeder.status = self.new_state
+            self.repository.save_network_object(self.feeder)
             print(f"Команда выполнена: {self.feeder_id} -> {self.new_state}")
             return True
         return False
@@ -186,6 +3027,7 @@ class SwitchFeederCommand(ICommand):
     def undo(self):
         if self.feeder and self.old_state:
             self.feeder.status = self.old_state
+            self.repository.save_network_object(self.feeder)
             print(f"Команда отменена: {self.feeder_id} -> {self.old_state}")
 
 class GuiAlertService(IAlertService):
@@ -5,6 +5,11 @@ class IDataRepository(abc.ABC):
     def store_sensor_data(self, data: SensorData):
         pass
     
+    def store_sensor_data_batch(self, data: List[SensorData]):
+        # Реализации переопределяют метод, чтобы сохранять пакет одной операцией
+        for item in data:
+            self.store_sensor_data(item)
+    
     @abc.abstractmethod
     def get_sensor_data(self, sensor_id: str, start_time: datetime.datetime, 
                        end_time: datetime.datetime) -> List[SensorData]:
@@ -18,10 +23,67 @@ class IDataRepository(abc.ABC):
     def get_active_anomalies(self) -> List[Anomaly]:
         pass
     
+    @abc.abstractmethod
+    def get_anomalies_between(self, start_time: datetime.datetime,
+                              end_time: datetime.datetime) -> List[Anomaly]:
+        pass
+    
+    def iter_anomalies_between(self, start_time: datetime.datetime,
+                               end_time: datetime.datetime) -> Iterator[Anomaly]:
+        # Реализации переопределяют метод, чтобы не загружать весь диапазон в память
+        return iter(self.get_anomalies_between(start_time, end_time))
+    
+    @abc.abstractmethod
+    def get_reports(self) -> List[Report]:
+        pass
+    
+    def iter_reports(self) -> Iterator[Report]:
+        # Реализации переопределяют метод, чтобы не загружать все отчеты в память
+        return iter(self.get_reports())
+    
     @abc.abstractmethod
     def get_historical_data(self, start_time: datetime.datetime, 
                           end_time: datetime.datetime) -> List[SensorData]:
         pass
+    
+    def iter_historical_data(self, start_time: datetime.datetime,
+                             end_time: datetime.datetime) -> Iterator[SensorData]:
+        # Реализации переопределяют метод, чтобы не загружать весь диапазон в память
+        return iter(self.get_historical_data(start_time, end_time))
+    
+    @abc.abstractmethod
+    def get_sensor_totals(self, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> List[Tuple[str, "AggregateBucket"]]:
+        """Количество, сумма, минимум и максимум показаний диапазона по каждому датчику"""
+    
+    @abc.abstractmethod
+    def get_rollups(self, period: str, start_time: datetime.datetime, end_time: datetime.datetime,
+                    object_id: Optional[str] = None, sensor_type: Optional[SensorType] = None
+                    ) -> List[Tuple[str, Optional[SensorType], "AggregateBucket"]]:
+        """Часовые или суточные агрегаты по объектам и типам датчиков"""
+    
+    def add_status_listener(self, listener: Callable[[str, str], None]):
+        """listener(anomaly_id, status) вызывается после каждой смены статуса через update_anomaly_status"""
+        self.status_listeners.append(listener)
+    
+    def _notify_status(self, anomaly_id: str, status: str):
+        for listener in self.status_listeners:
+            listener(anomaly_id, status)
+    
+    # Кэш отчетов за закрытые периоды; по умолчанию репозиторий ничего не кэширует
+    def get_cached_report(self, report_type: str, start_time: datetime.datetime,
+                          end_time: datetime.datetime) -> Optional[Tuple[str, str]]:
+        return None
+    
+    def begin_cached_report(self, report_type: str, start_time: datetime.datetime,
+                            end_time: datetime.datetime) -> int:
+        return 0
+    
+    def store_cached_report(self, build: int, title: str, content: str):
+        pass
+    
+    def discard_cached_report(self, build: int):
+        pass
 
 class IAnalysisStrategy(abc.ABC):
     @abc.abstractmethod
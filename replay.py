@@ -0,0 +1,291 @@
+from controllers import *
+from simulation import GridSimulation
+import argparse
+import csv
+from collections import Counter
+
+# Воспроизведение записанной истории показаний через контроллеры мониторинга и прогнозов
+# с модельными часами вместо datetime.now(), с максимальной скоростью.
+# Запись истории:   python replay.py record history.csv --substations 5 --hours 720
+# Воспроизведение:  python replay.py run history.csv
+#                   python replay.py run smartgrid.db
+
+CSV_FIELDS = ["data_id", "timestamp", "sensor_id", "value", "unit"]
+
+def objects_path(history_path: str) -> str:
+    """Файл с объектами сети, записанный рядом с историей показаний"""
+    return history_path + ".objects.json"
+
+def write_csv_history(path: str, readings: Iterable[SensorData],
+                      network_objects: Iterable[NetworkObject]) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for data in readings:
+            writer.writerow([data.data_id, data.timestamp.isoformat(sep=" "), data.sensor_id,
+                             repr(data.value), data.unit])
+            count += 1
+    
+    with open(objects_path(path), "w", encoding="utf-8") as f:
+        json.dump([{"kind": kind, "payload": payload}
+                   for kind, payload in map(network_object_to_json, network_objects)],
+                  f, ensure_ascii=False, indent=1)
+    return count
+
+def read_csv_history(path: str) -> Iterator[SensorData]:
+    """Показания по одному, в порядке записи (ожидается порядок по времени)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            timestamp = datetime.datetime.fromisoformat(row["timestamp"])
+            yield SensorData(
+                data_id=row.get("data_id") or f"{row['sensor_id']}:{row['timestamp']}",
+                sensor_id=row["sensor_id"],
+                timestamp=timestamp,
+                value=float(row["value"]),
+                unit=row.get("unit", "")
+            )
+
+def read_csv_objects(path: str) -> List[NetworkObject]:
+    if not os.path.exists(objects_path(path)):
+        return []
+    with open(objects_path(path), encoding="utf-8") as f:
+        return [network_object_from_json(item["kind"], item["payload"]) for item in json.load(f)]
+
+def read_sqlite_history(db_path: str) -> Tuple[List[NetworkObject], List[Sensor], Iterator[SensorData]]:
+    """Объекты, датчики и курсор показаний из базы SqliteDataRepository"""
+    connection = sqlite3.connect(db_path)
+    network_objects = [network_object_from_json(kind, payload) for kind, payload in
+                       connection.execute("SELECT kind, payload FROM network_objects ORDER BY rowid")]
+    sensors = [Sensor(sensor_id=row[0], sensor_type=SensorType[row[1]],
+                      network_object_id=row[2], status=row[3]) for row in
+               connection.execute("SELECT sensor_id, sensor_type, network_object_id, status FROM sensors")]
+    
+    def readings():
+        try:
+            for row in connection.execute(
+                    "SELECT data_id, sensor_id, timestamp, value, unit FROM sensor_data ORDER BY timestamp"):
+                yield SensorData(data_id=row[0], sensor_id=row[1],
+                                 timestamp=datetime.datetime.fromisoformat(row[2]),
+                                 value=row[3], unit=row[4])
+        finally:
+            connection.close()
+    
+    return network_objects, sensors, readings()
+
+class ReplayClock:
+    """Модельные часы: время последнего воспроизведенного цикла опроса"""
+    def __init__(self, start: Optional[datetime.datetime] = None):
+        self.now = start or datetime.datetime.now()
+    
+    def __call__(self) -> datetime.datetime:
+        return self.now
+
+@dataclass
+class ReplayStats:
+    readings: int = 0
+    skipped: int = 0                 # показания датчиков неизвестных объектов
+    anomalies: int = 0
+    forecasts: int = 0
+    wall_seconds: float = 0.0
+    first_timestamp: Optional[datetime.datetime] = None
+    last_timestamp: Optional[datetime.datetime] = None
+    
+    @property
+    def simulated_seconds(self) -> float:
+        if self.first_timestamp is None:
+            return 0.0
+        return (self.last_timestamp - self.first_timestamp).total_seconds()
+    
+    @property
+    def readings_per_second(self) -> float:
+        return self.readings / self.wall_seconds if self.wall_seconds else 0.0
+    
+    @property
+    def speedup(self) -> float:
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+class BacktestHarness:
+    """Прогон истории через NetworkMonitorController и ForecastController.
+    
+    Показания с одинаковой меткой времени обрабатываются одним пакетом. Каждые
+    forecast_interval модельного времени по всем объектам строится прогноз; точность
+    прогнозов считает ForecastController по мере поступления показаний мощности.
+    seasonal - HoltWintersForecastStrategy для всех объектов сразу, иначе LoadForecastStrategy.
+    forecast_interval=None - только обнаружение аномалий.
+    """
+    COMPACTION_INTERVAL = datetime.timedelta(hours=1)
+    
+    def __init__(self, network_objects: Iterable[NetworkObject], sensors: Iterable[Sensor] = (),
+                 rules_path: Optional[str] = None, vectorized: bool = False,
+                 forecast_interval: Optional[datetime.timedelta] = datetime.timedelta(hours=1),
+                 seasonal: bool = True):
+        # Уплотнение без фонового потока: хранилище без блокировок, compact() вызывается
+        # в шаге прогноза или, без прогнозов, раз в COMPACTION_INTERVAL модельного времени
+        self.repository = InMemoryDataRepository(retention=RetentionPolicy(compaction_interval=0),
+                                                 thread_safe=False)
+        for obj in network_objects:
+            self.repository.save_network_object(obj)
+        for sensor in sensors:
+            self.repository.register_sensor(sensor)
+        
+        self.clock = ReplayClock()
+        self.monitor = NetworkMonitorController(self.repository, vectorized=vectorized,
+                                                rules_path=rules_path)
+        self.monitor.start_monitoring()
+        self.forecast_controller = ForecastController(self.repository, clock=self.clock)
+        self.forecast_interval = forecast_interval
+        self.seasonal = seasonal
+        self.stats = ReplayStats()
+        
+        self._objects_by_sensor: Dict[str, Optional[NetworkObject]] = {}
+        self._next_forecast: Optional[datetime.datetime] = None
+        self._next_compaction: Optional[datetime.datetime] = None
+        self._power_objects: Dict[str, None] = {}  # объекты с показаниями мощности, в порядке появления
+    
+    def object_for(self, sensor_id: str) -> Optional[NetworkObject]:
+        if sensor_id not in self._objects_by_sensor:
+            sensor = self.repository.get_sensor(sensor_id)
+            object_id = sensor.network_object_id if sensor else sensor_id.rsplit("_", 1)[0]
+            self._objects_by_sensor[sensor_id] = self.repository.get_network_object(object_id)
+        return self._objects_by_sensor[sensor_id]
+    
+    def run(self, readings: Iterable[SensorData]) -> ReplayStats:
+        started = time.perf_counter()
+        batch = []
+        batch_time = None
+        for data in readings:
+            if data.timestamp != batch_time:
+                if batch:
+                    self._process_batch(batch)
+                batch = []
+                batch_time = data.timestamp
+            
+            network_object = self.object_for(data.sensor_id)
+            if network_object is None:
+                self.stats.skipped += 1
+                continue
+            batch.append((data, network_object))
+        
+        if batch:
+            self._process_batch(batch)
+        self.stats.wall_seconds += time.perf_counter() - started
+        return self.stats
+    
+    def _process_batch(self, batch: List[Tuple[SensorData, NetworkObject]]):
+        timestamp = batch[0][0].timestamp
+        self.clock.now = timestamp
+        if self.stats.first_timestamp is None:
+            self.stats.first_timestamp = timestamp
+            if self.forecast_interval:
+                self._next_forecast = timestamp + self.forecast_interval
+        elif self._next_forecast and timestamp >= self._next_forecast:
+            # Прогноз строится по истории до начала интервала
+            self._forecast_step()
+            while self._next_forecast <= timestamp:
+                self._next_forecast += self.forecast_interval
+        self.stats.last_timestamp = timestamp
+        if not self.forecast_interval:
+            if self._next_compaction is None:
+                self._next_compaction = timestamp + self.COMPACTION_INTERVAL
+            elif timestamp >= self._next_compaction:
+                self.repository.compact(timestamp)
+                self._next_compaction = timestamp + self.COMPACTION_INTERVAL
+        
+        self.stats.anomalies += len(self.monitor.process_sensor_batch(batch))
+        self.forecast_controller.observe_readings(batch)
+        self.stats.readings += len(batch)
+        
+        for data, network_object in batch:
+            if network_object.object_id not in self._power_objects and \
+                    self.monitor.get_sensor_type(data.sensor_id) == SensorType.POWER:
+                self._power_objects[network_object.object_id] = None
+    
+    def _forecast_step(self):
+        self.repository.compact(self.clock.now)
+        # Прогнозы только для объектов, по которым в истории есть мощность
+        object_ids = list(self._power_objects)
+        if self.seasonal:
+            forecasts = self.forecast_controller.create_grid_forecasts(object_ids)
+        else:
+            forecasts = [self.forecast_controller.create_load_forecast(object_id)
+                         for object_id in object_ids]
+        self.stats.forecasts += len(forecasts)
+
+def record(args):
+    repository = InMemoryDataRepository(thread_safe=False)
+    start_time = datetime.datetime.now().replace(minute=0, second=0, microsecond=0) - \
+        datetime.timedelta(hours=args.hours)
+    simulation = GridSimulation(repository, seed=args.seed, tick_interval=args.tick_interval,
+                                start_time=start_time)
+    simulation.build_grid(args.substations, args.feeders, args.renewables)
+    
+    ticks = int(args.hours * 3600 / args.tick_interval)
+    
+    def readings():
+        for tick in range(ticks):
+            timestamp = start_time + datetime.timedelta(seconds=tick * args.tick_interval)
+            for data, obj in simulation.generate_readings(timestamp):
+                yield data
+    
+    count = write_csv_history(args.history, readings(), repository.get_all_network_objects())
+    print(f"Записано показаний: {count} ({args.hours} ч модельного времени) в {args.history}")
+
+def run(args):
+    if args.history.endswith(".db"):
+        network_objects, sensors, readings = read_sqlite_history(args.history)
+    else:
+        network_objects, sensors = read_csv_objects(args.history), []
+        readings = read_csv_history(args.history)
+    
+    harness = BacktestHarness(network_objects, sensors, rules_path=args.rules,
+                              vectorized=args.vectorized,
+                              forecast_interval=datetime.timedelta(minutes=args.forecast_interval)
+                              if args.forecast_interval else None,
+                              seasonal=not args.simple_forecast)
+    stats = harness.run(readings)
+    
+    print(f"Показаний: {stats.readings} (пропущено: {stats.skipped}), "
+          f"модельное время: {stats.simulated_seconds / 3600:.1f} ч")
+    print(f"Время: {stats.wall_seconds:.2f} с, {stats.readings_per_second:,.0f} показаний/с, "
+          f"ускорение x{stats.speedup:,.0f}")
+    print(f"Инцидентов: {stats.anomalies}")
+    for anomaly_type, count in Counter(
+            a.anomaly_type.value for a in harness.repository.get_all_anomalies()).most_common():
+        print(f"  {anomaly_type}: {count}")
+    print(f"Прогнозов: {stats.forecasts}")
+    for period in ForecastController.PERIOD_LENGTHS:
+        accuracy = harness.forecast_controller.get_forecast_accuracy(period=period)
+        if accuracy:
+            print(f"  {period}: оценено {accuracy.count}, MAE: {accuracy.mae:.1f}, "
+                  f"MAPE: {accuracy.mape:.1f}%, смещение: {accuracy.bias:+.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение истории показаний")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    record_parser = commands.add_parser("record", help="записать историю имитации в CSV")
+    record_parser.add_argument("history")
+    record_parser.add_argument("--substations", type=int, default=5)
+    record_parser.add_argument("--feeders", type=int, default=4, help="фидеров на подстанцию")
+    record_parser.add_argument("--renewables", type=int, default=1, help="источников на подстанцию")
+    record_parser.add_argument("--hours", type=float, default=24.0, help="длительность истории")
+    record_parser.add_argument("--tick-interval", type=float, default=5.0, help="шаг опроса, сек")
+    record_parser.add_argument("--seed", type=int, default=None)
+    record_parser.set_defaults(handler=record)
+    
+    run_parser = commands.add_parser("run", help="воспроизвести историю из CSV или базы .db")
+    run_parser.add_argument("history")
+    run_parser.add_argument("--rules", default=None, help="файл правил аномалий")
+    run_parser.add_argument("--forecast-interval", type=float, default=60.0,
+                            help="шаг прогнозов, мин модельного времени (0 - без прогнозов)")
+    run_parser.add_argument("--vectorized", action="store_true", help="векторная проверка аномалий")
+    run_parser.add_argument("--simple-forecast", action="store_true",
+                            help="LoadForecastStrategy вместо сезонного прогноза")
+    run_parser.set_defaults(handler=run)
+    
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
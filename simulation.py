@@ -0,0 +1,241 @@
+from controllers import *
+import argparse
+
+# Имитация датчиков сети без графического интерфейса.
+# Запуск нагрузочного прогона: python simulation.py --substations 1000 --ticks 100
+
+@dataclass
+class SimulationStats:
+    ticks: int = 0
+    readings: int = 0
+    anomalies: int = 0
+    wall_seconds: float = 0.0        # время обработки без пауз между циклами
+    simulated_seconds: float = 0.0
+    
+    @property
+    def readings_per_second(self) -> float:
+        return self.readings / self.wall_seconds if self.wall_seconds else 0.0
+    
+    @property
+    def speedup(self) -> float:
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+class GridSimulation:
+    # (суффикс датчика, тип, минимум, максимум, единица измерения)
+    SENSOR_PROFILES = [
+        ("power", SensorType.POWER, 100, 1000, "кВт"),
+        ("voltage", SensorType.VOLTAGE, 210, 240, "В"),
+        ("current", SensorType.CURRENT, 10, 100, "А")
+    ]
+    
+    def __init__(self, repository: IDataRepository,
+                 monitor_controller: Optional[NetworkMonitorController] = None,
+                 alert_service: Optional[IAlertService] = None,
+                 seed: Optional[int] = None, tick_interval: float = 5.0,
+                 start_time: Optional[datetime.datetime] = None,
+                 random_anomaly_probability: float = 0.0):
+        self.repository = repository
+        self.monitor_controller = monitor_controller
+        self.alert_service = alert_service
+        self.random = random.Random(seed)
+        self.tick_interval = tick_interval
+        self.current_time = start_time or datetime.datetime.now()
+        self.random_anomaly_probability = random_anomaly_probability
+        self.stats = SimulationStats()
+        
+        # Датчики для уже существующих объектов сети
+        for obj in self.repository.get_all_network_objects():
+            self.register_sensors(obj)
+    
+    # ---------- Построение сети ----------
+    
+    def register_sensors(self, network_object: NetworkObject):
+        for sensor_suffix, sensor_type, min_val, max_val, unit in self.SENSOR_PROFILES:
+            self.repository.register_sensor(Sensor(
+                sensor_id=f"{network_object.object_id}_{sensor_suffix}",
+                sensor_type=sensor_type,
+                network_object_id=network_object.object_id
+            ))
+    
+    def build_grid(self, substation_count: int, feeders_per_substation: int = 4,
+                   renewables_per_substation: int = 1) -> List[NetworkObject]:
+        """Синтетическая сеть: подстанции с фидерами и возобновляемыми источниками"""
+        created = []
+        for i in range(substation_count):
+            substation = Substation(
+                object_id=f"sim_sub_{i:05d}",
+                name=f"Подстанция №{i + 1}",
+                object_type=NetworkObjectType.SUBSTATION,
+                status="operational",
+                location=self._random_location(),
+                capacity=10000.0,
+                current_load=self.random.uniform(4000.0, 8000.0)
+            )
+            created.append(substation)
+            
+            for j in range(feeders_per_substation):
+                created.append(Feeder(
+                    object_id=f"{substation.object_id}_feeder_{j:02d}",
+                    name=f"Фидер {i + 1}.{j + 1}",
+                    object_type=NetworkObjectType.FEEDER,
+                    status="operational",
+                    location=self._random_location(),
+                    capacity=500.0,
+                    current_load=self.random.uniform(150.0, 400.0),
+                    parent_substation_id=substation.object_id,
+                    max_capacity=500.0,
+                    connected_consumers=self.random.randint(50, 300)
+                ))
+            
+            for j in range(renewables_per_substation):
+                source_type = self.random.choice(["solar", "wind", "hydro"])
+                created.append(RenewableSource(
+                    object_id=f"{substation.object_id}_{source_type}_{j:02d}",
+                    name=f"Источник {i + 1}.{j + 1} ({source_type})",
+                    object_type=NetworkObjectType.RENEWABLE,
+                    status="operational",
+                    location=self._random_location(),
+                    capacity=2000.0,
+                    current_load=0.0,
+                    source_type=source_type,
+                    current_generation=self.random.uniform(100.0, 1500.0),
+                    weather_dependency=source_type != "hydro"
+                ))
+        
+        for obj in created:
+            self.repository.save_network_object(obj)
+            self.register_sensors(obj)
+        return created
+    
+    def _random_location(self) -> str:
+        return f"{self.random.uniform(55.5, 56.0):.4f}, {self.random.uniform(37.3, 37.9):.4f}"
+    
+    # ---------- Генерация данных ----------
+    
+    def generate_readings(self, timestamp: Optional[datetime.datetime] = None
+                          ) -> List[Tuple[SensorData, NetworkObject]]:
+        """Один цикл опроса всех датчиков сети"""
+        timestamp = timestamp or self.current_time
+        batch = []
+        for obj in self.repository.get_all_network_objects():
+            for sensor_suffix, sensor_type, min_val, max_val, unit in self.SENSOR_PROFILES:
+                # Случайные колебания вокруг текущей нагрузки или середины диапазона
+                base_value = obj.current_load if sensor_suffix == "power" else (min_val + max_val) / 2
+                fluctuation = self.random.uniform(-0.1, 0.1) * base_value
+                value = max(min_val, min(max_val, base_value + fluctuation))
+                
+                batch.append((SensorData(
+                    data_id=str(uuid.uuid4()),
+                    sensor_id=f"{obj.object_id}_{sensor_suffix}",
+                    timestamp=timestamp,
+                    value=value,
+                    unit=unit
+                ), obj))
+                
+                if sensor_suffix == "power":
+                    self.repository.update_object_load(obj.object_id, value)
+        return batch
+    
+    def generate_random_anomaly(self, timestamp: Optional[datetime.datetime] = None
+                                ) -> Optional[Anomaly]:
+        objects = self.repository.get_all_network_objects()
+        if not objects:
+            return None
+        
+        obj = self.random.choice(objects)
+        return Anomaly(
+            anomaly_id=str(uuid.uuid4()),
+            detection_time=timestamp or self.current_time,
+            anomaly_type=self.random.choice(list(AnomalyType)),
+            severity=self.random.choice(list(SeverityLevel)[1:]),  # Исключаем LOW
+            description=f"Тестовая аномалия на объекте {obj.name}",
+            status="detected",
+            affected_object_id=obj.object_id,
+            confidence_score=self.random.uniform(0.7, 0.95),
+            recommended_action="Требуется анализ и принятие мер"
+        )
+    
+    # ---------- Прогон ----------
+    
+    def tick(self) -> List[Anomaly]:
+        """Цикл опроса в текущий момент модельного времени"""
+        batch = self.generate_readings(self.current_time)
+        if self.monitor_controller:
+            anomalies = self.monitor_controller.process_sensor_batch(batch)
+        else:
+            self.repository.store_sensor_data_batch([data for data, obj in batch])
+            anomalies = []
+        
+        if self.random.random() < self.random_anomaly_probability:
+            anomaly = self.generate_random_anomaly(self.current_time)
+            if anomaly:
+                self.repository.store_anomaly(anomaly)
+                anomalies.append(anomaly)
+        
+        if self.alert_service:
+            for anomaly in anomalies:
+                self.alert_service.send_alert(
+                    f"Обнаружена аномалия: {anomaly.description}",
+                    anomaly.severity,
+                    "simulation"
+                )
+        
+        self.stats.ticks += 1
+        self.stats.readings += len(batch)
+        self.stats.anomalies += len(anomalies)
+        self.stats.simulated_seconds += self.tick_interval
+        self.current_time += datetime.timedelta(seconds=self.tick_interval)
+        return anomalies
+    
+    def run(self, ticks: int, speed: Optional[float] = None,
+            on_tick: Optional[Callable[[int, List[Anomaly]], None]] = None) -> SimulationStats:
+        """Прогон ticks циклов; speed - во сколько раз быстрее реального времени (None - без пауз)"""
+        for tick_number in range(ticks):
+            started = time.perf_counter()
+            anomalies = self.tick()
+            elapsed = time.perf_counter() - started
+            self.stats.wall_seconds += elapsed
+            
+            if on_tick:
+                on_tick(tick_number, anomalies)
+            if speed:
+                delay = self.tick_interval / speed - elapsed
+                if delay > 0:
+                    time.sleep(delay)
+        return self.stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Имитация энергосети без графического интерфейса")
+    parser.add_argument("--substations", type=int, default=100)
+    parser.add_argument("--feeders", type=int, default=4, help="фидеров на подстанцию")
+    parser.add_argument("--renewables", type=int, default=1, help="источников на подстанцию")
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--tick-interval", type=float, default=5.0, help="шаг модельного времени, сек")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="ускорение относительно реального времени (по умолчанию - максимальное)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--compact", action="store_true", help="компактное хранение показаний")
+    parser.add_argument("--vectorized", action="store_true", help="векторная проверка аномалий")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="процессов для проверки аномалий (0 - в основном потоке)")
+    args = parser.parse_args()
+    
+    repository = InMemoryDataRepository(compact=args.compact, thread_safe=False)
+    monitor = NetworkMonitorController(repository, vectorized=args.vectorized, workers=args.workers)
+    monitor.start_monitoring()
+    
+    simulation = GridSimulation(repository, monitor, seed=args.seed, tick_interval=args.tick_interval)
+    simulation.build_grid(args.substations, args.feeders, args.renewables)
+    sensor_count = len(repository.get_all_network_objects()) * len(GridSimulation.SENSOR_PROFILES)
+    print(f"Сеть: {len(repository.get_all_network_objects())} объектов, {sensor_count} датчиков")
+    
+    try:
+        stats = simulation.run(args.ticks, speed=args.speed)
+    finally:
+        monitor.close()
+    print(f"Циклов опроса: {stats.ticks}, показаний: {stats.readings}, аномалий: {stats.anomalies}")
+    print(f"Время: {stats.wall_seconds:.2f} с, {stats.readings_per_second:,.0f} показаний/с, "
+          f"ускорение x{stats.speedup:,.0f}")
+
+if __name__ == "__main__":
+    main()